@@ -0,0 +1,114 @@
+"""
+Write-behind user activity tracking for AssetVault
+Handles:
+- Recording each user's latest request time in memory instead of writing per request
+- Flushing all pending timestamps periodically with one unordered bulk_write
+- A final flush on shutdown so no activity is lost on a clean restart
+- Flush listeners for data derived from last_activity (e.g. dead man's switch schedules)
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# How stale users.last_activity may get. The dead man's switch works in days,
+# so a minute is far tighter than it needs.
+ACTIVITY_FLUSH_INTERVAL_SECONDS = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL_SECONDS', '60'))
+
+
+class ActivityBuffer:
+    """
+    Keeps only the most recent timestamp per user, so a burst of requests from
+    one user costs a single update per flush. Updates use $max, so a flush from
+    a worker holding older data never moves last_activity backwards.
+    """
+
+    def __init__(self, interval: float = ACTIVITY_FLUSH_INTERVAL_SECONDS):
+        self.interval = interval
+        self._pending: Dict[str, str] = {}
+        self._users = None
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[Dict[str, str]], Awaitable[object]]] = []
+        self.recorded = 0
+        self.flushes = 0
+        self.written = 0
+
+    def record(self, user_id: str, at: Optional[datetime] = None):
+        """Note that the user was active (now, unless `at` is given)."""
+        self._pending[user_id] = (at or datetime.now(timezone.utc)).isoformat()
+        self.recorded += 1
+
+    def on_flush(self, listener: Callable[[Dict[str, str]], Awaitable[object]]):
+        """Await `listener({user_id: ISO timestamp})` after each successful flush."""
+        self._listeners.append(listener)
+
+    async def flush(self) -> int:
+        """Write every pending timestamp in one bulk_write. Returns the number of users written."""
+        if not self._pending or self._users is None:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        operations = [
+            UpdateOne({"id": user_id}, {"$max": {"last_activity": timestamp}})
+            for user_id, timestamp in pending.items()
+        ]
+        try:
+            await self._users.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Activity flush for {len(pending)} users failed: {str(e)}")
+            # Keep them for the next flush unless newer activity arrived meanwhile
+            for user_id, timestamp in pending.items():
+                if timestamp > self._pending.get(user_id, ""):
+                    self._pending[user_id] = timestamp
+            return 0
+
+        self.flushes += 1
+        self.written += len(pending)
+        for listener in self._listeners:
+            try:
+                await listener(pending)
+            except Exception as e:
+                logger.error(f"Activity flush listener {getattr(listener, '__name__', listener)} failed: {str(e)}")
+        return len(pending)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self, users_collection):
+        """Begin periodic flushing into `users_collection` (called on app startup)."""
+        self._users = users_collection
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Activity buffer flushing every {self.interval:g}s")
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is still pending (called on app shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "pending_users": len(self._pending),
+            "recorded": self.recorded,
+            "flushes": self.flushes,
+            "users_written": self.written,
+            "interval_seconds": self.interval,
+        }
+
+
+# Shared by every request handled in this process
+activity_buffer = ActivityBuffer()
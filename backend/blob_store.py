@@ -0,0 +1,558 @@
+"""
+Content-addressed blob storage for AssetVault
+Handles:
+- Streaming file content into chunked storage keyed by its SHA-256 digest
+- Reference-counted deduplication: identical content is stored once however often it is uploaded
+- Claiming catalog entries while a blob is committed or deleted, so the two can never interleave
+- Transparent zlib compression at rest for compressible content types
+- GridFS (default) and local-filesystem backends behind one interface
+- Ranged, fixed-size chunk reads so callers never hold a whole file in memory
+- Parsing HTTP Range headers against a blob's size
+- Moving legacy base64 `file_data` payloads out of the documents collection
+"""
+
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+BLOB_STORE_BACKEND = os.environ.get('BLOB_STORE_BACKEND', 'gridfs').lower()
+BLOB_STORE_PATH = os.environ.get('BLOB_STORE_PATH', os.path.join(os.path.dirname(__file__), 'blob_data'))
+
+# GridFS's default chunk size; also the read size for streaming downloads
+BLOB_CHUNK_SIZE = int(os.environ.get('BLOB_CHUNK_SIZE', str(255 * 1024)))
+
+BLOB_MIGRATION_BATCH_SIZE = int(os.environ.get('BLOB_MIGRATION_BATCH_SIZE', '50'))
+
+# zlib level 1 compresses text-like content well at several hundred MB/s
+BLOB_COMPRESSION_LEVEL = int(os.environ.get('BLOB_COMPRESSION_LEVEL', '1'))
+
+# Content types worth trying to compress. PDFs are included because many are
+# written without stream compression; already-compressed ones fail the sample check.
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/xml", "application/pdf",
+    "application/rtf", "application/javascript", "image/svg+xml", "image/bmp",
+)
+
+# The first chunk must shrink to this fraction of its size before the blob is compressed
+COMPRESSION_SAMPLE_BYTES = 64 * 1024
+COMPRESSION_MIN_RATIO = 0.9
+
+ENCODING_ZLIB = "zlib"
+
+# A put that meets an entry being committed or deleted polls until it settles.
+# Claims older than the timeout belong to a crashed process and are taken over.
+BLOB_CLAIM_RETRY_SECONDS = 0.05
+BLOB_CLAIM_TIMEOUT_SECONDS = int(os.environ.get('BLOB_CLAIM_TIMEOUT_SECONDS', '300'))
+
+# Catalog entries that can take new references (not pending or deleting)
+LIVE_ENTRY = {"pending": {"$ne": True}, "deleting": {"$ne": True}}
+
+
+class BlobNotFoundError(KeyError):
+    """No blob is stored under the requested key."""
+
+
+def decode_file_data(file_data: str) -> bytes:
+    """Decode a base64 upload, tolerating a data: URL prefix."""
+    if file_data.startswith("data:") and "," in file_data:
+        file_data = file_data.split(",", 1)[1]
+    return base64.b64decode(file_data)
+
+
+async def iter_bytes(data: bytes, chunk_size: int = BLOB_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
+class RangeNotSatisfiableError(ValueError):
+    """The requested byte range lies outside the blob."""
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Resolve a Range header to a half-open (start, end) byte span of a `size`-byte blob.
+    Returns None when the whole blob should be sent: no header, a unit other than
+    bytes, a malformed spec, or several ranges (which we do not serve as multipart).
+    Raises RangeNotSatisfiableError when the single range lies past the end.
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+
+    first, last = (part.strip() for part in spec.split("-", 1))
+    if not (first or last) or not (first or "0").isdigit() or not (last or "0").isdigit():
+        return None
+
+    if not first:
+        # Suffix range: the final `last` bytes
+        suffix = int(last)
+        if suffix == 0:
+            raise RangeNotSatisfiableError(header)
+        return max(size - suffix, 0), size
+
+    start = int(first)
+    end = int(last) + 1 if last else size
+    if start >= size:
+        raise RangeNotSatisfiableError(header)
+    if end <= start:
+        return None
+    return start, min(end, size)
+
+
+def should_compress(content_type: Optional[str], sample: bytes) -> bool:
+    """Compress when the type is text-like and a sample of the content actually shrinks."""
+    if not content_type or not content_type.lower().startswith(COMPRESSIBLE_TYPES):
+        return False
+    sample = sample[:COMPRESSION_SAMPLE_BYTES]
+    if not sample:
+        return False
+    return len(zlib.compress(sample, BLOB_COMPRESSION_LEVEL)) <= len(sample) * COMPRESSION_MIN_RATIO
+
+
+async def _inflate(chunks: AsyncIterator[bytes], chunk_size: int) -> AsyncIterator[bytes]:
+    """Decompress a zlib stream without ever producing more than `chunk_size` bytes at once."""
+    decompressor = zlib.decompressobj()
+    async for data in chunks:
+        while data:
+            piece = decompressor.decompress(data, chunk_size)
+            data = decompressor.unconsumed_tail
+            if piece:
+                yield piece
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+class BlobStore(ABC):
+    """
+    Blobs are immutable and addressed by the hex SHA-256 of their (uncompressed)
+    content, so storing the same bytes twice keeps a single copy. A blob
+    reference ({"backend", "key", "size"}) is what callers persist next to their
+    metadata; every put must eventually be matched by one release.
+
+    The `blobs` catalog holds one entry per stored blob: its reference count,
+    logical size, stored size and encoding. Subclasses only move raw bytes.
+
+    Physical content is only ever written or deleted by whoever holds the
+    entry: a new blob is inserted `pending` before it is committed, and a blob
+    whose last reference goes is marked `deleting` before its data is removed.
+    Puts that meet either state wait, so a delete can never remove content a
+    concurrent upload of the same bytes is relying on.
+    """
+    backend = "base"
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    # Physical storage, implemented per backend
+
+    @abstractmethod
+    async def _write_temp(self, chunks: AsyncIterator[bytes]) -> Any:
+        """Write chunks somewhere temporary; returns a handle for _commit/_discard."""
+
+    @abstractmethod
+    async def _commit(self, handle: Any, key: str):
+        """Make a temporary write the stored object for `key`."""
+
+    @abstractmethod
+    async def _discard(self, handle: Any):
+        """Drop a temporary write."""
+
+    @abstractmethod
+    def _open_physical(self, key: str, start: int, end: Optional[int], chunk_size: int) -> AsyncIterator[bytes]:
+        """Stored bytes [start, end) of a blob; raises BlobNotFoundError on first iteration."""
+
+    @abstractmethod
+    async def _physical_handles(self, key: str) -> List[Any]:
+        """Handles of the stored objects for a key, captured before deleting them."""
+
+    @abstractmethod
+    async def _delete_physical(self, handle: Any):
+        """Delete one stored object by the handle _physical_handles returned."""
+
+    # Public interface
+
+    async def put_stream(self, chunks: AsyncIterator[bytes], content_type: Optional[str] = None) -> Dict[str, Any]:
+        """Store content arriving in chunks (compressing it if worthwhile); returns its blob reference."""
+        digest = hashlib.sha256()
+        sizes = {"size": 0, "stored_size": 0}
+        encoding = None
+
+        async def encoded():
+            nonlocal encoding
+            compressor = None
+            async for chunk in chunks:
+                if sizes["size"] == 0 and should_compress(content_type, chunk):
+                    compressor = zlib.compressobj(BLOB_COMPRESSION_LEVEL)
+                    encoding = ENCODING_ZLIB
+                digest.update(chunk)
+                sizes["size"] += len(chunk)
+                out = compressor.compress(chunk) if compressor else chunk
+                if out:
+                    sizes["stored_size"] += len(out)
+                    yield out
+            if compressor:
+                out = compressor.flush()
+                sizes["stored_size"] += len(out)
+                yield out
+
+        # The key is only known once all content has been seen, so write to a
+        # temporary location first and keep it only if the content is new
+        handle = await self._write_temp(encoded())
+        key = digest.hexdigest()
+        reference = {"backend": self.backend, "key": key, "size": sizes["size"]}
+
+        while True:
+            if await self.catalog.find_one_and_update({"_id": key, **LIVE_ENTRY}, {"$inc": {"refcount": 1}}, {"_id": 1}):
+                await self._discard(handle)
+                return reference
+            now = datetime.now(timezone.utc).isoformat()
+            try:
+                await self.catalog.insert_one({
+                    "_id": key,
+                    "backend": self.backend,
+                    "refcount": 1,
+                    "size": sizes["size"],
+                    "stored_size": sizes["stored_size"],
+                    "encoding": encoding,
+                    "created_at": now,
+                    "pending": True,
+                    "claimed_at": now
+                })
+                break
+            except DuplicateKeyError:
+                # Another upload is committing this content, or its last copy is being deleted
+                await self._wait_for_claim(key)
+
+        try:
+            await self._commit(handle, key)
+        except Exception:
+            await self.catalog.delete_one({"_id": key, "pending": True})
+            raise
+        await self.catalog.update_one({"_id": key}, {"$unset": {"pending": "", "claimed_at": ""}})
+        return reference
+
+    async def _wait_for_claim(self, key: str):
+        """Back off while an entry is pending or deleting, taking over claims left by a crashed process."""
+        entry = await self.catalog.find_one({"_id": key}, {"claimed_at": 1})
+        claimed_at = entry.get("claimed_at") if entry else None
+        if claimed_at:
+            age = datetime.now(timezone.utc) - datetime.fromisoformat(claimed_at)
+            if age > timedelta(seconds=BLOB_CLAIM_TIMEOUT_SECONDS):
+                logger.warning(f"Taking over stale blob catalog claim on {key} ({age} old)")
+                await self.catalog.delete_one({"_id": key, "claimed_at": claimed_at})
+                return
+        await asyncio.sleep(BLOB_CLAIM_RETRY_SECONDS)
+
+    async def put(self, data: bytes, content_type: Optional[str] = None) -> Dict[str, Any]:
+        return await self.put_stream(iter_bytes(data), content_type)
+
+    async def open_range(self, key: str, start: int = 0, end: Optional[int] = None,
+                         chunk_size: int = BLOB_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """
+        Yield bytes [start, end) of a blob's original content in chunks of at most
+        `chunk_size`. Raises BlobNotFoundError on first iteration if the key is unknown.
+        Compressed blobs are inflated from the beginning and the prefix skipped.
+        """
+        entry = await self.catalog.find_one({"_id": key}, {"encoding": 1})
+        if not entry or entry.get("encoding") != ENCODING_ZLIB:
+            async for chunk in self._open_physical(key, start, end, chunk_size):
+                yield chunk
+            return
+
+        position = 0
+        async for piece in _inflate(self._open_physical(key, 0, None, chunk_size), chunk_size):
+            piece_start, position = position, position + len(piece)
+            if position <= start:
+                continue
+            if end is not None and piece_start >= end:
+                return
+            yield piece[max(start - piece_start, 0):None if end is None else end - piece_start]
+
+    async def read(self, key: str) -> bytes:
+        return b"".join([chunk async for chunk in self.open_range(key)])
+
+    async def exists(self, key: str) -> bool:
+        return await self.catalog.find_one({"_id": key}, {"_id": 1}) is not None
+
+    async def release(self, key: str, count: int = 1) -> bool:
+        """Drop `count` references; the blob is deleted once none remain. Returns True if deleted."""
+        entry = await self.catalog.find_one_and_update(
+            {"_id": key}, {"$inc": {"refcount": -count}},
+            {"refcount": 1}, return_document=ReturnDocument.AFTER
+        )
+        if entry is None or entry["refcount"] > 0:
+            return False
+        # Claim the deletion, unless a new reference arrived in the meantime. The
+        # entry stays (as `deleting`) until the data is gone so puts wait for us.
+        claimed = await self.catalog.find_one_and_update(
+            {"_id": key, "refcount": {"$lte": 0}, **LIVE_ENTRY},
+            {"$set": {"deleting": True, "claimed_at": datetime.now(timezone.utc).isoformat()}},
+            {"_id": 1}
+        )
+        if claimed is None:
+            return False
+        for handle in await self._physical_handles(key):
+            await self._delete_physical(handle)
+        await self.catalog.delete_one({"_id": key, "deleting": True})
+        return True
+
+    async def rebuild_catalog(self, documents) -> int:
+        """
+        Recount references from the documents collection (file content and
+        thumbnails alike), registering blobs stored before the catalog existed
+        (as uncompressed). Returns entries written.
+        """
+        operations = []
+        async for row in documents.aggregate([
+            {"$match": {"$or": [{"blob_ref.key": {"$type": "string"}}, {"thumbnail_ref.key": {"$type": "string"}}]}},
+            {"$project": {"refs": {"$filter": {
+                "input": ["$blob_ref", "$thumbnail_ref"],
+                "as": "ref",
+                "cond": {"$eq": [{"$type": "$$ref.key"}, "string"]}
+            }}}},
+            {"$unwind": "$refs"},
+            {"$group": {"_id": "$refs.key", "refcount": {"$sum": 1}, "size": {"$first": "$refs.size"}}}
+        ]):
+            operations.append(UpdateOne(
+                {"_id": row["_id"]},
+                {
+                    "$set": {"refcount": row["refcount"]},
+                    "$setOnInsert": {
+                        "backend": self.backend,
+                        "size": row["size"],
+                        "stored_size": row["size"],
+                        "encoding": None,
+                        "created_at": datetime.now(timezone.utc).isoformat()
+                    }
+                },
+                upsert=True
+            ))
+        if operations:
+            await self.catalog.bulk_write(operations, ordered=False)
+        logger.info(f"Blob catalog rebuilt: {len(operations)} blobs")
+        return len(operations)
+
+    async def usage_report(self, documents, user_id: str) -> Dict[str, Any]:
+        """
+        Logical bytes (what the user uploaded) against the bytes actually kept
+        for their documents after deduplication and compression.
+        Inline documents not yet migrated count as stored as-is.
+        """
+        rows = await documents.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$group": {
+                "_id": {"$ifNull": ["$blob_ref.key", "$id"]},
+                "blob": {"$first": {"$ifNull": ["$blob_ref.key", None]}},
+                "references": {"$sum": 1},
+                "logical": {"$sum": {"$ifNull": ["$file_size", 0]}},
+                "size": {"$first": {"$ifNull": ["$blob_ref.size", "$file_size"]}}
+            }},
+            {"$lookup": {"from": self.catalog.name, "localField": "blob", "foreignField": "_id", "as": "entry"}},
+            {"$addFields": {
+                "size": {"$ifNull": ["$size", 0]},
+                "stored": {"$ifNull": [{"$arrayElemAt": ["$entry.stored_size", 0]}, {"$ifNull": ["$size", 0]}]}
+            }},
+            {"$group": {
+                "_id": None,
+                "documents": {"$sum": "$references"},
+                "logical_bytes": {"$sum": "$logical"},
+                "unique_bytes": {"$sum": "$size"},
+                "stored_bytes": {"$sum": "$stored"}
+            }}
+        ]).to_list(1)
+
+        totals = rows[0] if rows else {"documents": 0, "logical_bytes": 0, "unique_bytes": 0, "stored_bytes": 0}
+        logical, unique, stored = totals["logical_bytes"], totals["unique_bytes"], totals["stored_bytes"]
+        return {
+            "documents": totals["documents"],
+            "logical_bytes": logical,
+            "unique_bytes": unique,
+            "stored_bytes": stored,
+            "deduplication_saved_bytes": logical - unique,
+            "compression_saved_bytes": unique - stored,
+            "storage_ratio": round(stored / logical, 4) if logical else 1.0,
+        }
+
+
+class GridFSBlobStore(BlobStore):
+    """Blobs live in a GridFS bucket; each file's filename is its content key."""
+    backend = "gridfs"
+
+    def __init__(self, db, bucket_name: str = "blobs", chunk_size: int = BLOB_CHUNK_SIZE):
+        super().__init__(db.blobs)
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name, chunk_size_bytes=chunk_size)
+        self.files = db[f"{bucket_name}.files"]
+
+    async def _write_temp(self, chunks: AsyncIterator[bytes]) -> Any:
+        upload = self.bucket.open_upload_stream(f"pending-{uuid.uuid4()}")
+        try:
+            async for chunk in chunks:
+                await upload.write(chunk)
+            await upload.close()
+        except Exception:
+            await upload.abort()
+            raise
+        return upload._id
+
+    async def _commit(self, file_id: Any, key: str):
+        await self.bucket.rename(file_id, key)
+
+    async def _discard(self, file_id: Any):
+        await self.bucket.delete(file_id)
+
+    async def _open_physical(self, key: str, start: int, end: Optional[int],
+                             chunk_size: int) -> AsyncIterator[bytes]:
+        try:
+            grid_out = await self.bucket.open_download_stream_by_name(key)
+        except NoFile:
+            raise BlobNotFoundError(key)
+
+        end = grid_out.length if end is None else min(end, grid_out.length)
+        grid_out.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = await grid_out.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    async def _physical_handles(self, key: str) -> List[Any]:
+        return [grid_file["_id"] async for grid_file in self.files.find({"filename": key}, {"_id": 1})]
+
+    async def _delete_physical(self, file_id: Any):
+        try:
+            await self.bucket.delete(file_id)
+        except NoFile:
+            pass
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs are files under `root`, fanned out by key prefix (ab/cd/abcd...)."""
+    backend = "local"
+
+    def __init__(self, db, root: str = BLOB_STORE_PATH):
+        super().__init__(db.blobs)
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    async def _write_temp(self, chunks: AsyncIterator[bytes]) -> Any:
+        tmp_dir = os.path.join(self.root, "tmp")
+        await asyncio.to_thread(os.makedirs, tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(tmp_dir, str(uuid.uuid4()))
+
+        handle = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(handle.write, chunk)
+        except Exception:
+            await asyncio.to_thread(handle.close)
+            await asyncio.to_thread(os.remove, tmp_path)
+            raise
+        await asyncio.to_thread(handle.close)
+        return tmp_path
+
+    async def _commit(self, tmp_path: Any, key: str):
+        path = self._path(key)
+        await asyncio.to_thread(os.makedirs, os.path.dirname(path), exist_ok=True)
+        await asyncio.to_thread(os.replace, tmp_path, path)
+
+    async def _discard(self, tmp_path: Any):
+        await asyncio.to_thread(os.remove, tmp_path)
+
+    async def _open_physical(self, key: str, start: int, end: Optional[int],
+                             chunk_size: int) -> AsyncIterator[bytes]:
+        try:
+            handle = await asyncio.to_thread(open, self._path(key), "rb")
+        except FileNotFoundError:
+            raise BlobNotFoundError(key)
+
+        try:
+            length = os.fstat(handle.fileno()).st_size
+            end = length if end is None else min(end, length)
+            await asyncio.to_thread(handle.seek, start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = await asyncio.to_thread(handle.read, min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(handle.close)
+
+    async def _physical_handles(self, key: str) -> List[Any]:
+        return [self._path(key)]
+
+    async def _delete_physical(self, path: Any):
+        try:
+            await asyncio.to_thread(os.remove, path)
+        except FileNotFoundError:
+            pass
+
+
+def get_blob_store(db, backend: Optional[str] = None) -> BlobStore:
+    """Store selected by BLOB_STORE_BACKEND (gridfs or local)."""
+    backend = (backend or BLOB_STORE_BACKEND).lower()
+    if backend == "local":
+        return LocalBlobStore(db)
+    return GridFSBlobStore(db)
+
+
+async def migrate_inline_documents(documents, store: BlobStore,
+                                   batch_size: int = BLOB_MIGRATION_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Move base64 `file_data` payloads from the documents collection into the blob store.
+    Documents are paged by _id in small batches so only one batch of payloads is in
+    memory at a time; each batch is written back with a single bulk_write.
+    Safe to re-run: migrated documents no longer match.
+    """
+    migrated = failed = 0
+    last_id = None
+    while True:
+        query = {"file_data": {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await documents.find(query, {"_id": 1, "id": 1, "file_data": 1, "file_type": 1}) \
+            .sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        operations = []
+        for doc in batch:
+            try:
+                blob_ref = await store.put(decode_file_data(doc["file_data"]), doc.get("file_type"))
+            except Exception as e:
+                failed += 1
+                logger.error(f"Blob migration of document {doc.get('id')} failed: {str(e)}")
+                continue
+            operations.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"blob_ref": blob_ref}, "$unset": {"file_data": ""}}
+            ))
+        if operations:
+            await documents.bulk_write(operations, ordered=False)
+            migrated += len(operations)
+
+    logger.info(f"Blob migration finished: {migrated} documents moved, {failed} failed")
+    return {"migrated": migrated, "failed": failed}
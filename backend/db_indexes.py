@@ -0,0 +1,182 @@
+"""
+MongoDB index management for AssetVault
+Handles:
+- Declaring every index the API routes and background jobs query on
+- Idempotent creation at startup (existing indexes are left untouched)
+- TTL indexes for session expiry and audit-log retention (windows configurable per collection)
+- Reporting declared indexes that are missing and existing ones that are never used
+"""
+
+import logging
+import os
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# TTL retention windows. MongoDB's TTL monitor removes expired documents about
+# once a minute, so request paths never need to clean these up themselves.
+SESSION_EXPIRY_GRACE_SECONDS = int(os.environ.get('SESSION_EXPIRY_GRACE_SECONDS', '0'))
+AUDIT_LOG_RETENTION_DAYS = int(os.environ.get('AUDIT_LOG_RETENTION_DAYS', '90'))
+
+# Server error code when an index exists with the same keys but different options
+INDEX_OPTIONS_CONFLICT = 85
+
+# Collection -> indexes its query patterns need. Names are left to MongoDB's
+# default (e.g. "user_id_1_is_demo_1") so indexes built before this module
+# existed are recognised instead of conflicting.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)]),
+        IndexModel([("created_at", ASCENDING)]),
+    ],
+    "user_sessions": [
+        IndexModel([("session_token", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING)]),
+        # expires_at is the absolute expiry time, so the TTL only adds a grace period
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=SESSION_EXPIRY_GRACE_SECONDS),
+    ],
+    "assets": [
+        IndexModel([("user_id", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("is_demo", ASCENDING)]),
+        # Market price refresher groups by (type, symbol)
+        IndexModel([("type", ASCENDING), ("symbol", ASCENDING)]),
+    ],
+    "portfolio_assets": [
+        IndexModel([("user_id", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("is_demo", ASCENDING)]),
+        IndexModel([("holdings.symbol", ASCENDING)]),
+    ],
+    "documents": [
+        IndexModel([("user_id", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("is_demo", ASCENDING)]),
+        # Thumbnail worker queue; only pending documents are indexed
+        IndexModel(
+            [("thumbnail_status", ASCENDING)],
+            partialFilterExpression={"thumbnail_status": "pending"}
+        ),
+    ],
+    "nominees": [
+        IndexModel([("user_id", ASCENDING), ("priority", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("is_demo", ASCENDING)]),
+        IndexModel([("id", ASCENDING)]),
+        IndexModel([("email", ASCENDING), ("access_granted", ASCENDING)]),
+        # Tokens are stored as a keyed hash; most nominees never get one, so only index those that do
+        IndexModel(
+            [("access_token_hash", ASCENDING)], unique=True,
+            partialFilterExpression={"access_token_hash": {"$type": "string"}}
+        ),
+    ],
+    "scheduled_messages": [
+        IndexModel([("status", ASCENDING), ("send_date", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("is_demo", ASCENDING)]),
+    ],
+    "dead_man_switches": [
+        IndexModel([("user_id", ASCENDING)]),
+        # The DMS sweep's due_filter: one range scan per $or branch
+        IndexModel([("is_active", ASCENDING), ("remind_at", ASCENDING)]),
+        IndexModel([("is_active", ASCENDING), ("trigger_at", ASCENDING)]),
+    ],
+    "digital_wills": [
+        IndexModel([("user_id", ASCENDING), ("demo_mode", ASCENDING)]),
+    ],
+    "monthly_incomes": [
+        IndexModel([("user_id", ASCENDING), ("month", ASCENDING), ("demo_mode", ASCENDING)]),
+    ],
+    "monthly_expenses": [
+        IndexModel([("user_id", ASCENDING), ("month", ASCENDING), ("demo_mode", ASCENDING)]),
+    ],
+    "budgets": [
+        IndexModel([("user_id", ASCENDING), ("month", ASCENDING), ("demo_mode", ASCENDING)]),
+    ],
+    "tax_profiles": [
+        IndexModel([("user_id", ASCENDING), ("demo_mode", ASCENDING)]),
+    ],
+    "networth_snapshots": [
+        IndexModel([("user_id", ASCENDING), ("snapshot_date", ASCENDING)]),
+    ],
+    "audit_logs": [
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("timestamp", ASCENDING)], expireAfterSeconds=AUDIT_LOG_RETENTION_DAYS * 86400),
+    ],
+    "ai_insights": [
+        IndexModel([("user_id", ASCENDING), ("generated_at", DESCENDING)]),
+    ],
+    "exchange_connections": [
+        IndexModel([("user_id", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "user_usage": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+    ],
+    "dashboard_summaries": [
+        IndexModel([("user_id", ASCENDING), ("demo_mode", ASCENDING), ("currency", ASCENDING)], unique=True),
+    ],
+}
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """
+    Create every declared index that does not exist yet.
+    A failure (e.g. duplicates blocking a unique index) is logged and does not
+    stop the others. Returns {collection: index names}.
+    """
+    created = {}
+    failures = 0
+    for collection_name, models in INDEXES.items():
+        created[collection_name] = []
+        # One index per command so a single conflict does not block the rest
+        for model in models:
+            try:
+                created[collection_name] += await db[collection_name].create_indexes([model])
+            except OperationFailure as e:
+                if e.code == INDEX_OPTIONS_CONFLICT and "expireAfterSeconds" in model.document:
+                    try:
+                        await _update_ttl(db, collection_name, model)
+                        created[collection_name].append(model.document["name"])
+                        continue
+                    except OperationFailure as collmod_error:
+                        # e.g. the existing index on these keys is not a TTL index
+                        e = collmod_error
+                failures += 1
+                logger.error(f"Index {model.document['name']} on {collection_name} failed: {str(e)}")
+    logger.info(f"Ensured indexes on {len(INDEXES)} collections ({failures} failed)")
+    return created
+
+
+async def _update_ttl(db, collection_name: str, model: IndexModel):
+    """Apply a changed retention window to an existing TTL index in place."""
+    expire_after = model.document["expireAfterSeconds"]
+    await db.command({
+        "collMod": collection_name,
+        "index": {"keyPattern": dict(model.document["key"]), "expireAfterSeconds": expire_after}
+    })
+    logger.info(f"TTL on {collection_name}.{model.document['name']} set to {expire_after}s")
+
+
+async def index_report(db) -> Dict[str, Dict[str, Any]]:
+    """
+    Per collection: declared indexes that are missing, indexes the server has
+    that are not declared here, and indexes with no recorded use since the
+    server last restarted ($indexStats counters reset on restart).
+    """
+    report = {}
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        declared = [model.document["name"] for model in models]
+        existing = await collection.index_information()
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(None)
+
+        report[collection_name] = {
+            "missing": [name for name in declared if name not in existing],
+            "undeclared": sorted(name for name in existing if name != "_id_" and name not in declared),
+            "unused": sorted(
+                stat["name"] for stat in stats
+                if stat["name"] != "_id_" and stat["accesses"]["ops"] == 0
+            ),
+            "usage": {stat["name"]: stat["accesses"]["ops"] for stat in stats},
+        }
+    return report
@@ -0,0 +1,95 @@
+"""
+Dead man's switch scheduling for AssetVault
+Handles:
+- Precomputed `remind_at` / `trigger_at` dates on each switch, anchored on the owner's last activity
+- Recomputing them when activity is flushed or the switch is created, edited, reset or the owner logs in
+- The due-switch filter the daily sweep answers with an index range scan
+- A one-off $merge backfill for switches created before these fields existed
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pymongo import UpdateMany
+
+logger = logging.getLogger(__name__)
+
+# Reminder goes out this many days before a switch triggers
+DMS_REMINDER_LEAD_DAYS = 7
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def _schedule_stage(anchor: Any) -> Dict[str, Any]:
+    """
+    Pipeline-update stage deriving both dates from `anchor` (the owner's last
+    activity) and the switch's own inactivity_days. A reminder is only
+    scheduled while none has been sent for the current inactivity period.
+    """
+    return {"$set": {
+        "last_activity_at": anchor,
+        "trigger_at": {"$add": [anchor, {"$multiply": ["$inactivity_days", DAY_MS]}]},
+        "remind_at": {"$cond": [
+            {"$eq": [{"$ifNull": ["$reminders_sent", 0]}, 0]},
+            {"$add": [anchor, {"$multiply": [{"$subtract": ["$inactivity_days", DMS_REMINDER_LEAD_DAYS]}, DAY_MS]}]},
+            None
+        ]}
+    }}
+
+
+def reschedule_update(active_at: datetime) -> List[Dict[str, Any]]:
+    """
+    Update pipeline for a switch whose owner was active at `active_at`.
+    The anchor never moves backwards, so out-of-order writers are harmless.
+    """
+    return [_schedule_stage({"$max": [{"$ifNull": ["$last_activity_at", active_at]}, active_at]})]
+
+
+async def reschedule_after_activity(switches, flushed: Dict[str, str]) -> int:
+    """
+    Push back the dates of every active switch owned by users in `flushed`
+    ({user_id: ISO timestamp}, as written by the activity buffer) in one bulk_write.
+    """
+    operations = [
+        UpdateMany({"user_id": user_id, "is_active": True}, reschedule_update(datetime.fromisoformat(active_at)))
+        for user_id, active_at in flushed.items()
+    ]
+    if not operations:
+        return 0
+    result = await switches.bulk_write(operations, ordered=False)
+    return result.modified_count
+
+
+def due_filter(now: datetime) -> Dict[str, Any]:
+    """Active switches due a reminder or a trigger; each branch is an index range scan."""
+    return {
+        "is_active": True,
+        "$or": [{"remind_at": {"$lte": now}}, {"trigger_at": {"$lte": now}}]
+    }
+
+
+def backfill_pipeline(collection_name: str = "dead_man_switches") -> List[Dict[str, Any]]:
+    """
+    Fill in last_activity_at / remind_at / trigger_at for switches that lack
+    them, from their owner's last_activity (falling back to the switch's
+    last_reset, then now), written back with $merge in one server-side pass.
+    """
+    def as_date(field):
+        return {"$convert": {"input": field, "to": "date", "onError": None, "onNull": None}}
+
+    return [
+        {"$match": {"trigger_at": {"$exists": False}}},
+        {"$lookup": {"from": "users", "localField": "user_id", "foreignField": "id", "as": "user"}},
+        {"$project": {
+            "inactivity_days": 1,
+            "reminders_sent": 1,
+            "anchor": {"$ifNull": [
+                as_date({"$arrayElemAt": ["$user.last_activity", 0]}),
+                {"$ifNull": [as_date("$last_reset"), "$$NOW"]}
+            ]}
+        }},
+        _schedule_stage("$anchor"),
+        {"$project": {"last_activity_at": 1, "remind_at": 1, "trigger_at": 1}},
+        {"$merge": {"into": collection_name, "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+    ]
@@ -0,0 +1,155 @@
+"""
+Historical foreign exchange rates for AssetVault
+Handles:
+- Bulk-filling a local, date-indexed rate table from frankfurter.app (ECB reference rates)
+- Nearest-previous-date lookups by (base, date)
+- Loading a date range into memory so backfills run without per-date queries
+"""
+
+import bisect
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+
+from fx_rates import FX_PIVOT_CURRENCY
+from http_client import http_client
+
+logger = logging.getLogger(__name__)
+
+FX_HISTORY_API_URL = "https://api.frankfurter.app/{start}..{end}"
+
+# ECB reference rates start on this date
+FX_HISTORY_EARLIEST_DATE = "1999-01-04"
+
+
+def _shift_date(day: str, days: int) -> str:
+    return (date.fromisoformat(day) + timedelta(days=days)).isoformat()
+
+
+class FXRateHistory:
+    """In-memory slice of the history store, sorted by date for bisect lookups."""
+
+    def __init__(self, base: str, rows: List[Tuple[str, Dict[str, float]]]):
+        self.base = base
+        self.dates = [row_date for row_date, _ in rows]
+        self.tables = [rates for _, rates in rows]
+
+    def rates_on(self, day: str) -> Optional[Dict[str, float]]:
+        """Rate table for `day`, or the closest earlier day that has one."""
+        position = bisect.bisect_right(self.dates, day)
+        if position == 0:
+            return None
+        return self.tables[position - 1]
+
+
+class FXHistoryStore:
+    """
+    Rates are stored one document per (base, date) in `fx_rate_history`.
+    `fx_rate_history_meta` records the contiguous date span already fetched for
+    each base, so weekends and holidays without rates are not re-requested.
+    """
+
+    def __init__(self, db, base: str = FX_PIVOT_CURRENCY):
+        self.rates = db.fx_rate_history
+        self.meta = db.fx_rate_history_meta
+        self.base = base.upper()
+
+    async def ensure_indexes(self):
+        await self.rates.create_index([("base", ASCENDING), ("date", ASCENDING)], unique=True)
+        await self.meta.create_index([("base", ASCENDING)], unique=True)
+
+    async def _fetch_span(self, start: str, end: str) -> int:
+        """Download one contiguous span and upsert it in a single bulk write."""
+        response = await http_client.get(
+            FX_HISTORY_API_URL.format(start=start, end=end),
+            params={"from": self.base},
+            timeout=30
+        )
+        response.raise_for_status()
+        series = response.json().get("rates", {})
+
+        operations = [
+            UpdateOne(
+                {"base": self.base, "date": day},
+                {"$set": {"base": self.base, "date": day, "rates": {**rates, self.base: 1.0}}},
+                upsert=True
+            )
+            for day, rates in series.items()
+        ]
+        if operations:
+            await self.rates.bulk_write(operations, ordered=False)
+        logger.info(f"Stored {len(operations)} historical {self.base} rate tables for {start}..{end}")
+        return len(operations)
+
+    async def ensure_range(self, start: str, end: str) -> int:
+        """
+        Make sure every date in [start, end] is covered locally.
+        Only the spans outside the already-fetched window go over the network,
+        each as a single time-series request.
+        """
+        today = datetime.now(timezone.utc).date().isoformat()
+        start = max(start, FX_HISTORY_EARLIEST_DATE)
+        end = min(end, today)
+        if start > end:
+            return 0
+
+        coverage = await self.meta.find_one({"base": self.base})
+        if coverage:
+            covered_start, covered_end = coverage["start_date"], coverage["end_date"]
+            spans = []
+            if start < covered_start:
+                spans.append((start, _shift_date(covered_start, -1)))
+            if end > covered_end:
+                spans.append((_shift_date(covered_end, 1), end))
+        else:
+            covered_start, covered_end = start, end
+            spans = [(start, end)]
+
+        stored = 0
+        for span_start, span_end in spans:
+            try:
+                stored += await self._fetch_span(span_start, span_end)
+            except Exception as e:
+                logger.warning(f"Historical rate fetch for {span_start}..{span_end} failed: {str(e)}")
+                return stored
+
+        if spans:
+            # Today's rates may still be published later, so never mark today as covered
+            new_end = min(max(end, covered_end), _shift_date(today, -1))
+            await self.meta.update_one(
+                {"base": self.base},
+                {"$set": {"base": self.base, "start_date": min(start, covered_start), "end_date": new_end}},
+                upsert=True
+            )
+        return stored
+
+    async def rates_on(self, day: str) -> Optional[Dict[str, float]]:
+        """Rate table for `day`, falling back to the nearest earlier date."""
+        row = await self.rates.find_one(
+            {"base": self.base, "date": {"$lte": day}},
+            {"_id": 0, "rates": 1},
+            sort=[("date", -1)]
+        )
+        return row["rates"] if row else None
+
+    async def load(self, start: str, end: str) -> FXRateHistory:
+        """Load [start, end] plus the nearest earlier row into memory with two queries."""
+        rows = []
+        previous = await self.rates.find_one(
+            {"base": self.base, "date": {"$lt": start}},
+            {"_id": 0, "date": 1, "rates": 1},
+            sort=[("date", -1)]
+        )
+        if previous:
+            rows.append((previous["date"], previous["rates"]))
+
+        cursor = self.rates.find(
+            {"base": self.base, "date": {"$gte": start, "$lte": end}},
+            {"_id": 0, "date": 1, "rates": 1}
+        ).sort("date", ASCENDING)
+        async for row in cursor:
+            rows.append((row["date"], row["rates"]))
+
+        return FXRateHistory(self.base, rows)
@@ -0,0 +1,209 @@
+"""
+Foreign exchange rate cache for AssetVault
+Handles:
+- Fetching full rate tables from exchangerate-api (one request per base currency)
+- Process-wide TTL + LRU caching of those tables
+- Coalescing concurrent misses for the same base into one request
+- Short-lived negative caching of bases the API could not serve
+- Cross-rate matrix for vectorized multi-currency conversion
+- Hit/miss/network-time counters for monitoring
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from cachetools import TTLCache
+
+from http_client import http_client
+
+logger = logging.getLogger(__name__)
+
+EXCHANGE_RATE_API_URL = "https://api.exchangerate-api.com/v4/latest/{base}"
+
+# Rates only move meaningfully a few times a day, so an hour is a safe default
+FX_RATE_CACHE_TTL_SECONDS = int(os.environ.get('FX_RATE_CACHE_TTL_SECONDS', '3600'))
+FX_RATE_CACHE_MAX_BASES = int(os.environ.get('FX_RATE_CACHE_MAX_BASES', '64'))
+
+# Unknown or failing bases are not retried upstream for this long
+FX_RATE_FAILURE_TTL_SECONDS = int(os.environ.get('FX_RATE_FAILURE_TTL_SECONDS', '60'))
+FX_RATE_FAILURE_MAX_BASES = 1024
+
+# Base table every cross rate is triangulated through
+FX_PIVOT_CURRENCY = os.environ.get('FX_PIVOT_CURRENCY', 'USD').upper()
+
+
+class FXMatrix:
+    """
+    Cross rates derived from a single base-currency table.
+    `units[i]` is how many units of currency i buy one unit of the base, so the
+    rate from currency i to currency j is units[j] / units[i].
+    """
+
+    def __init__(self, base: str, rates: Dict[str, float]):
+        self.base = base.upper()
+        table = {code.upper(): float(rate) for code, rate in rates.items() if rate}
+        table[self.base] = 1.0
+        self.currencies = sorted(table)
+        self.index = {code: i for i, code in enumerate(self.currencies)}
+        self.units = np.array([table[code] for code in self.currencies], dtype=np.float64)
+
+    def rate(self, from_currency: str, to_currency: str) -> Optional[float]:
+        """Cross rate between two currencies, or None if either is unknown."""
+        i = self.index.get(from_currency.upper())
+        j = self.index.get(to_currency.upper())
+        if i is None or j is None:
+            return None
+        return float(self.units[j] / self.units[i])
+
+    def cross_rates(self) -> np.ndarray:
+        """Full matrix where entry [i, j] converts currency i into currency j."""
+        return self.units[np.newaxis, :] / self.units[:, np.newaxis]
+
+    def convert(self, amounts: Sequence[float], currencies: Sequence[str], to_currency: str) -> np.ndarray:
+        """
+        Convert a column of amounts, each in its own currency, into `to_currency`.
+        Amounts in unknown currencies (or an unknown target) are returned unchanged,
+        matching convert_currency's fallback.
+        """
+        values = np.asarray(amounts, dtype=np.float64)
+        if values.size == 0:
+            return values
+
+        target = self.index.get(to_currency.upper())
+        if target is None:
+            return values.copy()
+
+        codes, inverse = np.unique(np.char.upper(np.asarray(currencies, dtype=str)), return_inverse=True)
+        code_index = np.array([self.index.get(code, -1) for code in codes], dtype=np.int64)
+        factors = np.ones(len(codes), dtype=np.float64)
+        known = code_index >= 0
+        factors[known] = self.units[target] / self.units[code_index[known]]
+
+        return values * factors[inverse]
+
+
+class FXRateCache:
+    """
+    Caches the full rate table for each base currency.
+    Entries expire after `ttl` seconds; once `maxsize` bases are cached the
+    least recently used one is evicted.
+    """
+
+    def __init__(self, ttl: int = FX_RATE_CACHE_TTL_SECONDS, maxsize: int = FX_RATE_CACHE_MAX_BASES):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._tables = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._failed = TTLCache(maxsize=FX_RATE_FAILURE_MAX_BASES, ttl=FX_RATE_FAILURE_TTL_SECONDS)
+        # base -> (lock, number of callers using it); dropped when the last one leaves
+        self._fetch_locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.fetch_errors = 0
+        self.rejected = 0
+        self.fetch_seconds = 0.0
+
+    async def _fetch_table(self, base: str) -> Optional[Dict[str, float]]:
+        """Download the full rate table for a base currency."""
+        started = time.perf_counter()
+        try:
+            response = await http_client.get(EXCHANGE_RATE_API_URL.format(base=base), timeout=5)
+            if response.status_code != 200:
+                logger.warning(f"Rate table fetch for {base} returned HTTP {response.status_code}")
+                return None
+            return response.json()["rates"]
+        except Exception as e:
+            logger.warning(f"Rate table fetch for {base} failed: {str(e)}")
+            return None
+        finally:
+            self.fetch_seconds += time.perf_counter() - started
+
+    async def get_rates(self, base: str) -> Optional[Dict[str, float]]:
+        """Return the rate table for `base`, fetching it only on a cache miss."""
+        base = base.upper()
+        table = self._tables.get(base)
+        if table is not None:
+            self.hits += 1
+            return table
+        # Not an ISO 4217 code, or recently failed: answer without going upstream
+        if len(base) != 3 or not base.isalpha() or base in self._failed:
+            self.rejected += 1
+            return None
+
+        # Concurrent misses for the same base wait on a single fetch
+        lock, users = self._fetch_locks.get(base, (None, 0))
+        lock = lock or asyncio.Lock()
+        self._fetch_locks[base] = (lock, users + 1)
+        try:
+            async with lock:
+                table = self._tables.get(base)
+                if table is not None:
+                    self.hits += 1
+                    return table
+                if base in self._failed:
+                    self.rejected += 1
+                    return None
+                self.misses += 1
+
+                table = await self._fetch_table(base)
+                if table is None:
+                    self.fetch_errors += 1
+                    self._failed[base] = True
+                    return None
+
+                self._tables[base] = table
+                return table
+        finally:
+            lock, users = self._fetch_locks[base]
+            if users == 1:
+                del self._fetch_locks[base]
+            else:
+                self._fetch_locks[base] = (lock, users - 1)
+
+    async def get_rate(self, from_currency: str, to_currency: str) -> Optional[float]:
+        """Return the rate from one currency to another, or None if unavailable."""
+        if from_currency.upper() == to_currency.upper():
+            return 1.0
+        table = await self.get_rates(from_currency)
+        if table is None:
+            return None
+        return table.get(to_currency.upper())
+
+    async def get_matrix(self, base: str = FX_PIVOT_CURRENCY) -> Optional[FXMatrix]:
+        """Cross-rate matrix built from the cached table for `base`."""
+        table = await self.get_rates(base)
+        if table is None:
+            return None
+        return FXMatrix(base, table)
+
+    def clear(self):
+        self._tables.clear()
+        self._failed.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Counters describing how much network traffic the cache absorbed."""
+        fetches = self.misses - self.fetch_errors
+        avg_fetch_seconds = (self.fetch_seconds / self.misses) if self.misses else 0.0
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "fetch_errors": self.fetch_errors,
+            "rejected_without_fetch": self.rejected,
+            "fetching_bases": len(self._fetch_locks),
+            "successful_fetches": fetches,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "cached_bases": len(self._tables),
+            "max_bases": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "network_seconds": round(self.fetch_seconds, 3),
+            "avg_fetch_seconds": round(avg_fetch_seconds, 3),
+            "estimated_seconds_saved": round(self.hits * avg_fetch_seconds, 3),
+        }
+
+
+# Shared by every request handled in this process
+fx_rate_cache = FXRateCache()
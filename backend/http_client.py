@@ -0,0 +1,87 @@
+"""
+Shared async HTTP client for AssetVault
+Handles:
+- Connection pooling and keep-alive for all outbound calls
+- Per-host concurrency limits so one slow provider cannot starve the others
+- Default timeouts
+"""
+
+import asyncio
+import logging
+import os
+from typing import Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get('HTTP_KEEPALIVE_EXPIRY_SECONDS', '30'))
+HTTP_PER_HOST_CONCURRENCY = int(os.environ.get('HTTP_PER_HOST_CONCURRENCY', '10'))
+HTTP_TIMEOUT_SECONDS = float(os.environ.get('HTTP_TIMEOUT_SECONDS', '10'))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('HTTP_CONNECT_TIMEOUT_SECONDS', '5'))
+
+
+class AsyncHTTPClient:
+    """
+    Thin wrapper around a single httpx.AsyncClient.
+    Every request acquires a semaphore for its host before going out, which
+    caps how many workers can be waiting on the same provider at once.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections: int = HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        per_host_concurrency: int = HTTP_PER_HOST_CONCURRENCY,
+        timeout: float = HTTP_TIMEOUT_SECONDS,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT_SECONDS,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.per_host_concurrency = per_host_concurrency
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+        return self._client
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = httpx.URL(url).host
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_concurrency)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def request(self, method: str, url: str, timeout: Optional[float] = None, **kwargs) -> httpx.Response:
+        """Send a request through the shared pool. `timeout` overrides the default for this call."""
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=min(timeout, self.timeout.connect))
+        async with self._host_semaphore(url):
+            return await self._get_client().request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self):
+        """Close pooled connections (called on app shutdown)."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("HTTP client pool closed")
+        self._client = None
+
+
+# Shared by every request handled in this process
+http_client = AsyncHTTPClient()
@@ -0,0 +1,151 @@
+"""
+Nominee access for AssetVault
+Handles:
+- Storing access tokens as keyed hashes (HMAC-SHA256) looked up through a unique index
+- An encrypted copy of each token so the grantee can still be handed it back
+- A negative cache so repeated or guessed invalid tokens never reach MongoDB
+- Resolving every account a user can open as a nominee in one aggregation
+- Filtering out expired temporary grants inside the query instead of after fetching
+"""
+
+import base64
+import hashlib
+import hmac
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from cachetools import TTLCache
+from cryptography.fernet import Fernet, InvalidToken
+
+logger = logging.getLogger(__name__)
+
+# Tokens are 256-bit random values, so even an unkeyed hash cannot be reversed;
+# the key additionally stops anyone holding a database dump from checking guesses.
+# It also derives the key sealing each token's encrypted copy, so without it those
+# copies could be opened by anyone with the source and a dump: it is mandatory
+# unless ENVIRONMENT explicitly says this is a development or test setup.
+NOMINEE_TOKEN_SECRET = os.environ.get('NOMINEE_TOKEN_SECRET', '')
+NOMINEE_TOKEN_INSECURE_ENVIRONMENTS = ("development", "test")
+if not NOMINEE_TOKEN_SECRET:
+    if os.environ.get('ENVIRONMENT', '').lower() not in NOMINEE_TOKEN_INSECURE_ENVIRONMENTS:
+        raise RuntimeError(
+            "NOMINEE_TOKEN_SECRET must be set (or ENVIRONMENT=development for a local setup): "
+            "it keys nominee token hashes and encrypts their stored copies"
+        )
+    logger.warning("NOMINEE_TOKEN_SECRET is not set; using a publicly known development key for nominee tokens")
+
+NOMINEE_INVALID_TOKEN_CACHE_TTL_SECONDS = int(os.environ.get('NOMINEE_INVALID_TOKEN_CACHE_TTL_SECONDS', '600'))
+NOMINEE_INVALID_TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get('NOMINEE_INVALID_TOKEN_CACHE_MAX_ENTRIES', '50000'))
+
+_fernet = Fernet(base64.urlsafe_b64encode(hashlib.sha256(f"nominee-token:{NOMINEE_TOKEN_SECRET}".encode()).digest()))
+
+
+def hash_access_token(access_token: str) -> str:
+    """Keyed hash stored (and indexed) in place of the raw token."""
+    return hmac.new(NOMINEE_TOKEN_SECRET.encode(), access_token.encode(), hashlib.sha256).hexdigest()
+
+
+def seal_access_token(access_token: str) -> str:
+    """Encrypted copy of the token, for showing it again to the nominee it belongs to."""
+    return _fernet.encrypt(access_token.encode()).decode()
+
+
+def unseal_access_token(sealed: Optional[str]) -> Optional[str]:
+    if not sealed:
+        return None
+    try:
+        return _fernet.decrypt(sealed.encode()).decode()
+    except InvalidToken:
+        logger.error("Could not decrypt a sealed nominee token (was NOMINEE_TOKEN_SECRET changed?)")
+        return None
+
+
+def token_fields(access_token: Optional[str]) -> Dict[str, Optional[str]]:
+    """Nominee fields to $set when issuing (or, with None, clearing) a token."""
+    if access_token is None:
+        return {"access_token_hash": None, "access_token_sealed": None}
+    return {"access_token_hash": hash_access_token(access_token), "access_token_sealed": seal_access_token(access_token)}
+
+
+class InvalidTokenCache:
+    """
+    Remembers hashes of tokens that matched no nominee. Only misses are cached:
+    a valid token is always re-read, so revocation still takes effect at once,
+    and newly issued tokens are random and so never already in here.
+    """
+
+    def __init__(self, ttl: int = NOMINEE_INVALID_TOKEN_CACHE_TTL_SECONDS,
+                 maxsize: int = NOMINEE_INVALID_TOKEN_CACHE_MAX_ENTRIES):
+        self._invalid = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.rejected = 0
+        self.lookups = 0
+
+    async def find_nominee(self, nominees, access_token: str, projection: Optional[Dict[str, Any]] = None):
+        """Nominee holding `access_token`, or None. Known-invalid tokens cost no query."""
+        token_hash = hash_access_token(access_token)
+        if token_hash in self._invalid:
+            self.rejected += 1
+            return None
+
+        self.lookups += 1
+        nominee = await nominees.find_one({"access_token_hash": token_hash}, projection)
+        if nominee is None:
+            self._invalid[token_hash] = True
+        return nominee
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "lookups": self.lookups,
+            "rejected_without_query": self.rejected,
+            "cached_invalid_tokens": len(self._invalid),
+            "max_entries": self._invalid.maxsize,
+            "ttl_seconds": self._invalid.ttl,
+        }
+
+
+# Shared by every request handled in this process
+invalid_token_cache = InvalidTokenCache()
+
+
+# A user is rarely a nominee on more than a handful of accounts
+MY_ACCESSES_LIMIT = 100
+
+
+def my_accesses_pipeline(email: str, now: datetime, limit: int = MY_ACCESSES_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Granted nominee records for `email` joined with their owners in a single
+    round trip. Temporary grants whose access_expires_at has passed never leave
+    the server; records whose owner no longer exists are dropped by the $unwind.
+    """
+    return [
+        {"$match": {
+            "email": email,
+            "access_granted": True,
+            "$or": [
+                {"access_type": {"$ne": "temporary"}},
+                {"access_expires_at": {"$in": [None, ""]}},
+                # access_expires_at is an ISO string on older records and may be a date on newer ones
+                {"$expr": {"$gt": [
+                    {"$convert": {"input": "$access_expires_at", "to": "date", "onError": None, "onNull": None}},
+                    now
+                ]}}
+            ]
+        }},
+        {"$limit": limit},
+        {"$lookup": {"from": "users", "localField": "user_id", "foreignField": "id", "as": "owner"}},
+        {"$unwind": "$owner"},
+        {"$project": {
+            "_id": 0,
+            "account_id": "$owner.id",
+            "account_name": {"$ifNull": ["$owner.name", "Unknown"]},
+            "account_email": {"$ifNull": ["$owner.email", None]},
+            "access_type": {"$ifNull": ["$access_type", "after_dms"]},
+            # Decrypted by the caller with unseal_access_token
+            "access_token_sealed": {"$ifNull": ["$access_token_sealed", None]},
+            "relationship": {"$ifNull": ["$relationship", None]},
+            "granted_at": {"$ifNull": ["$access_token_created_at", None]},
+            "expires_at": {"$ifNull": ["$access_expires_at", None]}
+        }}
+    ]
@@ -0,0 +1,97 @@
+"""
+Nominee dashboard cache for AssetVault
+Handles:
+- Keeping each owner's read-only nominee view (assets, portfolios, documents, will, nominees) in memory
+- A content hash per cached view, used as the HTTP ETag so unchanged views cost a 304
+- Invalidation whenever the owner's data changes, with a TTL bounding staleness across processes
+"""
+
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+NOMINEE_VIEW_CACHE_TTL_SECONDS = int(os.environ.get('NOMINEE_VIEW_CACHE_TTL_SECONDS', '300'))
+NOMINEE_VIEW_CACHE_MAX_ENTRIES = int(os.environ.get('NOMINEE_VIEW_CACHE_MAX_ENTRIES', '1000'))
+
+
+class NomineeViewCache:
+    """
+    One entry per owner, shared by all of that owner's nominees. Entries are
+    JSON-ready payloads plus their ETag. Access checks are not cached: every
+    request still validates the nominee's token, so revocation is immediate.
+
+    Each owner also has a generation that invalidate_owner bumps. A builder
+    reads it before building and passes it to put, so a view built from data
+    that changed mid-build is served once but never cached.
+    """
+
+    def __init__(self, ttl: int = NOMINEE_VIEW_CACHE_TTL_SECONDS, maxsize: int = NOMINEE_VIEW_CACHE_MAX_ENTRIES):
+        self._views = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Kept well past a view's lifetime so a generation is not forgotten mid-build
+        self._generations = TTLCache(maxsize=maxsize * 10, ttl=ttl * 2)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_builds = 0
+
+    def get(self, owner_id: str) -> Optional[Dict[str, Any]]:
+        """Cached {"payload", "etag", "built_at"} for an owner, or None."""
+        entry = self._views.get(owner_id)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def generation(self, owner_id: str) -> int:
+        """Read before building a view; pass the value to put."""
+        return self._generations.get(owner_id, 0)
+
+    def put(self, owner_id: str, payload: Dict[str, Any], generation: int) -> Dict[str, Any]:
+        """
+        Return the entry for a JSON-ready payload, caching it only if the owner
+        was not invalidated since `generation` was read.
+        """
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+        entry = {
+            "payload": payload,
+            "etag": digest[:32],
+            "built_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if self._generations.get(owner_id, 0) == generation:
+            self._views[owner_id] = entry
+        else:
+            self.stale_builds += 1
+        return entry
+
+    def invalidate_owner(self, owner_id: str):
+        self._generations[owner_id] = self._generations.get(owner_id, 0) + 1
+        if self._views.pop(owner_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._views.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "stale_builds_not_cached": self.stale_builds,
+            "cached_views": len(self._views),
+            "max_views": self._views.maxsize,
+            "ttl_seconds": self._views.ttl,
+        }
+
+
+# Shared by every request handled in this process
+nominee_view_cache = NomineeViewCache()
@@ -0,0 +1,213 @@
+"""
+Market price service for AssetVault
+Handles:
+- Batched CoinGecko quotes (one upstream get_price call for many coins)
+- Short-TTL quote cache shared by the API and background jobs
+- Coalescing concurrent requests for the same coins into a single in-flight fetch
+- Pluggable price providers for the background market-price refresher
+"""
+
+import asyncio
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cachetools import TTLCache
+from pycoingecko import CoinGeckoAPI
+
+logger = logging.getLogger(__name__)
+
+CRYPTO_PRICE_CACHE_TTL_SECONDS = int(os.environ.get('CRYPTO_PRICE_CACHE_TTL_SECONDS', '60'))
+CRYPTO_PRICE_CACHE_MAX_ENTRIES = int(os.environ.get('CRYPTO_PRICE_CACHE_MAX_ENTRIES', '10000'))
+
+# CoinGecko accepts a few hundred ids per call before the URL gets too long
+CRYPTO_PRICE_BATCH_SIZE = int(os.environ.get('CRYPTO_PRICE_BATCH_SIZE', '250'))
+
+# Ticker symbols stored on assets and holdings, mapped to CoinGecko ids.
+# Anything not listed is assumed to already be a CoinGecko id.
+COINGECKO_IDS = {
+    "BTC": "bitcoin",
+    "ETH": "ethereum",
+    "SOL": "solana",
+    "BNB": "binancecoin",
+    "XRP": "ripple",
+    "ADA": "cardano",
+    "DOGE": "dogecoin",
+    "DOT": "polkadot",
+    "MATIC": "matic-network",
+    "AVAX": "avalanche-2",
+    "LINK": "chainlink",
+    "LTC": "litecoin",
+    "USDT": "tether",
+    "USDC": "usd-coin",
+}
+
+
+def coingecko_id(symbol: str) -> str:
+    return COINGECKO_IDS.get(symbol.upper(), symbol.lower())
+
+
+class CryptoPriceService:
+    """
+    Quotes are cached per (coin id, vs currency). A request for many symbols
+    costs at most one upstream call per CRYPTO_PRICE_BATCH_SIZE uncached coins,
+    and callers asking for a coin that is already being fetched wait on that
+    fetch instead of starting another.
+    """
+
+    def __init__(self, client: Optional[CoinGeckoAPI] = None,
+                 ttl: int = CRYPTO_PRICE_CACHE_TTL_SECONDS,
+                 maxsize: int = CRYPTO_PRICE_CACHE_MAX_ENTRIES,
+                 batch_size: int = CRYPTO_PRICE_BATCH_SIZE):
+        self._client = client or CoinGeckoAPI()
+        self._quotes = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self.upstream_calls = 0
+
+    async def _fetch(self, coin_ids: List[str], currency: str):
+        """
+        Fetch uncached coins in batches and resolve their in-flight futures.
+        Every future is settled however this ends: if the fetching task is
+        cancelled, the callers waiting on it get an error instead of hanging.
+        """
+        try:
+            for start in range(0, len(coin_ids), self.batch_size):
+                batch = coin_ids[start:start + self.batch_size]
+                try:
+                    self.upstream_calls += 1
+                    # pycoingecko is synchronous; keep it off the event loop
+                    data = await asyncio.to_thread(self._client.get_price, ids=batch, vs_currencies=currency)
+                    for coin_id in batch:
+                        price = data.get(coin_id, {}).get(currency)
+                        if price is not None:
+                            self._quotes[(coin_id, currency)] = price
+                        self._in_flight.pop((coin_id, currency)).set_result(price)
+                except Exception as e:
+                    logger.warning(f"CoinGecko price fetch for {len(batch)} coins failed: {str(e)}")
+                    for coin_id in batch:
+                        future = self._in_flight.pop((coin_id, currency), None)
+                        if future is not None and not future.done():
+                            future.set_exception(e)
+        finally:
+            for coin_id in coin_ids:
+                future = self._in_flight.pop((coin_id, currency), None)
+                if future is not None and not future.done():
+                    future.set_exception(RuntimeError("CoinGecko price fetch was interrupted"))
+
+    async def get_prices(self, symbols: Iterable[str], currency: str = "usd") -> Dict[str, Optional[float]]:
+        """
+        Return {symbol: price} for every requested symbol (None if CoinGecko has no quote).
+        Raises if the upstream call for an uncached symbol fails.
+        """
+        currency = currency.lower()
+        symbol_ids = {symbol: coingecko_id(symbol) for symbol in symbols}
+
+        prices: Dict[str, Optional[float]] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        to_fetch: List[str] = []
+        loop = asyncio.get_running_loop()
+
+        for coin_id in set(symbol_ids.values()):
+            key = (coin_id, currency)
+            cached = self._quotes.get(key)
+            if cached is not None:
+                self.hits += 1
+                prices[coin_id] = cached
+                continue
+
+            self.misses += 1
+            future = self._in_flight.get(key)
+            if future is None:
+                future = loop.create_future()
+                self._in_flight[key] = future
+                to_fetch.append(coin_id)
+            waiting[coin_id] = future
+
+        if to_fetch:
+            await self._fetch(to_fetch, currency)
+
+        for coin_id, future in waiting.items():
+            prices[coin_id] = await asyncio.shield(future)
+
+        return {symbol: prices.get(coin_id) for symbol, coin_id in symbol_ids.items()}
+
+    async def get_price(self, symbol: str, currency: str = "usd") -> Optional[float]:
+        prices = await self.get_prices([symbol], currency)
+        return prices[symbol]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "upstream_calls": self.upstream_calls,
+            "cached_quotes": len(self._quotes),
+            "in_flight": len(self._in_flight),
+        }
+
+
+# Shared by every request and job in this process
+crypto_price_service = CryptoPriceService()
+
+
+class PriceProvider(ABC):
+    """
+    Source of market prices for the background refresher.
+    `asset_types` lists the asset/holding types the provider can price.
+    """
+    name = "base"
+    asset_types: Tuple[str, ...] = ()
+
+    @abstractmethod
+    async def fetch_prices(self, symbols: List[str], currency: str) -> Dict[str, Optional[float]]:
+        """Return {symbol: price in `currency`} for one batch of symbols."""
+
+
+class CoinGeckoPriceProvider(PriceProvider):
+    """Crypto prices from CoinGecko, through the shared cached service."""
+    name = "coingecko"
+    asset_types = ("crypto",)
+
+    def __init__(self, service: CryptoPriceService = crypto_price_service):
+        self.service = service
+
+    async def fetch_prices(self, symbols: List[str], currency: str) -> Dict[str, Optional[float]]:
+        return await self.service.get_prices(symbols, currency)
+
+
+class StaticPriceProvider(PriceProvider):
+    """
+    Local stand-in for tests and offline environments.
+    Prices come from a dict (or JSON file) shaped {"USD": {"BTC": 95000.0, "AAPL": 190.0}}.
+    """
+    name = "static"
+    asset_types = ("crypto", "stock")
+
+    def __init__(self, prices: Optional[Dict[str, Dict[str, float]]] = None):
+        self.prices = {
+            currency.upper(): {symbol.upper(): price for symbol, price in quotes.items()}
+            for currency, quotes in (prices or {}).items()
+        }
+
+    @classmethod
+    def from_file(cls, path: Optional[str]) -> "StaticPriceProvider":
+        if not path:
+            return cls()
+        with open(path) as f:
+            return cls(json.load(f))
+
+    async def fetch_prices(self, symbols: List[str], currency: str) -> Dict[str, Optional[float]]:
+        quotes = self.prices.get(currency.upper(), {})
+        return {symbol: quotes.get(symbol.upper()) for symbol in symbols}
+
+
+def get_price_provider(name: Optional[str] = None) -> PriceProvider:
+    """Provider selected by MARKET_PRICE_PROVIDER (coingecko or static)."""
+    name = (name or os.environ.get('MARKET_PRICE_PROVIDER', 'coingecko')).lower()
+    if name == "static":
+        return StaticPriceProvider.from_file(os.environ.get('MARKET_PRICE_FILE'))
+    return CoinGeckoPriceProvider()
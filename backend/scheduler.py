@@ -4,6 +4,7 @@ Handles:
 - Dead Man Switch (DMS) checking and reminders
 - Scheduled message sending
 - Retry mechanisms for failed jobs
+- Market price refresh for crypto/stock assets and portfolio holdings
 """
 
 import asyncio
@@ -11,22 +12,64 @@ import logging
 from datetime import datetime, timezone, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateMany, UpdateOne
 import os
 
+from price_service import PriceProvider, get_price_provider
+from usage_counters import UsageCounters
+from blob_store import get_blob_store
+from thumbnails import generate_pending_thumbnails, THUMBNAIL_BATCH_SIZE, THUMBNAIL_INTERVAL_SECONDS
+from dms_schedule import due_filter, reschedule_update, DMS_REMINDER_LEAD_DAYS
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # MongoDB connection
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(MONGO_URL)
+# tz_aware like server.py's client, so BSON dates read here compare and round-trip the same way
+client = AsyncIOMotorClient(MONGO_URL, tz_aware=True)
 db_name = os.environ.get('DB_NAME', 'test_database')
 db = client[db_name]
+blob_store = get_blob_store(db)
 
 # Initialize scheduler
 scheduler = AsyncIOScheduler()
 
+# Market price refresh settings
+MARKET_PRICE_REFRESH_MINUTES = int(os.environ.get('MARKET_PRICE_REFRESH_MINUTES', '15'))
+MARKET_PRICE_FETCH_BATCH_SIZE = int(os.environ.get('MARKET_PRICE_FETCH_BATCH_SIZE', '250'))
+BULK_WRITE_BATCH_SIZE = 1000
+
+def dms_due_pipeline(now):
+    """
+    Active switches whose precomputed remind_at or trigger_at has passed,
+    joined with the owner and their nominees. The first stage is an index
+    range scan, so switches that are not due are never even read.
+    """
+    return [
+        {"$match": due_filter(now)},
+        {"$lookup": {"from": "users", "localField": "user_id", "foreignField": "id", "as": "user"}},
+        {"$unwind": "$user"},
+        {"$project": {
+            "user_id": 1,
+            "inactivity_days": 1,
+            "reminders_sent": {"$ifNull": ["$reminders_sent", 0]},
+            "user_email": "$user.email",
+            "user_name": "$user.name",
+            # last_activity is an ISO string on most users
+            "last_activity": {"$convert": {"input": "$user.last_activity", "to": "date", "onError": None, "onNull": None}}
+        }},
+        {"$match": {"last_activity": {"$ne": None}}},
+        # Whole days, truncated like timedelta.days
+        {"$addFields": {"days_inactive": {"$floor": {"$divide": [{"$subtract": [now, "$last_activity"]}, 86400000]}}}},
+        {"$lookup": {"from": "nominees", "localField": "user_id", "foreignField": "user_id", "as": "nominees"}},
+        {"$addFields": {"nominee_email": {"$arrayElemAt": ["$nominees.email", 0]}}},
+        {"$project": {"nominees": 0}}
+    ]
+
 async def check_dms_and_send_reminders():
     """
     Check all active Dead Man Switches and send reminders/alerts
@@ -34,68 +77,60 @@ async def check_dms_and_send_reminders():
     """
     logger.info("Starting DMS check...")
     try:
-        # Get all active DMS
-        dms_list = await db.dead_man_switches.find({"is_active": True}).to_list(1000)
+        now = datetime.now(timezone.utc)
+        operations = []
+        due = triggered = reminded = rescheduled = 0
         
-        for dms in dms_list:
-            user_id = dms["user_id"]
+        # Streamed, so memory stays flat however many switches exist
+        async for dms in db.dead_man_switches.aggregate(dms_due_pipeline(now), allowDiskUse=True):
+            due += 1
             inactivity_days = dms["inactivity_days"]
-            reminders_sent = dms.get("reminders_sent", 0)
-            
-            # Get user's last activity
-            user = await db.users.find_one({"id": user_id})
-            if not user:
-                continue
-            
-            last_activity = user.get("last_activity")
-            if isinstance(last_activity, str):
-                last_activity = datetime.fromisoformat(last_activity)
-            
-            # Calculate days inactive
-            days_inactive = (datetime.now(timezone.utc) - last_activity).days
-            
-            # Reminder thresholds
-            reminder_threshold = inactivity_days - 7  # Remind 7 days before trigger
+            days_inactive = int(dms["days_inactive"])
             
             if days_inactive >= inactivity_days:
                 # DMS TRIGGERED! Alert nominee
-                logger.warning(f"DMS TRIGGERED for user {user['email']} - {days_inactive} days inactive")
+                logger.warning(f"DMS TRIGGERED for user {dms.get('user_email')} - {days_inactive} days inactive")
                 
-                # Get nominee info
-                nominee = await db.nominees.find_one({"user_id": user_id})
-                if nominee:
+                if dms.get("nominee_email"):
                     # MOCK EMAIL: Send email to nominee with asset information
-                    logger.info(f"📧 [MOCK EMAIL] Sending DMS Alert to nominee {nominee['email']}")
-                    logger.info(f"   Subject: Important Alert from {user['name']}")
-                    logger.info(f"   Message: Dead Man Switch activated for {user['email']}")
+                    logger.info(f"📧 [MOCK EMAIL] Sending DMS Alert to nominee {dms['nominee_email']}")
+                    logger.info(f"   Subject: Important Alert from {dms.get('user_name')}")
+                    logger.info(f"   Message: Dead Man Switch activated for {dms.get('user_email')}")
                     logger.info(f"   Action: Providing access to asset information")
                     
-                    # Mark DMS as triggered
-                    await db.dead_man_switches.update_one(
-                        {"id": dms["id"]},
-                        {"$set": {
-                            "is_active": False,
-                            "triggered_at": datetime.now(timezone.utc).isoformat()
-                        }}
-                    )
+                    # Mark DMS as triggered (by _id: seeded switches have no id field)
+                    operations.append(UpdateOne(
+                        {"_id": dms["_id"]},
+                        {"$set": {"is_active": False, "triggered_at": now.isoformat(), "remind_at": None, "trigger_at": None}}
+                    ))
+                    triggered += 1
             
-            elif days_inactive >= reminder_threshold and reminders_sent == 0:
+            elif days_inactive >= inactivity_days - DMS_REMINDER_LEAD_DAYS and dms["reminders_sent"] == 0:
                 # Send first reminder to user
-                logger.info(f"Sending reminder to {user['email']} - {days_inactive} days inactive")
+                logger.info(f"Sending reminder to {dms.get('user_email')} - {days_inactive} days inactive")
                 
                 # MOCK EMAIL: Send email reminder to user
-                logger.info(f"📧 [MOCK EMAIL] Sending DMS Reminder to {user['email']}")
+                logger.info(f"📧 [MOCK EMAIL] Sending DMS Reminder to {dms.get('user_email')}")
                 logger.info(f"   Subject: Activity Reminder - Dead Man Switch")
                 logger.info(f"   Message: You've been inactive for {days_inactive} days")
                 logger.info(f"   Warning: DMS will trigger in {inactivity_days - days_inactive} days")
                 
-                # Update reminders sent count
-                await db.dead_man_switches.update_one(
-                    {"id": dms["id"]},
-                    {"$set": {"reminders_sent": 1}}
-                )
+                operations.append(UpdateOne({"_id": dms["_id"]}, {"$set": {"reminders_sent": 1, "remind_at": None}}))
+                reminded += 1
+            
+            else:
+                # Dates were stale (e.g. activity not yet flushed when they were computed); re-anchor them
+                operations.append(UpdateOne({"_id": dms["_id"]}, reschedule_update(dms["last_activity"])))
+                rescheduled += 1
+            
+            if len(operations) >= BULK_WRITE_BATCH_SIZE:
+                await db.dead_man_switches.bulk_write(operations, ordered=False)
+                operations = []
         
-        logger.info(f"DMS check complete. Checked {len(dms_list)} DMS configurations")
+        if operations:
+            await db.dead_man_switches.bulk_write(operations, ordered=False)
+        
+        logger.info(f"DMS check complete. {due} due switches: {triggered} triggered, {reminded} reminders sent, {rescheduled} rescheduled")
         
     except Exception as e:
         logger.error(f"Error in DMS check: {str(e)}")
@@ -193,6 +228,191 @@ async def retry_failed_messages():
     except Exception as e:
         logger.error(f"Error in retry failed messages: {str(e)}")
 
+async def collect_market_symbols(asset_types):
+    """
+    Distinct (symbol, currency) pairs across all assets and portfolio holdings
+    of the given types, grouped server-side so no documents are pulled into Python.
+    """
+    pairs = set()
+    
+    asset_pipeline = [
+        {"$match": {"type": {"$in": list(asset_types)}, "symbol": {"$nin": [None, ""]}}},
+        {"$group": {"_id": {
+            "symbol": "$symbol",
+            "currency": {"$ifNull": ["$purchase_currency", "USD"]}
+        }}}
+    ]
+    async for row in db.assets.aggregate(asset_pipeline, allowDiskUse=True):
+        pairs.add((row["_id"]["symbol"], row["_id"]["currency"]))
+    
+    holding_pipeline = [
+        {"$match": {"holdings.asset_type": {"$in": list(asset_types)}}},
+        {"$unwind": "$holdings"},
+        {"$match": {"holdings.asset_type": {"$in": list(asset_types)}, "holdings.symbol": {"$nin": [None, ""]}}},
+        {"$group": {"_id": {
+            "symbol": "$holdings.symbol",
+            "currency": {"$ifNull": ["$holdings.purchase_currency", {"$ifNull": ["$purchase_currency", "USD"]}]}
+        }}}
+    ]
+    async for row in db.portfolio_assets.aggregate(holding_pipeline, allowDiskUse=True):
+        pairs.add((row["_id"]["symbol"], row["_id"]["currency"]))
+    
+    return pairs
+
+def build_price_updates(symbol, currency, price, asset_types, refreshed_at):
+    """
+    Write operations applying one price to every matching asset and holding.
+    One UpdateMany per (symbol, currency), regardless of how many documents hold it.
+    """
+    currency_match = {"$in": [currency, None]} if currency == "USD" else currency
+    
+    asset_update = UpdateMany(
+        {"type": {"$in": list(asset_types)}, "symbol": symbol, "purchase_currency": currency_match},
+        [{"$set": {
+            "current_unit_price": price,
+            "current_total_value": {"$cond": [
+                {"$gt": [{"$ifNull": ["$quantity", 0]}, 0]},
+                {"$multiply": ["$quantity", price]},
+                "$current_total_value"
+            ]},
+            "price_updated_at": refreshed_at
+        }}]
+    )
+    
+    is_match = {"$and": [
+        {"$eq": ["$$h.symbol", symbol]},
+        # A stock and a coin can share a ticker; only reprice the provider's types
+        {"$in": ["$$h.asset_type", list(asset_types)]},
+        {"$eq": [{"$ifNull": ["$$h.purchase_currency", {"$ifNull": ["$purchase_currency", "USD"]}]}, currency]}
+    ]}
+    portfolio_update = UpdateMany(
+        {"holdings": {"$elemMatch": {"symbol": symbol, "asset_type": {"$in": list(asset_types)}}}},
+        [
+            # Reprice the matching holdings
+            {"$set": {"holdings": {"$map": {
+                "input": "$holdings",
+                "as": "h",
+                "in": {"$cond": [
+                    is_match,
+                    {"$mergeObjects": ["$$h", {
+                        "current_price": price,
+                        "current_value": {"$multiply": [{"$ifNull": ["$$h.quantity", 0]}, price]}
+                    }]},
+                    "$$h"
+                ]}
+            }}}},
+            # Recompute total_value in the same pass (same rules as recalculate_portfolio_value)
+            {"$set": {
+                "total_value": {"$sum": {"$map": {
+                    "input": "$holdings",
+                    "as": "h",
+                    "in": {"$switch": {
+                        "branches": [
+                            {"case": "$$h.current_value", "then": "$$h.current_value"},
+                            {"case": "$$h.current_price", "then": {"$multiply": ["$$h.quantity", "$$h.current_price"]}}
+                        ],
+                        "default": {"$multiply": ["$$h.quantity", "$$h.purchase_price"]}
+                    }}
+                }}},
+                "price_updated_at": refreshed_at
+            }}
+        ]
+    )
+    
+    return asset_update, portfolio_update
+
+async def refresh_market_prices(provider: PriceProvider = None):
+    """
+    Fetch fresh prices for every symbol held across assets and portfolios
+    and write them back in bulk.
+    Runs every MARKET_PRICE_REFRESH_MINUTES minutes
+    """
+    provider = provider or get_price_provider()
+    logger.info(f"Starting market price refresh ({provider.name})...")
+    try:
+        pairs = await collect_market_symbols(provider.asset_types)
+        if not pairs:
+            logger.info("Market price refresh complete. No symbols to price")
+            return
+        
+        # Group symbols by quote currency so each batch is one provider call
+        symbols_by_currency = {}
+        for symbol, currency in pairs:
+            symbols_by_currency.setdefault(currency, []).append(symbol)
+        
+        refreshed_at = datetime.now(timezone.utc).isoformat()
+        asset_ops = []
+        portfolio_ops = []
+        priced = 0
+        
+        for currency, symbols in symbols_by_currency.items():
+            for start in range(0, len(symbols), MARKET_PRICE_FETCH_BATCH_SIZE):
+                batch = symbols[start:start + MARKET_PRICE_FETCH_BATCH_SIZE]
+                try:
+                    prices = await provider.fetch_prices(batch, currency)
+                except Exception as e:
+                    logger.error(f"Price fetch failed for {len(batch)} {currency} symbols: {str(e)}")
+                    continue
+                
+                for symbol in batch:
+                    price = prices.get(symbol)
+                    if price is None:
+                        continue
+                    asset_update, portfolio_update = build_price_updates(
+                        symbol, currency, float(price), provider.asset_types, refreshed_at
+                    )
+                    asset_ops.append(asset_update)
+                    portfolio_ops.append(portfolio_update)
+                    priced += 1
+        
+        assets_modified = 0
+        portfolios_modified = 0
+        for start in range(0, len(asset_ops), BULK_WRITE_BATCH_SIZE):
+            result = await db.assets.bulk_write(asset_ops[start:start + BULK_WRITE_BATCH_SIZE], ordered=False)
+            assets_modified += result.modified_count
+        for start in range(0, len(portfolio_ops), BULK_WRITE_BATCH_SIZE):
+            result = await db.portfolio_assets.bulk_write(portfolio_ops[start:start + BULK_WRITE_BATCH_SIZE], ordered=False)
+            portfolios_modified += result.modified_count
+        
+        if assets_modified or portfolios_modified:
+            # Valuations changed, so materialized dashboard summaries are stale
+            await db.dashboard_summaries.update_many(
+                {"dirty": False},
+                {"$set": {"dirty": True}, "$inc": {"version": 1}}
+            )
+        
+        logger.info(
+            f"Market price refresh complete. Priced {priced}/{len(pairs)} symbols, "
+            f"updated {assets_modified} assets and {portfolios_modified} portfolios"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error in market price refresh: {str(e)}")
+
+async def generate_thumbnails():
+    """
+    Render previews for newly uploaded image documents
+    Runs every THUMBNAIL_INTERVAL_SECONDS seconds
+    """
+    try:
+        # Keep going while full batches come back so a burst of uploads drains in one run
+        while (await generate_pending_thumbnails(db.documents, blob_store))["processed"] == THUMBNAIL_BATCH_SIZE:
+            pass
+    except Exception as e:
+        logger.error(f"Thumbnail generation failed: {str(e)}")
+
+async def reconcile_usage_counters():
+    """
+    Recompute every user's asset/document/storage counters from source
+    and correct any that drifted.
+    Runs daily at 3 AM
+    """
+    logger.info("Starting usage counter reconciliation...")
+    try:
+        await UsageCounters(db).reconcile_all()
+    except Exception as e:
+        logger.error(f"Usage counter reconciliation failed: {str(e)}")
+
 def start_scheduler():
     """Start all scheduled jobs"""
     try:
@@ -223,12 +443,42 @@ def start_scheduler():
             replace_existing=True
         )
         
+        # Market price refresh - Every MARKET_PRICE_REFRESH_MINUTES minutes
+        scheduler.add_job(
+            refresh_market_prices,
+            IntervalTrigger(minutes=MARKET_PRICE_REFRESH_MINUTES),
+            id='market_price_refresh',
+            name='Refresh Market Prices',
+            replace_existing=True
+        )
+        
+        # Document thumbnails - Every THUMBNAIL_INTERVAL_SECONDS seconds
+        scheduler.add_job(
+            generate_thumbnails,
+            IntervalTrigger(seconds=THUMBNAIL_INTERVAL_SECONDS),
+            id='document_thumbnails',
+            name='Generate Document Thumbnails',
+            replace_existing=True
+        )
+        
+        # Usage counter reconciliation - Daily at 3 AM
+        scheduler.add_job(
+            reconcile_usage_counters,
+            CronTrigger(hour=3, minute=0),
+            id='usage_reconciliation',
+            name='Reconcile Usage Counters',
+            replace_existing=True
+        )
+        
         scheduler.start()
         logger.info("Scheduler started successfully")
         logger.info("Jobs configured:")
         logger.info("  - DMS check: Daily at 9:00 AM")
         logger.info("  - Scheduled messages: Every hour")
         logger.info("  - Retry failed: Daily at 10:00 AM")
+        logger.info(f"  - Market price refresh: Every {MARKET_PRICE_REFRESH_MINUTES} minutes")
+        logger.info(f"  - Document thumbnails: Every {THUMBNAIL_INTERVAL_SECONDS} seconds")
+        logger.info("  - Usage reconciliation: Daily at 3:00 AM")
         
     except Exception as e:
         logger.error(f"Failed to start scheduler: {str(e)}")
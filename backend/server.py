@@ -1,18 +1,23 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Response, Request, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Response, Request, Depends, BackgroundTasks, UploadFile, File, Form, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Awaitable, Callable
 import uuid
 from datetime import datetime, timezone, timedelta
-import requests
 import json
-from pycoingecko import CoinGeckoAPI
+import base64
+import hashlib
+from urllib.parse import quote
+from collections import Counter
 import asyncio
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import stripe
@@ -24,12 +29,34 @@ load_dotenv(ROOT_DIR / '.env', override=False)
 
 # Import scheduler functions
 from scheduler import start_scheduler, stop_scheduler
+from fx_rates import fx_rate_cache, FXMatrix, FX_PIVOT_CURRENCY
+from fx_history import FXHistoryStore, FXRateHistory
+from http_client import http_client
+from price_service import crypto_price_service, CRYPTO_PRICE_BATCH_SIZE
+from valuation import AssetValuation, LIABILITY_TYPES, ASSET_CURRENT_VALUE_EXPR
+from db_indexes import ensure_indexes, index_report
+from session_cache import session_cache
+from activity_buffer import activity_buffer
+from usage_counters import UsageCounters
+from dms_schedule import reschedule_update, reschedule_after_activity, backfill_pipeline
+from nominee_view_cache import nominee_view_cache
+from nominee_access import (
+    my_accesses_pipeline, MY_ACCESSES_LIMIT, invalid_token_cache,
+    token_fields, unseal_access_token
+)
+from thumbnails import wants_thumbnail, queue_missing_thumbnails, THUMBNAIL_PENDING, THUMBNAIL_CONTENT_TYPE
+from blob_store import (
+    get_blob_store, decode_file_data, migrate_inline_documents, iter_bytes,
+    parse_range_header, BlobNotFoundError, RangeNotSatisfiableError
+)
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# tz_aware so BSON dates (session expiry, audit timestamps) come back as UTC-aware datetimes
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
-
-cg = CoinGeckoAPI()
+fx_history_store = FXHistoryStore(db)
+blob_store = get_blob_store(db)
+usage_counters = UsageCounters(db)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -77,6 +104,7 @@ class Nominee(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
+    is_demo: bool = False  # Seeded demo data, kept apart from live data
     name: str
     email: str
     phone: Optional[str] = None
@@ -84,7 +112,7 @@ class Nominee(BaseModel):
     priority: int = 1  # Priority for contact order (1 = highest priority)
     access_granted: bool = False  # Whether nominee has been granted access
     access_type: str = "after_dms"  # 'after_dms', 'immediate', or 'temporary'
-    access_token: Optional[str] = None  # Secure token for nominee login
+    access_token: Optional[str] = None  # Secure token for nominee login; stored only as access_token_hash + access_token_sealed
     access_token_created_at: Optional[datetime] = None
     access_expires_at: Optional[datetime] = None  # For temporary access
     last_accessed_at: Optional[datetime] = None
@@ -117,10 +145,14 @@ class Document(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
+    is_demo: bool = False  # Seeded demo data, kept apart from live data
     name: str
     description: Optional[str] = None
     file_type: str
-    file_data: str  # base64 encoded
+    file_data: Optional[str] = None  # Legacy inline base64 payload; content now lives in the blob store
+    blob_ref: Optional[Dict[str, Any]] = None  # {"backend", "key" (SHA-256), "size"}
+    thumbnail_ref: Optional[Dict[str, Any]] = None  # Small JPEG preview blob, filled in by the scheduler
+    thumbnail_status: Optional[str] = None  # pending / ready / failed / skipped
     file_size: int
     tags: List[str] = []
     share_with_nominee: bool = False
@@ -132,6 +164,7 @@ class Asset(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
+    is_demo: bool = False  # Seeded demo data, kept apart from live data
     type: str
     name: str
     
@@ -254,6 +287,7 @@ class ScheduledMessage(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
+    is_demo: bool = False  # Seeded demo data, kept apart from live data
     recipient_name: str
     recipient_email: str
     subject: str
@@ -309,6 +343,7 @@ class PortfolioAsset(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
+    is_demo: bool = False  # Seeded demo data, kept apart from live data
     type: str = "portfolio"  # New asset type
     name: str
     provider_name: str  # Binance, Zerodha, Robinhood, etc
@@ -667,10 +702,18 @@ async def get_current_user(request: Request) -> Optional[User]:
         logger.debug(f"No session token found. Cookies present: {cookies_present}")
         return None
     
+    # Cached sessions skip the session and user lookups entirely
+    cached_user = session_cache.get(session_token)
+    if cached_user is not None:
+        activity_buffer.record(cached_user.id)
+        return cached_user
+    
     session = await db.user_sessions.find_one({"session_token": session_token})
     if not session:
         return None
     
+    # Expired sessions are removed by the TTL index on expires_at; this only covers
+    # the window before the TTL monitor gets to them
     expires_at = session["expires_at"]
     if isinstance(expires_at, str):
         expires_at = datetime.fromisoformat(expires_at)
@@ -678,24 +721,30 @@ async def get_current_user(request: Request) -> Optional[User]:
         expires_at = expires_at.replace(tzinfo=timezone.utc)
     
     if expires_at < datetime.now(timezone.utc):
-        await db.user_sessions.delete_one({"session_token": session_token})
         return None
     
     user_doc = await db.users.find_one({"id": session["user_id"]})
     if not user_doc:
         return None
     
-    await db.users.update_one(
-        {"id": session["user_id"]},
-        {"$set": {"last_activity": datetime.now(timezone.utc).isoformat()}}
-    )
+    # last_activity is written behind in batches (see activity_buffer)
+    activity_buffer.record(session["user_id"])
     
     if isinstance(user_doc.get('last_activity'), str):
         user_doc['last_activity'] = datetime.fromisoformat(user_doc['last_activity'])
     if isinstance(user_doc.get('created_at'), str):
         user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
     
-    return User(**user_doc)
+    user = User(**user_doc)
+    session_cache.put(session_token, user, expires_at)
+    return user
+
+def demo_scope(user_id: str, demo_mode: bool) -> Dict[str, Any]:
+    """
+    Filter for a user's demo or live records in assets, portfolio_assets, documents,
+    nominees and scheduled_messages. Served by the (user_id, is_demo) indexes.
+    """
+    return {"user_id": user_id, "is_demo": bool(demo_mode)}
 
 async def require_auth(request: Request) -> User:
     user = await get_current_user(request)
@@ -724,7 +773,7 @@ async def create_session(request: Request, response: Response):
     try:
         auth_backend_url = os.environ.get('AUTH_BACKEND_URL', 'https://demobackend.emergentagent.com')
         logger.info(f"Validating session with auth backend: {auth_backend_url}")
-        auth_response = requests.get(
+        auth_response = await http_client.get(
             f"{auth_backend_url}/auth/v1/env/oauth/session-data",
             headers={"X-Session-ID": session_id},
             timeout=10
@@ -770,6 +819,7 @@ async def create_session(request: Request, response: Response):
                 {"email": session_data["email"]},
                 {"$set": {"role": "admin"}}
             )
+            session_cache.invalidate_user(user_id)
     
     session_token = session_data["session_token"]
     expires_at = datetime.now(timezone.utc) + timedelta(days=7)
@@ -781,7 +831,7 @@ async def create_session(request: Request, response: Response):
     )
     
     session_dict = user_session.model_dump()
-    session_dict['expires_at'] = session_dict['expires_at'].isoformat()
+    # expires_at stays a BSON date for the TTL index
     session_dict['created_at'] = session_dict['created_at'].isoformat()
     await db.user_sessions.insert_one(session_dict)
     
@@ -814,9 +864,10 @@ async def create_session(request: Request, response: Response):
     
     # Reset DMS timer on login
     try:
+        now = datetime.now(timezone.utc)
         await db.dead_man_switches.update_one(
             {"user_id": user_id},
-            {"$set": {"last_reset": datetime.now(timezone.utc).isoformat()}}
+            [{"$set": {"last_reset": now.isoformat()}}, *reschedule_update(now)]
         )
         logger.info(f"DMS timer reset for user {user_id}")
     except Exception as e:
@@ -846,6 +897,7 @@ async def logout(request: Request, response: Response):
     session_token = request.cookies.get("session_token")
     if session_token:
         await db.user_sessions.delete_one({"session_token": session_token})
+        session_cache.invalidate_token(session_token)
     
     response.delete_cookie(key="session_token", path="/")
     return {"success": True}
@@ -857,25 +909,16 @@ async def update_preferences(prefs: UserPreferences, user: User = Depends(requir
         {"id": user.id},
         {"$set": {"measurement_unit": prefs.measurement_unit, "weight_unit": prefs.weight_unit}}
     )
+    session_cache.invalidate_user(user.id)
     return {"success": True}
 
 # Asset Routes
 @api_router.get("/assets", response_model=List[Asset])
 async def get_assets(user: User = Depends(require_auth)):
     # Filter based on demo mode
-    demo_prefix = f"demo_{user.id}_"
-    if user.demo_mode:
-        # Show only demo data
-        assets = await db.assets.find({
-            "user_id": user.id,
-            "id": {"$regex": f"^{demo_prefix}"}
-        }, {"_id": 0}).to_list(1000)
-    else:
-        # Show only live data (exclude demo data)
-        assets = await db.assets.find({
-            "user_id": user.id,
-            "id": {"$not": {"$regex": f"^{demo_prefix}"}}
-        }, {"_id": 0}).to_list(1000)
+    assets = await db.assets.find(
+        demo_scope(user.id, user.demo_mode), {"_id": 0}
+    ).to_list(1000)
     
     for asset in assets:
         if isinstance(asset.get('created_at'), str):
@@ -892,11 +935,7 @@ async def create_asset(asset_data: AssetCreate, user: User = Depends(require_aut
     
     if features["max_assets"] > 0:
         # Only count LIVE assets (non-demo) for limit
-        demo_prefix = f"demo_{user.id}_"
-        current_count = await db.assets.count_documents({
-            "user_id": user.id,
-            "id": {"$not": {"$regex": f"^{demo_prefix}"}}
-        })
+        current_count = (await usage_counters.get(user.id))["asset_count"]
         if current_count >= features["max_assets"]:
             raise HTTPException(
                 status_code=403,
@@ -908,6 +947,8 @@ async def create_asset(asset_data: AssetCreate, user: User = Depends(require_aut
     asset_dict['created_at'] = asset_dict['created_at'].isoformat()
     asset_dict['updated_at'] = asset_dict['updated_at'].isoformat()
     await db.assets.insert_one(asset_dict)
+    await usage_counters.adjust(user.id, assets=1)
+    await invalidate_dashboard_summary(user.id)
     
     # Log audit event
     await log_audit(user, "CREATE", "asset", asset.id, {"name": asset.name, "type": asset.type}, request)
@@ -934,6 +975,7 @@ async def update_asset(asset_id: str, asset_data: AssetCreate, user: User = Depe
         {"id": asset_id},
         {"$set": update_data}
     )
+    await invalidate_dashboard_summary(user.id)
     
     # Auto-create snapshot for purchase date if it changed
     old_purchase_date = existing.get('purchase_date')
@@ -960,6 +1002,9 @@ async def delete_asset(asset_id: str, user: User = Depends(require_auth), reques
         raise HTTPException(status_code=404, detail="Asset not found")
     
     result = await db.assets.delete_one({"id": asset_id, "user_id": user.id})
+    if result.deleted_count and not asset.get("is_demo"):
+        await usage_counters.adjust(user.id, assets=-1)
+    await invalidate_dashboard_summary(user.id)
     
     # Log audit event
     await log_audit(user, "DELETE", "asset", asset_id, {"name": asset.get("name"), "type": asset.get("type")}, request)
@@ -1014,21 +1059,15 @@ async def get_loan_schedule(asset_id: str, user: User = Depends(require_auth)):
 @api_router.get("/nominees", response_model=List[Nominee])
 async def get_nominees(user: User = Depends(require_auth)):
     """Get all nominees for the user, sorted by priority"""
-    demo_prefix = f"demo_{user.id}_"
-    if user.demo_mode:
-        nominees = await db.nominees.find({
-            "user_id": user.id,
-            "id": {"$regex": f"^{demo_prefix}"}
-        }, {"_id": 0}).to_list(100)
-    else:
-        nominees = await db.nominees.find({
-            "user_id": user.id,
-            "id": {"$not": {"$regex": f"^{demo_prefix}"}}
-        }, {"_id": 0}).to_list(100)
+    # Filter based on demo mode
+    nominees = await db.nominees.find(
+        demo_scope(user.id, user.demo_mode), {"_id": 0}
+    ).to_list(100)
     
     for nominee in nominees:
         if isinstance(nominee.get('created_at'), str):
             nominee['created_at'] = datetime.fromisoformat(nominee['created_at'])
+        nominee['access_token'] = unseal_access_token(nominee.get('access_token_sealed'))
     # Sort by priority (lower number = higher priority)
     nominees.sort(key=lambda x: x.get('priority', 999))
     return [Nominee(**n) for n in nominees]
@@ -1050,6 +1089,7 @@ async def create_nominee(nominee_data: NomineeCreate, user: User = Depends(requi
     nominee_dict = nominee.model_dump()
     nominee_dict['created_at'] = nominee_dict['created_at'].isoformat()
     await db.nominees.insert_one(nominee_dict)
+    await invalidate_dashboard_summary(user.id)
     return nominee
 
 @api_router.put("/nominees/{nominee_id}", response_model=Nominee)
@@ -1063,6 +1103,7 @@ async def update_nominee(nominee_id: str, nominee_data: NomineeCreate, user: Use
             {"id": nominee_id, "user_id": user.id},
             {"$set": nominee_data.model_dump()}
         )
+    await invalidate_dashboard_summary(user.id)
     
     result = await db.nominees.find_one({"id": nominee_id}, {"_id": 0})
     if isinstance(result.get('created_at'), str):
@@ -1075,6 +1116,7 @@ async def delete_nominee(nominee_id: str, user: User = Depends(require_auth)):
     result = await db.nominees.delete_one({"id": nominee_id, "user_id": user.id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Nominee not found")
+    await invalidate_dashboard_summary(user.id)
     return {"success": True}
 
 @api_router.post("/nominee", response_model=Nominee)
@@ -1094,6 +1136,7 @@ async def create_or_update_nominee_legacy(nominee_data: NomineeCreate, user: Use
         nominee_dict['created_at'] = nominee_dict['created_at'].isoformat()
         await db.nominees.insert_one(nominee_dict)
         nominee_id = nominee.id
+    await invalidate_dashboard_summary(user.id)
     
     result = await db.nominees.find_one({"id": nominee_id}, {"_id": 0})
     if isinstance(result.get('created_at'), str):
@@ -1113,14 +1156,16 @@ async def generate_nominee_access(nominee_id: str, user: User = Depends(require_
     # Generate a secure 32-character token
     access_token = f"nom_{secrets.token_urlsafe(32)}"
     
+    # Only a keyed hash (for lookups) and an encrypted copy are stored, never the token itself
     await db.nominees.update_one(
         {"id": nominee_id},
         {"$set": {
-            "access_token": access_token,
+            **token_fields(access_token),
             "access_token_created_at": datetime.now(timezone.utc).isoformat(),
             "access_granted": True
         }}
     )
+    nominee_view_cache.invalidate_owner(user.id)
     
     # Create access link
     frontend_url = os.getenv("FRONTEND_URL", "https://yourdomain.com")
@@ -1140,12 +1185,13 @@ async def revoke_nominee_access(nominee_id: str, user: User = Depends(require_au
         {"id": nominee_id, "user_id": user.id},
         {"$set": {
             "access_granted": False,
-            "access_token": None
+            **token_fields(None)
         }}
     )
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Nominee not found")
+    nominee_view_cache.invalidate_owner(user.id)
     
     return {"success": True, "message": "Access revoked successfully"}
 
@@ -1170,6 +1216,7 @@ async def update_access_type(nominee_id: str, access_type: str, user: User = Dep
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Nominee not found")
+    nominee_view_cache.invalidate_owner(user.id)
     
     return {"success": True, "access_type": access_type}
 
@@ -1177,7 +1224,7 @@ async def update_access_type(nominee_id: str, access_type: str, user: User = Dep
 @api_router.post("/nominee/auth")
 async def nominee_login(access_token: str):
     """Authenticate nominee using their access token"""
-    nominee = await db.nominees.find_one({"access_token": access_token})
+    nominee = await invalid_token_cache.find_nominee(db.nominees, access_token)
     
     if not nominee:
         raise HTTPException(status_code=401, detail="Invalid access token")
@@ -1194,8 +1241,8 @@ async def nominee_login(access_token: str):
         if datetime.now(timezone.utc) > expires_at:
             # Auto-revoke expired access
             await db.nominees.update_one(
-                {"access_token": access_token},
-                {"$set": {"access_granted": False, "access_token": None}}
+                {"id": nominee["id"]},
+                {"$set": {"access_granted": False, **token_fields(None)}}
             )
             raise HTTPException(status_code=403, detail="Temporary access has expired")
     
@@ -1216,7 +1263,7 @@ async def nominee_login(access_token: str):
     
     # Update last accessed time
     await db.nominees.update_one(
-        {"access_token": access_token},
+        {"id": nominee["id"]},
         {"$set": {"last_accessed_at": datetime.now(timezone.utc).isoformat()}}
     )
     
@@ -1230,7 +1277,7 @@ async def nominee_login(access_token: str):
             "access_type": nominee.get("access_type", "after_dms")
         },
         "ip_address": "unknown",
-        "timestamp": datetime.now(timezone.utc).isoformat()
+        "timestamp": datetime.now(timezone.utc)
     }
     await db.audit_logs.insert_one(audit_log)
     
@@ -1251,94 +1298,38 @@ async def nominee_login(access_token: str):
         "access_token": access_token
     }
 
-@api_router.get("/nominee/dashboard")
-async def get_nominee_dashboard(access_token: str):
-    """Get read-only dashboard for nominee"""
-    nominee = await db.nominees.find_one({"access_token": access_token})
-    
-    if not nominee or not nominee.get("access_granted"):
-        raise HTTPException(status_code=401, detail="Invalid or revoked access")
-    
-    user_id = nominee["user_id"]
-    
-    # Log dashboard access
-    audit_log = {
-        "user_id": user_id,
-        "action": "nominee_viewed_dashboard",
-        "details": {
-            "nominee_name": nominee.get("name"),
-            "nominee_email": nominee.get("email")
-        },
-        "ip_address": "unknown",
-        "timestamp": datetime.now(timezone.utc).isoformat()
-    }
-    await db.audit_logs.insert_one(audit_log)
-    
-    # Get all assets (excluding demo data) - EXCLUDE _id
-    demo_prefix = f"demo_{user_id}_"
-    assets = await db.assets.find({
-        "user_id": user_id,
-        "id": {"$not": {"$regex": f"^{demo_prefix}"}}
-    }, {"_id": 0}).to_list(1000)
-    
-    # Get portfolios - EXCLUDE _id
-    portfolios = await db.portfolio_assets.find({
-        "user_id": user_id,
-        "id": {"$not": {"$regex": f"^{demo_prefix}"}}
-    }, {"_id": 0}).to_list(1000)
-    
-    # Get documents
-    documents = await db.documents.find({
-        "user_id": user_id,
-        "id": {"$not": {"$regex": f"^{demo_prefix}"}}
-    }, {"_id": 0, "file_data": 0}).to_list(1000)
-    
-    # Get will
-    will = await db.digital_wills.find_one({
-        "user_id": user_id,
-        "demo_mode": {"$ne": True}
-    }, {"_id": 0})
+# Sections of the nominee dashboard that can be paged through
+NOMINEE_VIEW_SECTIONS = ("assets", "portfolios", "documents", "nominees")
+NOMINEE_VIEW_MAX_PAGE_SIZE = 1000
+
+async def build_nominee_view(user_id: str) -> Dict[str, Any]:
+    """Owner data every nominee of `user_id` sees, as a JSON-ready payload."""
+    # Assets, portfolios and documents exclude demo data - EXCLUDE _id
+    live_filter = demo_scope(user_id, False)
     
-    # Get nominees (they should see who else is a nominee)
-    all_nominees = await db.nominees.find({"user_id": user_id}, {"_id": 0, "access_token": 0}).to_list(100)
+    assets, portfolios, documents, will, all_nominees = await asyncio.gather(
+        db.assets.find(live_filter, {"_id": 0}).to_list(NOMINEE_VIEW_MAX_PAGE_SIZE),
+        db.portfolio_assets.find(live_filter, {"_id": 0}).to_list(NOMINEE_VIEW_MAX_PAGE_SIZE),
+        db.documents.find(live_filter, {"_id": 0, "file_data": 0, "thumbnail_pass": 0}).to_list(NOMINEE_VIEW_MAX_PAGE_SIZE),
+        db.digital_wills.find_one({
+            "user_id": user_id,
+            "demo_mode": {"$ne": True}
+        }, {"_id": 0}),
+        # Nominees should see who else is a nominee
+        db.nominees.find(
+            {"user_id": user_id},
+            {"_id": 0, "access_token": 0, "access_token_hash": 0, "access_token_sealed": 0}
+        ).to_list(100)
+    )
     
     # Calculate summary - handle None values
-    total_assets = len(assets) + len(portfolios)
     total_value = sum([(a.get("current_value") or a.get("total_value") or 0) for a in assets])
     total_value += sum([(p.get("total_value") or 0) for p in portfolios])
     
-    # Convert datetime fields to ISO strings for JSON serialization
-    for asset in assets:
-        if isinstance(asset.get('created_at'), datetime):
-            asset['created_at'] = asset['created_at'].isoformat()
-        if isinstance(asset.get('updated_at'), datetime):
-            asset['updated_at'] = asset['updated_at'].isoformat()
-    
-    for portfolio in portfolios:
-        if isinstance(portfolio.get('created_at'), datetime):
-            portfolio['created_at'] = portfolio['created_at'].isoformat()
-    
-    for doc in documents:
-        if isinstance(doc.get('created_at'), datetime):
-            doc['created_at'] = doc['created_at'].isoformat()
-        if isinstance(doc.get('uploaded_at'), datetime):
-            doc['uploaded_at'] = doc['uploaded_at'].isoformat()
-    
-    if will:
-        if isinstance(will.get('created_at'), datetime):
-            will['created_at'] = will['created_at'].isoformat()
-        if isinstance(will.get('updated_at'), datetime):
-            will['updated_at'] = will['updated_at'].isoformat()
-    
-    for nom in all_nominees:
-        if isinstance(nom.get('created_at'), datetime):
-            nom['created_at'] = nom['created_at'].isoformat()
-        if isinstance(nom.get('last_accessed_at'), datetime):
-            nom['last_accessed_at'] = nom['last_accessed_at'].isoformat()
-    
-    return {
+    # jsonable_encoder turns every datetime into an ISO string in one pass
+    return jsonable_encoder({
         "summary": {
-            "total_assets": total_assets,
+            "total_assets": len(assets) + len(portfolios),
             "total_value": total_value,
             "asset_count": len(assets),
             "portfolio_count": len(portfolios),
@@ -1348,49 +1339,99 @@ async def get_nominee_dashboard(access_token: str):
         "portfolios": portfolios,
         "documents": documents,
         "will": will,
-        "nominees": all_nominees,
-        "nominee_info": {
-            "name": nominee.get("name"),
-            "relationship": nominee.get("relationship"),
-            "priority": nominee.get("priority")
+        "nominees": all_nominees
+    })
+
+@api_router.get("/nominee/dashboard")
+async def get_nominee_dashboard(
+    access_token: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    section: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(NOMINEE_VIEW_MAX_PAGE_SIZE, ge=1, le=NOMINEE_VIEW_MAX_PAGE_SIZE)
+):
+    """
+    Get read-only dashboard for nominee.
+    Served from a per-owner cache that owner writes invalidate; the ETag lets
+    clients revalidate with If-None-Match and get a 304 when nothing changed.
+    Pass `section` to fetch one page of assets, portfolios, documents or nominees.
+    """
+    if section is not None and section not in NOMINEE_VIEW_SECTIONS:
+        raise HTTPException(status_code=400, detail=f"section must be one of: {', '.join(NOMINEE_VIEW_SECTIONS)}")
+    
+    nominee = await invalid_token_cache.find_nominee(
+        db.nominees, access_token,
+        {"_id": 0, "user_id": 1, "access_granted": 1, "name": 1, "email": 1, "relationship": 1, "priority": 1}
+    )
+    
+    if not nominee or not nominee.get("access_granted"):
+        raise HTTPException(status_code=401, detail="Invalid or revoked access")
+    
+    user_id = nominee["user_id"]
+    
+    # Log dashboard access after the response is sent
+    background_tasks.add_task(db.audit_logs.insert_one, {
+        "user_id": user_id,
+        "action": "nominee_viewed_dashboard",
+        "details": {
+            "nominee_name": nominee.get("name"),
+            "nominee_email": nominee.get("email")
+        },
+        "ip_address": "unknown",
+        "timestamp": datetime.now(timezone.utc)
+    })
+    
+    view = nominee_view_cache.get(user_id)
+    if view is None:
+        generation = nominee_view_cache.generation(user_id)
+        view = nominee_view_cache.put(user_id, await build_nominee_view(user_id), generation)
+    
+    nominee_info = {
+        "name": nominee.get("name"),
+        "relationship": nominee.get("relationship"),
+        "priority": nominee.get("priority")
+    }
+    # nominee_info and the requested page are part of the representation, so part of its ETag
+    variant = hashlib.sha256(json.dumps([nominee_info, section, page, page_size], default=str).encode()).hexdigest()[:12]
+    etag = f'"{view["etag"]}-{variant}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    payload = view["payload"]
+    start = (page - 1) * page_size
+    sections = [section] if section else NOMINEE_VIEW_SECTIONS
+    pagination = {
+        name: {
+            "page": page,
+            "page_size": page_size,
+            "total": len(payload[name]),
+            "has_more": start + page_size < len(payload[name])
         }
+        for name in sections
     }
+    
+    if section:
+        content = {section: payload[section][start:start + page_size]}
+    else:
+        content = {
+            **payload,
+            **{name: payload[name][start:start + page_size] for name in sections},
+            "nominee_info": nominee_info
+        }
+    content["pagination"] = pagination
+    return JSONResponse(content=content, headers=headers)
 
 @api_router.get("/nominees/my-accesses")
 async def get_my_nominee_accesses(user: User = Depends(require_auth)):
     """Get all accounts where current user is listed as a nominee"""
-    # Find all nominee records where current user's email matches
-    nominee_records = await db.nominees.find({
-        "email": user.email,
-        "access_granted": True
-    }).to_list(100)
-    
-    accessible_accounts = []
-    
-    for nominee_record in nominee_records:
-        # Get the owner's info
-        owner = await db.users.find_one({"id": nominee_record["user_id"]})
-        
-        if owner:
-            # Check access expiration for temporary access
-            is_expired = False
-            if nominee_record.get("access_type") == "temporary" and nominee_record.get("access_expires_at"):
-                expires_at = nominee_record.get("access_expires_at")
-                if isinstance(expires_at, str):
-                    expires_at = datetime.fromisoformat(expires_at)
-                is_expired = datetime.now(timezone.utc) > expires_at
-            
-            if not is_expired:
-                accessible_accounts.append({
-                    "account_id": owner["id"],
-                    "account_name": owner.get("name", "Unknown"),
-                    "account_email": owner.get("email"),
-                    "access_type": nominee_record.get("access_type", "after_dms"),
-                    "access_token": nominee_record.get("access_token"),
-                    "relationship": nominee_record.get("relationship"),
-                    "granted_at": nominee_record.get("access_token_created_at"),
-                    "expires_at": nominee_record.get("access_expires_at")
-                })
+    # Nominee records, expiry check and owner details resolved in one aggregation
+    accessible_accounts = await db.nominees.aggregate(
+        my_accesses_pipeline(user.email, datetime.now(timezone.utc))
+    ).to_list(MY_ACCESSES_LIMIT)
+    for account in accessible_accounts:
+        account["access_token"] = unseal_access_token(account.pop("access_token_sealed"))
     
     return {"accessible_accounts": accessible_accounts}
 
@@ -1409,12 +1450,9 @@ async def get_dms(user: User = Depends(require_auth)):
 @api_router.post("/dms")
 async def create_or_update_dms(dms_data: DMSCreate, user: User = Depends(require_auth)):
     existing = await db.dead_man_switches.find_one({"user_id": user.id})
+    now = datetime.now(timezone.utc)
     
     if existing:
-        await db.dead_man_switches.update_one(
-            {"user_id": user.id},
-            {"$set": {**dms_data.model_dump(), "last_reset": datetime.now(timezone.utc).isoformat()}}
-        )
         dms_id = existing["id"]
     else:
         dms = DeadManSwitch(user_id=user.id, **dms_data.model_dump())
@@ -1424,6 +1462,13 @@ async def create_or_update_dms(dms_data: DMSCreate, user: User = Depends(require
         await db.dead_man_switches.insert_one(dms_dict)
         dms_id = dms.id
     
+    # Settings (e.g. inactivity_days) may have changed, so recompute remind_at / trigger_at
+    await db.dead_man_switches.update_one(
+        {"id": dms_id},
+        [{"$set": {**dms_data.model_dump(), "last_reset": now.isoformat()}}, *reschedule_update(now)]
+    )
+    await invalidate_dashboard_summary(user.id)
+    
     result = await db.dead_man_switches.find_one({"id": dms_id}, {"_id": 0})
     if isinstance(result.get('last_reset'), str):
         result['last_reset'] = datetime.fromisoformat(result['last_reset'])
@@ -1433,12 +1478,16 @@ async def create_or_update_dms(dms_data: DMSCreate, user: User = Depends(require
 
 @api_router.post("/dms/reset")
 async def reset_dms(user: User = Depends(require_auth)):
+    now = datetime.now(timezone.utc)
     result = await db.dead_man_switches.update_one(
         {"user_id": user.id},
-        {"$set": {
-            "last_reset": datetime.now(timezone.utc).isoformat(),
-            "reminders_sent": 0
-        }}
+        [
+            {"$set": {
+                "last_reset": now.isoformat(),
+                "reminders_sent": 0
+            }},
+            *reschedule_update(now)
+        ]
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Dead man switch not configured")
@@ -1482,6 +1531,7 @@ async def create_or_update_will(will_data: DigitalWillCreate, user: User = Depen
         will_dict['updated_at'] = will_dict['updated_at'].isoformat()
         await db.digital_wills.insert_one(will_dict)
         will_id = will.id
+    await invalidate_dashboard_summary(user.id)
     
     result = await db.digital_wills.find_one({"id": will_id}, {"_id": 0})
     if isinstance(result.get('created_at'), str):
@@ -1494,19 +1544,9 @@ async def create_or_update_will(will_data: DigitalWillCreate, user: User = Depen
 @api_router.get("/documents")
 async def get_documents(user: User = Depends(require_auth)):
     # Filter based on demo mode
-    demo_prefix = f"demo_{user.id}_"
-    if user.demo_mode:
-        # Show only demo documents
-        documents = await db.documents.find({
-            "user_id": user.id,
-            "id": {"$regex": f"^{demo_prefix}"}
-        }, {"_id": 0, "file_data": 0}).to_list(1000)
-    else:
-        # Show only live documents (exclude demo)
-        documents = await db.documents.find({
-            "user_id": user.id,
-            "id": {"$not": {"$regex": f"^{demo_prefix}"}}
-        }, {"_id": 0, "file_data": 0}).to_list(1000)
+    documents = await db.documents.find(
+        demo_scope(user.id, user.demo_mode), {"_id": 0, "file_data": 0, "thumbnail_pass": 0}
+    ).to_list(1000)
     
     for doc in documents:
         if isinstance(doc.get('created_at'), str):
@@ -1515,17 +1555,183 @@ async def get_documents(user: User = Depends(require_auth)):
             doc['updated_at'] = datetime.fromisoformat(doc['updated_at'])
     return documents
 
+@api_router.get("/documents/storage-report")
+async def get_document_storage_report(user: User = Depends(require_auth)):
+    """Logical bytes uploaded vs. bytes actually stored after deduplication and compression."""
+    return await blob_store.usage_report(db.documents, user.id)
+
 @api_router.get("/documents/{doc_id}")
 async def get_document(doc_id: str, user: User = Depends(require_auth)):
-    document = await db.documents.find_one({"id": doc_id, "user_id": user.id}, {"_id": 0})
+    document = await db.documents.find_one({"id": doc_id, "user_id": user.id}, {"_id": 0, "thumbnail_pass": 0})
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
+    # Keep returning base64 file_data for clients that read it from this route
+    if document.get("blob_ref") and not document.get("file_data"):
+        try:
+            content = await blob_store.read(document["blob_ref"]["key"])
+        except BlobNotFoundError:
+            raise HTTPException(status_code=404, detail="Document content not found")
+        document["file_data"] = base64.b64encode(content).decode("ascii")
     if isinstance(document.get('created_at'), str):
         document['created_at'] = datetime.fromisoformat(document['created_at'])
     if isinstance(document.get('updated_at'), str):
         document['updated_at'] = datetime.fromisoformat(document['updated_at'])
     return document
 
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against our ETag."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+@api_router.get("/documents/{doc_id}/thumbnail")
+async def get_document_thumbnail(doc_id: str, request: Request, user: User = Depends(require_auth)):
+    """Small JPEG preview of an image document, cacheable by the browser."""
+    document = await db.documents.find_one(
+        {"id": doc_id, "user_id": user.id},
+        {"_id": 0, "thumbnail_ref": 1}
+    )
+    if not document or not document.get("thumbnail_ref"):
+        raise HTTPException(status_code=404, detail="Thumbnail not available")
+    
+    key = document["thumbnail_ref"]["key"]
+    # A document's content never changes, so neither does its thumbnail
+    headers = {"ETag": f'"{key}"', "Cache-Control": "private, max-age=604800, immutable"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    
+    try:
+        content = await blob_store.read(key)
+    except BlobNotFoundError:
+        raise HTTPException(status_code=404, detail="Thumbnail not available")
+    return Response(content=content, media_type=THUMBNAIL_CONTENT_TYPE, headers=headers)
+
+@api_router.get("/documents/{doc_id}/download")
+async def download_document(doc_id: str, request: Request, user: User = Depends(require_auth)):
+    """
+    Stream a document's raw bytes in fixed-size chunks.
+    Supports single byte ranges (206 / 416) so interrupted downloads can resume,
+    and conditional requests against the content-hash ETag (304).
+    """
+    document = await db.documents.find_one(
+        {"id": doc_id, "user_id": user.id},
+        {"_id": 0, "name": 1, "file_type": 1, "blob_ref": 1, "file_data": 1}
+    )
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    blob_ref = document.get("blob_ref")
+    if blob_ref:
+        key, size = blob_ref["key"], blob_ref["size"]
+    elif isinstance(document.get("file_data"), str):
+        # Not migrated to the blob store yet
+        inline = decode_file_data(document["file_data"])
+        key, size = hashlib.sha256(inline).hexdigest(), len(inline)
+    else:
+        raise HTTPException(status_code=404, detail="Document content not found")
+    
+    etag = f'"{key}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(document.get('name') or doc_id)}",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    # A stale If-Range means the client's partial copy is outdated: send everything
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        range_header = None
+    try:
+        byte_range = parse_range_header(range_header, size)
+    except RangeNotSatisfiableError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    
+    start, end = byte_range or (0, size)
+    if blob_ref:
+        chunks = blob_store.open_range(key, start, end)
+    else:
+        chunks = iter_bytes(inline[start:end])
+    
+    # Pull the first chunk now so a missing blob is still a 404, not a broken stream
+    try:
+        first_chunk = await chunks.__anext__()
+    except StopAsyncIteration:
+        first_chunk = b""
+    except BlobNotFoundError:
+        raise HTTPException(status_code=404, detail="Document content not found")
+    
+    async def body():
+        if first_chunk:
+            yield first_chunk
+        async for chunk in chunks:
+            yield chunk
+    
+    headers["Content-Length"] = str(end - start)
+    status_code = 200
+    if byte_range:
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    return StreamingResponse(
+        body(),
+        status_code=status_code,
+        media_type=document.get("file_type") or "application/octet-stream",
+        headers=headers
+    )
+
+# Read size when streaming multipart uploads into the blob store
+BLOB_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+async def check_storage_limit(user: User, plan: str, features: Dict[str, Any], new_file_size: int):
+    """Raise 403 if adding `new_file_size` bytes would exceed the plan's storage quota."""
+    if features["storage_mb"] <= 0:
+        return
+    storage_bytes = await get_user_storage_usage(user.id)
+    storage_mb = storage_bytes / (1024 * 1024)
+    new_file_mb = new_file_size / (1024 * 1024)
+    if (storage_mb + new_file_mb) > features["storage_mb"]:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Storage limit exceeded. Your {plan} plan allows {features['storage_mb']} MB. Current: {storage_mb:.1f} MB, New file: {new_file_mb:.1f} MB. Upgrade for more storage."
+        )
+
+async def release_blobs(keys: List[str]):
+    """Drop one blob reference per deleted document; shared content survives until its last reference goes."""
+    for key, count in Counter(keys).items():
+        await blob_store.release(key, count)
+
+async def insert_document(document: Document):
+    """Store document metadata and return it as the API does (no _id, no file_data)."""
+    # Thumbnails are rendered out of band by the scheduler
+    if document.blob_ref and wants_thumbnail(document.file_type):
+        document.thumbnail_status = THUMBNAIL_PENDING
+    doc_dict = document.model_dump(exclude={"file_data"})
+    doc_dict['created_at'] = doc_dict['created_at'].isoformat()
+    doc_dict['updated_at'] = doc_dict['updated_at'].isoformat()
+    await db.documents.insert_one(doc_dict)
+    await usage_counters.adjust(document.user_id, documents=1, storage_bytes=document.file_size)
+    await invalidate_dashboard_summary(document.user_id)
+    
+    # Fetch the document back without _id and file_data
+    created_doc = await db.documents.find_one(
+        {"id": document.id, "user_id": document.user_id},
+        {"_id": 0, "file_data": 0, "thumbnail_pass": 0}
+    )
+    
+    if created_doc:
+        # Convert datetime strings back to datetime objects for response
+        if isinstance(created_doc.get('created_at'), str):
+            created_doc['created_at'] = datetime.fromisoformat(created_doc['created_at'])
+        if isinstance(created_doc.get('updated_at'), str):
+            created_doc['updated_at'] = datetime.fromisoformat(created_doc['updated_at'])
+        return created_doc
+    
+    raise HTTPException(status_code=500, detail="Failed to create document")
+
 @api_router.post("/documents")
 async def create_document(doc_data: DocumentCreate, user: User = Depends(require_auth)):
     # Check subscription limits
@@ -1534,52 +1740,101 @@ async def create_document(doc_data: DocumentCreate, user: User = Depends(require
     
     # Check document count limit
     if features["max_documents"] > 0:
-        current_count = await db.documents.count_documents({"user_id": user.id})
+        current_count = (await usage_counters.get(user.id))["document_count"]
         if current_count >= features["max_documents"]:
             raise HTTPException(
                 status_code=403,
                 detail=f"Document limit reached. Your {plan} plan allows {features['max_documents']} documents. Upgrade to add more."
             )
     
-    # Check storage limit
-    storage_bytes = await get_user_storage_usage(user.id)
-    storage_mb = storage_bytes / (1024 * 1024)
-    new_file_mb = doc_data.file_size / (1024 * 1024)
+    # Content goes to the blob store; only metadata and the blob reference stay in MongoDB
+    try:
+        content = decode_file_data(doc_data.file_data)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="file_data must be base64 encoded")
+    
+    # Check storage limit against the decoded content, not the client-declared file_size.
+    # This is exactly what put() stores as blob_ref["size"], so nothing needs releasing on a 403.
+    await check_storage_limit(user, plan, features, len(content))
+    blob_ref = await blob_store.put(content, doc_data.file_type)
     
-    if features["storage_mb"] > 0:
-        if (storage_mb + new_file_mb) > features["storage_mb"]:
+    document = Document(
+        user_id=user.id,
+        blob_ref=blob_ref,
+        **doc_data.model_dump(exclude={"file_data", "file_size"}),
+        file_size=blob_ref["size"]
+    )
+    return await insert_document(document)
+
+@api_router.post("/documents/upload")
+async def upload_document(
+    file: UploadFile = File(...),
+    name: Optional[str] = Form(None),
+    description: Optional[str] = Form(None),
+    share_with_nominee: bool = Form(False),
+    linked_asset_id: Optional[str] = Form(None),
+    user: User = Depends(require_auth)
+):
+    """Multipart upload that streams the file into the blob store without base64 or buffering."""
+    plan = getattr(user, 'subscription_plan', 'Free')
+    features = SUBSCRIPTION_FEATURES.get(plan, SUBSCRIPTION_FEATURES["Free"])
+    
+    if features["max_documents"] > 0:
+        current_count = (await usage_counters.get(user.id))["document_count"]
+        if current_count >= features["max_documents"]:
             raise HTTPException(
                 status_code=403,
-                detail=f"Storage limit exceeded. Your {plan} plan allows {features['storage_mb']} MB. Current: {storage_mb:.1f} MB, New file: {new_file_mb:.1f} MB. Upgrade for more storage."
+                detail=f"Document limit reached. Your {plan} plan allows {features['max_documents']} documents. Upgrade to add more."
             )
     
-    document = Document(user_id=user.id, **doc_data.model_dump())
-    doc_dict = document.model_dump()
-    doc_dict['created_at'] = doc_dict['created_at'].isoformat()
-    doc_dict['updated_at'] = doc_dict['updated_at'].isoformat()
-    await db.documents.insert_one(doc_dict)
+    # Cheap early rejection when the client declared a size
+    if file.size is not None:
+        await check_storage_limit(user, plan, features, file.size)
     
-    # Fetch the document back without _id and file_data
-    created_doc = await db.documents.find_one(
-        {"id": document.id, "user_id": user.id},
-        {"_id": 0, "file_data": 0}
-    )
+    async def file_chunks():
+        while True:
+            chunk = await file.read(BLOB_UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
     
-    if created_doc:
-        # Convert datetime strings back to datetime objects for response
-        if isinstance(created_doc.get('created_at'), str):
-            created_doc['created_at'] = datetime.fromisoformat(created_doc['created_at'])
-        if isinstance(created_doc.get('updated_at'), str):
-            created_doc['updated_at'] = datetime.fromisoformat(created_doc['updated_at'])
-        return created_doc
+    blob_ref = await blob_store.put_stream(file_chunks(), file.content_type)
     
-    raise HTTPException(status_code=500, detail="Failed to create document")
+    # The declared size is optional and untrusted; enforce the quota on what was actually stored
+    try:
+        await check_storage_limit(user, plan, features, blob_ref["size"])
+    except HTTPException:
+        await blob_store.release(blob_ref["key"])
+        raise
+    
+    document = Document(
+        user_id=user.id,
+        name=name or file.filename or "Untitled",
+        description=description,
+        file_type=file.content_type or "application/octet-stream",
+        file_size=blob_ref["size"],
+        blob_ref=blob_ref,
+        share_with_nominee=share_with_nominee,
+        linked_asset_id=linked_asset_id
+    )
+    return await insert_document(document)
 
 @api_router.delete("/documents/{doc_id}")
 async def delete_document(doc_id: str, user: User = Depends(require_auth)):
-    result = await db.documents.delete_one({"id": doc_id, "user_id": user.id})
-    if result.deleted_count == 0:
+    document = await db.documents.find_one_and_delete(
+        {"id": doc_id, "user_id": user.id},
+        projection={"_id": 0, "blob_ref": 1, "thumbnail_ref": 1, "file_size": 1, "is_demo": 1}
+    )
+    if document is None:
         raise HTTPException(status_code=404, detail="Document not found")
+    if not document.get("is_demo"):
+        await usage_counters.adjust(user.id, documents=-1, storage_bytes=-document.get("file_size", 0))
+    
+    await release_blobs([
+        document[field]["key"] for field in ("blob_ref", "thumbnail_ref") if document.get(field)
+    ])
+    
+    await invalidate_dashboard_summary(user.id)
     return {"success": True}
 
 @api_router.put("/documents/{document_id}/link-asset")
@@ -1606,6 +1861,7 @@ async def link_document_to_asset(document_id: str, asset_data: dict, user: User
     
     if result.modified_count == 0:
         raise HTTPException(status_code=400, detail="Failed to link document")
+    nominee_view_cache.invalidate_owner(user.id)
     
     return {"success": True, "message": "Document linked successfully"}
 
@@ -1619,7 +1875,7 @@ async def get_asset_documents(asset_id: str, user: User = Depends(require_auth))
     
     documents = await db.documents.find(
         {"user_id": user.id, "linked_asset_id": asset_id},
-        {"_id": 0}
+        {"_id": 0, "file_data": 0, "thumbnail_pass": 0}
     ).to_list(100)
     
     # Convert datetime fields
@@ -1632,11 +1888,28 @@ async def get_asset_documents(asset_id: str, user: User = Depends(require_auth))
     return documents
 
 # Price API Routes
+@api_router.get("/prices/crypto")
+async def get_crypto_prices(symbols: str, currency: str = "usd"):
+    """Get prices for a comma-separated list of symbols with one upstream call."""
+    symbol_list = [s.strip() for s in symbols.split(",") if s.strip()]
+    if not symbol_list:
+        raise HTTPException(status_code=400, detail="At least one symbol is required")
+    # Unauthenticated route: keep each request to at most one upstream batch
+    if len(set(symbol_list)) > CRYPTO_PRICE_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {CRYPTO_PRICE_BATCH_SIZE} symbols per request")
+    try:
+        prices = await crypto_price_service.get_prices(symbol_list, currency)
+        return {"currency": currency, "prices": prices}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to fetch prices: {str(e)}")
+
 @api_router.get("/prices/crypto/{symbol}")
 async def get_crypto_price(symbol: str, currency: str = "usd"):
     try:
-        price_data = cg.get_price(ids=symbol.lower(), vs_currencies=currency)
-        return {"symbol": symbol, "price": price_data[symbol.lower()][currency], "currency": currency}
+        price = await crypto_price_service.get_price(symbol, currency)
+        if price is None:
+            raise Exception(f"No price available for {symbol}")
+        return {"symbol": symbol, "price": price, "currency": currency}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch price: {str(e)}")
 
@@ -1657,13 +1930,10 @@ async def get_gold_price(currency: str = "USD", unit: str = "gram"):
 @api_router.get("/prices/currency/{from_currency}/{to_currency}")
 async def get_currency_conversion(from_currency: str, to_currency: str):
     try:
-        response = requests.get(
-            f"https://api.exchangerate-api.com/v4/latest/{from_currency.upper()}",
-            timeout=10
-        )
-        response.raise_for_status()
-        data = response.json()
-        rate = data["rates"].get(to_currency.upper())
+        rates = await fx_rate_cache.get_rates(from_currency)
+        if rates is None:
+            raise Exception("Exchange rate service unavailable")
+        rate = rates.get(to_currency.upper())
         if not rate:
             raise HTTPException(status_code=400, detail="Currency not found")
         return {"from": from_currency.upper(), "to": to_currency.upper(), "rate": rate}
@@ -1671,104 +1941,210 @@ async def get_currency_conversion(from_currency: str, to_currency: str):
         raise HTTPException(status_code=400, detail=f"Failed to fetch conversion rate: {str(e)}")
 
 # Dashboard Routes
-# Helper function to calculate current asset value in its original currency
-def calculate_asset_current_value(asset: Dict[str, Any]) -> float:
-    """
-    Calculate the CURRENT value of an asset in its original currency.
-    Prioritizes current values over purchase values.
-    """
-    value = 0.0
-    
-    # Priority 1: Explicit current values
-    if asset.get('current_total_value'):
-        value = float(asset['current_total_value'])
-    elif asset.get('current_price'):
-        value = float(asset['current_price'])
-    # Priority 2: Calculated current values (quantity/weight/area * current_unit_price)
-    elif asset.get('quantity') and asset.get('current_unit_price'):
-        value = float(asset['quantity']) * float(asset['current_unit_price'])
-    elif asset.get('area') and asset.get('current_price_per_area'):
-        value = float(asset['area']) * float(asset['current_price_per_area'])
-    elif asset.get('weight') and asset.get('current_unit_price'):
-        value = float(asset['weight']) * float(asset['current_unit_price'])
-    # Priority 3: Fall back to purchase values if no current value
-    elif asset.get('total_value'):
-        value = float(asset['total_value'])
-    elif asset.get('quantity') and asset.get('unit_price'):
-        value = float(asset['quantity']) * float(asset['unit_price'])
-    elif asset.get('area') and asset.get('price_per_area'):
-        value = float(asset['area']) * float(asset['price_per_area'])
-    elif asset.get('weight') and asset.get('unit_price'):
-        value = float(asset['weight']) * float(asset['unit_price'])
-    # Priority 4: Loans/debts
-    elif asset.get('outstanding_balance'):
-        value = float(asset['outstanding_balance'])
-    elif asset.get('principal_amount'):
-        value = float(asset['principal_amount'])
-    
-    return value
-
 # Helper function to convert currency
-def convert_currency(amount: float, from_currency: str, to_currency: str) -> float:
-    """Convert amount from one currency to another using live exchange rates."""
+async def convert_currency(amount: float, from_currency: str, to_currency: str) -> float:
+    """Convert amount from one currency to another using cached live exchange rates."""
     if from_currency.upper() == to_currency.upper():
         return amount
     
     if amount == 0:
         return 0.0
     
-    try:
-        response = requests.get(
-            f"https://api.exchangerate-api.com/v4/latest/{from_currency.upper()}",
-            timeout=5
-        )
-        if response.status_code == 200:
-            rate = response.json()["rates"].get(to_currency.upper(), 1.0)
-            return amount * rate
-    except:
+    rates = await fx_rate_cache.get_rates(from_currency)
+    if rates is None:
         logger.warning(f"Currency conversion failed: {from_currency} to {to_currency}")
+        return amount  # Return original if conversion fails
+    
+    return amount * rates.get(to_currency.upper(), 1.0)
+
+# Helper function to convert a whole column of amounts at once
+async def convert_currency_batch(amounts: List[float], currencies: List[str], to_currency: str,
+                                 fx_matrix: Optional[FXMatrix] = None) -> List[float]:
+    """
+    Convert (amount, currency) pairs into one currency using a single cross-rate matrix.
+    Uses live rates unless a matrix (e.g. for a historical date) is passed in.
+    """
+    if not amounts:
+        return []
     
-    return amount  # Return original if conversion fails
+    if fx_matrix is None:
+        fx_matrix = await fx_rate_cache.get_matrix()
+    if fx_matrix is None:
+        logger.warning(f"Batch currency conversion to {to_currency} failed, using original amounts")
+        return [float(amount) for amount in amounts]
+    
+    return fx_matrix.convert(amounts, currencies, to_currency).tolist()
+
+# Helper function to get exchange rates as they were on a past date
+async def get_historical_fx_matrix(rate_date: str, fx_history: Optional[FXRateHistory] = None) -> Optional[FXMatrix]:
+    """
+    Cross-rate matrix for `rate_date` from the local history store (nearest earlier date).
+    Currencies missing from the history are filled from the live table.
+    """
+    live_rates = await fx_rate_cache.get_rates(FX_PIVOT_CURRENCY)
+    if rate_date >= datetime.now(timezone.utc).date().isoformat():
+        return FXMatrix(FX_PIVOT_CURRENCY, live_rates) if live_rates else None
+    
+    if fx_history is not None:
+        historical_rates = fx_history.rates_on(rate_date)
+    else:
+        await fx_history_store.ensure_range(rate_date, rate_date)
+        historical_rates = await fx_history_store.rates_on(rate_date)
+    
+    if historical_rates is None and live_rates is None:
+        return None
+    return FXMatrix(FX_PIVOT_CURRENCY, {**(live_rates or {}), **(historical_rates or {})})
+
+# Server-side valuation for aggregation pipelines (ASSET_CURRENT_VALUE_EXPR comes from valuation.py)
+
+def asset_totals_pipeline(match: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Sum current asset values per (type, currency, liability flag)."""
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "type": "$type",
+                "currency": {"$ifNull": ["$purchase_currency", "USD"]},
+                "is_liability": {"$in": ["$type", list(LIABILITY_TYPES)]}
+            },
+            "total": {"$sum": ASSET_CURRENT_VALUE_EXPR},
+            "count": {"$sum": 1}
+        }}
+    ]
+
+def portfolio_totals_pipeline(match: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Sum portfolio values per currency."""
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"currency": {"$ifNull": ["$purchase_currency", "USD"]}},
+            "total": {"$sum": {"$toDouble": {"$ifNull": ["$total_value", 0]}}},
+            "count": {"$sum": 1}
+        }}
+    ]
+
+async def aggregate_holding_totals(asset_match: Dict[str, Any], portfolio_match: Dict[str, Any],
+                                   target_currency: str, fx_matrix: Optional[FXMatrix] = None):
+    """
+    Run both totals pipelines and convert the grouped rows to target currency in one batch.
+    Returns (asset_rows, portfolio_rows); each row carries type, currency, is_liability,
+    count, original_total and converted_total.
+    """
+    asset_groups = await db.assets.aggregate(asset_totals_pipeline(asset_match)).to_list(None)
+    portfolio_groups = await db.portfolio_assets.aggregate(portfolio_totals_pipeline(portfolio_match)).to_list(None)
+
+    asset_rows = [{
+        "type": group["_id"]["type"],
+        "currency": group["_id"]["currency"],
+        "is_liability": group["_id"]["is_liability"],
+        "count": group["count"],
+        "original_total": group["total"]
+    } for group in asset_groups]
+    portfolio_rows = [{
+        "type": "portfolio",
+        "currency": group["_id"]["currency"],
+        "is_liability": False,
+        "count": group["count"],
+        "original_total": group["total"]
+    } for group in portfolio_groups]
+
+    await convert_total_rows(asset_rows + portfolio_rows, target_currency, fx_matrix)
+    return asset_rows, portfolio_rows
+
+async def convert_total_rows(rows: List[Dict[str, Any]], target_currency: str,
+                             fx_matrix: Optional[FXMatrix] = None):
+    """Set converted_total on grouped totals rows with a single batch conversion."""
+    converted = await convert_currency_batch(
+        [row["original_total"] for row in rows],
+        [row["currency"] for row in rows],
+        target_currency,
+        fx_matrix
+    )
+    for row, value in zip(rows, converted):
+        row["converted_total"] = value
+
+# Materialized dashboard summaries
+# One document per (user, demo_mode, currency) in dashboard_summaries, rebuilt lazily.
+# Writes that affect the dashboard call invalidate_dashboard_summary, which bumps the
+# version and marks the document dirty; the age limit bounds drift from FX/price moves.
+DASHBOARD_SUMMARY_MAX_AGE_SECONDS = int(os.environ.get('DASHBOARD_SUMMARY_MAX_AGE_SECONDS', '3600'))
+
+async def invalidate_dashboard_summary(user_id: str):
+    """Mark all of a user's materialized dashboard summaries (and their nominee view) stale."""
+    nominee_view_cache.invalidate_owner(user_id)
+    await db.dashboard_summaries.update_many(
+        {"user_id": user_id},
+        {"$set": {"dirty": True}, "$inc": {"version": 1}}
+    )
 
 @api_router.get("/dashboard/summary")
 async def get_dashboard_summary(user: User = Depends(require_auth), target_currency: str = "USD"):
     """
     Get dashboard summary with all values converted to target currency.
+    Served from the materialized dashboard_summaries document when it is clean
+    and fresh; otherwise recomputed and stored for the next read.
+    """
+    key = {"user_id": user.id, "demo_mode": user.demo_mode, "currency": target_currency}
+    materialized = await db.dashboard_summaries.find_one(key, {"_id": 0})
+    
+    if materialized and not materialized.get("dirty"):
+        computed_at = datetime.fromisoformat(materialized["computed_at"])
+        if (datetime.now(timezone.utc) - computed_at).total_seconds() < DASHBOARD_SUMMARY_MAX_AGE_SECONDS:
+            return materialized["summary"]
+    
+    if materialized is None:
+        # Create a dirty stub first, so an invalidation landing while this first
+        # build runs has a document to bump and the stale result is not stored
+        try:
+            await db.dashboard_summaries.update_one(
+                key, {"$setOnInsert": {"dirty": True, "version": 0}}, upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # A concurrent request created it first
+        materialized = await db.dashboard_summaries.find_one(key, {"_id": 0, "version": 1})
+    version = (materialized or {}).get("version", 0)
+    
+    summary = await compute_dashboard_summary(user, target_currency)
+    
+    # Only store if no write invalidated the summary while it was being rebuilt
+    await db.dashboard_summaries.update_one({**key, "version": version}, {"$set": {
+        "summary": summary,
+        "dirty": False,
+        "computed_at": datetime.now(timezone.utc).isoformat()
+    }})
+    
+    return summary
+
+async def compute_dashboard_summary(user: User, target_currency: str = "USD"):
+    """
+    Compute the dashboard summary with all values converted to target currency.
     This ensures consistent calculation across the app.
     Includes both individual assets and portfolio holdings.
     FILTERS BY DEMO MODE.
     """
     # Filter based on demo mode
-    demo_prefix = f"demo_{user.id}_"
-    if user.demo_mode:
-        # Show only demo data
-        assets = await db.assets.find({
-            "user_id": user.id,
-            "id": {"$regex": f"^{demo_prefix}"}
-        }).to_list(1000)
-        portfolios = await db.portfolio_assets.find({
-            "user_id": user.id,
-            "id": {"$regex": f"^{demo_prefix}"}
-        }).to_list(1000)
-    else:
-        # Show only live data (exclude demo data)
-        assets = await db.assets.find({
-            "user_id": user.id,
-            "id": {"$not": {"$regex": f"^{demo_prefix}"}}
-        }).to_list(1000)
-        portfolios = await db.portfolio_assets.find({
-            "user_id": user.id,
-            "id": {"$not": {"$regex": f"^{demo_prefix}"}}
-        }).to_list(1000)
+    scope = demo_scope(user.id, user.demo_mode)
+    
+    # Independent reads run concurrently. Totals are summed in MongoDB, so only
+    # one row per (type, currency) comes back.
+    (asset_rows, portfolio_rows), snapshots, nominee, dms, will = await asyncio.gather(
+        aggregate_holding_totals(scope, scope, target_currency),
+        db.networth_snapshots.find(
+            {"user_id": user.id}, {"_id": 0, "net_worth": 1}
+        ).sort("snapshot_date", -1).limit(1).to_list(1),
+        db.nominees.find_one({"user_id": user.id}, {"_id": 1}),
+        db.dead_man_switches.find_one({"user_id": user.id}, {"_id": 1}),
+        db.digital_wills.find_one({"user_id": user.id}, {"_id": 1})
+    )
     
     # Define liability types
-    liability_types = {'loan', 'credit_card'}
+    liability_types = set(LIABILITY_TYPES)
     
     # Define liquid asset types (portfolios are also liquid since they contain stocks/crypto)
     liquid_asset_types = {'bank', 'crypto', 'stock', 'portfolio'}
     
-    total_assets_count = len(assets)
-    total_portfolios_count = len(portfolios)
+    total_assets_count = sum(row["count"] for row in asset_rows)
+    total_portfolios_count = sum(row["count"] for row in portfolio_rows)
     asset_types = {}
     asset_values = {}
     total_assets_value = 0.0
@@ -1778,39 +2154,14 @@ async def get_dashboard_summary(user: User = Depends(require_auth), target_curre
     liquid_assets_value = 0.0
     diversification_count = 0
     
-    # Validation tracking
-    individual_values = []
-    
-    # Process individual assets
-    for asset in assets:
-        asset_type = asset["type"]
-        asset_types[asset_type] = asset_types.get(asset_type, 0) + 1
-        is_liability = asset_type in liability_types
-        
-        # Calculate current value in original currency
-        value_in_original_currency = calculate_asset_current_value(asset)
-        original_currency = asset.get("purchase_currency", "USD")
-        
-        # Convert to target currency
-        value_in_target_currency = convert_currency(
-            value_in_original_currency, 
-            original_currency, 
-            target_currency
-        )
-        
-        # Track for validation
-        individual_values.append({
-            "name": asset.get("name", "Unknown"),
-            "type": asset_type,
-            "original_value": value_in_original_currency,
-            "original_currency": original_currency,
-            "converted_value": value_in_target_currency,
-            "target_currency": target_currency,
-            "is_liability": is_liability
-        })
+    # Process individual assets, one row per (type, currency)
+    for row in asset_rows:
+        asset_type = row["type"]
+        value_in_target_currency = row["converted_total"]
+        asset_types[asset_type] = asset_types.get(asset_type, 0) + row["count"]
         
         # Separate assets and liabilities
-        if is_liability:
+        if row["is_liability"]:
             total_liabilities_value += value_in_target_currency
             liability_values_separate[asset_type] = liability_values_separate.get(asset_type, 0) + value_in_target_currency
             asset_values[asset_type] = asset_values.get(asset_type, 0) - value_in_target_currency
@@ -1823,38 +2174,19 @@ async def get_dashboard_summary(user: User = Depends(require_auth), target_curre
             if asset_type in liquid_asset_types:
                 liquid_assets_value += value_in_target_currency
     
-    # Process portfolio assets
-    for portfolio in portfolios:
+    # Process portfolio assets, one row per currency
+    for row in portfolio_rows:
         portfolio_type = "portfolio"
-        portfolio_currency = portfolio.get("purchase_currency", "USD")
-        portfolio_value_original = portfolio.get("total_value", 0.0)
-        
-        # Convert portfolio value to target currency
-        portfolio_value_converted = convert_currency(
-            portfolio_value_original,
-            portfolio_currency,
-            target_currency
-        )
+        portfolio_value_converted = row["converted_total"]
         
         # Track portfolio in asset types and values
-        asset_types[portfolio_type] = asset_types.get(portfolio_type, 0) + 1
+        asset_types[portfolio_type] = asset_types.get(portfolio_type, 0) + row["count"]
         total_assets_value += portfolio_value_converted
         asset_values_separate[portfolio_type] = asset_values_separate.get(portfolio_type, 0) + portfolio_value_converted
         asset_values[portfolio_type] = asset_values.get(portfolio_type, 0) + portfolio_value_converted
         
         # Portfolios are liquid assets
         liquid_assets_value += portfolio_value_converted
-        
-        # Track for validation
-        individual_values.append({
-            "name": portfolio.get("name", "Unknown Portfolio"),
-            "type": portfolio_type,
-            "original_value": portfolio_value_original,
-            "original_currency": portfolio_currency,
-            "converted_value": portfolio_value_converted,
-            "target_currency": target_currency,
-            "is_liability": False
-        })
     
     net_worth = total_assets_value - total_liabilities_value
     
@@ -1899,10 +2231,6 @@ async def get_dashboard_summary(user: User = Depends(require_auth), target_curre
         }
     
     # 3. Net Worth Growth Rate (compare current net worth with last snapshot)
-    snapshots = await db.networth_snapshots.find(
-        {"user_id": user.id}
-    ).sort("snapshot_date", -1).limit(1).to_list(1)
-    
     if len(snapshots) >= 1:
         previous_snapshot_nw = snapshots[0]["net_worth"]
         current_nw = net_worth
@@ -1970,7 +2298,10 @@ async def get_dashboard_summary(user: User = Depends(require_auth), target_curre
         }
     
     # Validation checks
-    calculated_sum = sum([v["converted_value"] * (1 if not v["is_liability"] else -1) for v in individual_values])
+    calculated_sum = sum(
+        row["converted_total"] * (-1 if row["is_liability"] else 1)
+        for row in asset_rows + portfolio_rows
+    )
     if abs(calculated_sum - net_worth) > 0.01:
         logger.error(f"Net worth calculation mismatch! Calculated: {calculated_sum}, Reported: {net_worth}")
     
@@ -1989,14 +2320,14 @@ async def get_dashboard_summary(user: User = Depends(require_auth), target_curre
         "total_liabilities_value": round(total_liabilities_value, 2),
         "net_worth": round(net_worth, 2),
         "currency": target_currency,
-        "total_value_usd": round(net_worth, 2) if target_currency == "USD" else round(convert_currency(net_worth, target_currency, "USD"), 2),
-        "has_nominee": await db.nominees.count_documents({"user_id": user.id}) > 0,
-        "has_dms": await db.dead_man_switches.count_documents({"user_id": user.id}) > 0,
-        "has_will": await db.digital_wills.count_documents({"user_id": user.id}) > 0,
+        "total_value_usd": round(net_worth, 2) if target_currency == "USD" else round(await convert_currency(net_worth, target_currency, "USD"), 2),
+        "has_nominee": nominee is not None,
+        "has_dms": dms is not None,
+        "has_will": will is not None,
         "financial_ratios": financial_ratios,
         # Debug info (remove in production)
         "validation": {
-            "individual_count": len(individual_values),
+            "individual_count": total_assets_count + total_portfolios_count,
             "calculated_sum": round(calculated_sum, 2),
             "includes_portfolios": total_portfolios_count > 0
         }
@@ -2010,6 +2341,7 @@ async def update_preferences(prefs: UserPreferences, user: User = Depends(requir
         {"id": user.id},
         {"$set": update_data}
     )
+    session_cache.invalidate_user(user.id)
     return {"success": True}
 
 @api_router.get("/user/preferences")
@@ -2043,7 +2375,10 @@ async def get_audit_logs(user: User = Depends(require_auth), days: int = 30):
 
 @api_router.delete("/audit/logs/cleanup")
 async def cleanup_old_audit_logs(user: User = Depends(require_auth)):
-    """Delete audit logs older than 30 days"""
+    """
+    Delete audit logs older than 30 days.
+    Logs past AUDIT_LOG_RETENTION_DAYS are already removed by the TTL index.
+    """
     cutoff_date = datetime.now(timezone.utc) - timedelta(days=30)
     
     result = await db.audit_logs.delete_many({
@@ -2085,6 +2420,7 @@ async def toggle_demo_mode(user: User = Depends(require_auth)):
         {"id": user.id},
         {"$set": {"demo_mode": new_mode}}
     )
+    session_cache.invalidate_user(user.id)
     
     # If switching to demo mode, ensure demo data exists
     if new_mode:
@@ -2102,6 +2438,7 @@ async def complete_onboarding(user: User = Depends(require_auth)):
         {"id": user.id},
         {"$set": {"onboarding_completed": True}}
     )
+    session_cache.invalidate_user(user.id)
     
     return {
         "success": True,
@@ -2118,6 +2455,7 @@ async def update_theme(theme: str, user: User = Depends(require_auth)):
         {"id": user.id},
         {"$set": {"color_theme": theme}}
     )
+    session_cache.invalidate_user(user.id)
     
     return {
         "success": True,
@@ -2127,18 +2465,23 @@ async def update_theme(theme: str, user: User = Depends(require_auth)):
 @api_router.post("/demo/reseed")
 async def reseed_demo_data(user: User = Depends(require_auth)):
     """Force reseed demo data - useful after updates"""
-    demo_prefix = f"demo_{user.id}_"
+    demo_data = demo_scope(user.id, True)
     
     # Delete all existing demo data
-    await db.assets.delete_many({"user_id": user.id, "id": {"$regex": f"^{demo_prefix}"}})
-    await db.portfolio_assets.delete_many({"user_id": user.id, "id": {"$regex": f"^{demo_prefix}"}})
-    await db.documents.delete_many({"user_id": user.id, "id": {"$regex": f"^{demo_prefix}"}})
-    await db.scheduled_messages.delete_many({"user_id": user.id, "id": {"$regex": f"^{demo_prefix}"}})
+    await db.assets.delete_many(demo_data)
+    await db.portfolio_assets.delete_many(demo_data)
+    blob_keys = []
+    async for doc in db.documents.find(demo_data, {"_id": 0, "blob_ref.key": 1, "thumbnail_ref.key": 1}):
+        blob_keys += [doc[field]["key"] for field in ("blob_ref", "thumbnail_ref") if doc.get(field)]
+    await db.documents.delete_many(demo_data)
+    await release_blobs(blob_keys)
+    await db.scheduled_messages.delete_many(demo_data)
     await db.digital_wills.delete_many({"user_id": user.id, "demo_mode": True})
-    await db.nominees.delete_many({"user_id": user.id, "id": {"$regex": f"^{demo_prefix}"}})
+    await db.nominees.delete_many(demo_data)
     
     # Reseed
     await seed_demo_data(user.id, force=True)
+    await invalidate_dashboard_summary(user.id)
     
     return {"success": True, "message": "Demo data reseeded successfully"}
 
@@ -2175,7 +2518,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
     
     # Check if demo data already exists (skip if not forcing)
     if not force:
-        existing_demo = await db.assets.find_one({"user_id": user_id, "id": {"$regex": f"^{demo_prefix}"}})
+        existing_demo = await db.assets.find_one(demo_scope(user_id, True), {"_id": 1})
         if existing_demo:
             return  # Demo data already exists
     
@@ -2184,6 +2527,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         # Bank Accounts
         {
             "id": f"{demo_prefix}bank1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Chase Checking Account",
             "type": "bank",
@@ -2200,6 +2544,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}bank2",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Savings Account - Emergency Fund",
             "type": "bank",
@@ -2216,6 +2561,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}bank3",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Wells Fargo Money Market",
             "type": "bank",
@@ -2232,6 +2578,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}bank4",
+            "is_demo": True,
             "user_id": user_id,
             "name": "HSBC UK Savings Account",
             "type": "bank",
@@ -2249,6 +2596,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         # Crypto
         {
             "id": f"{demo_prefix}crypto1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Bitcoin Holdings",
             "type": "crypto",
@@ -2268,6 +2616,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}crypto2",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Ethereum Holdings",
             "type": "crypto",
@@ -2287,6 +2636,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}crypto3",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Solana Holdings - EUR Account",
             "type": "crypto",
@@ -2307,6 +2657,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         # Stocks
         {
             "id": f"{demo_prefix}stock1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Apple Inc.",
             "type": "stock",
@@ -2326,6 +2677,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}stock2",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Tesla Inc.",
             "type": "stock",
@@ -2345,6 +2697,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}stock3",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Microsoft Corporation",
             "type": "stock",
@@ -2365,6 +2718,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         # Real Estate
         {
             "id": f"{demo_prefix}property1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Family Home - Austin, TX",
             "type": "property",
@@ -2392,6 +2746,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}property2",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Rental Property - Miami",
             "type": "property",
@@ -2416,6 +2771,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}property3",
+            "is_demo": True,
             "user_id": user_id,
             "name": "London Apartment Investment",
             "type": "property",
@@ -2441,6 +2797,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         # Investments
         {
             "id": f"{demo_prefix}investment1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "401(k) Retirement Fund",
             "type": "investment",
@@ -2457,6 +2814,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}investment2",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Roth IRA",
             "type": "investment",
@@ -2474,6 +2832,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         # Insurance
         {
             "id": f"{demo_prefix}insurance1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Life Insurance Policy",
             "type": "insurance",
@@ -2493,6 +2852,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         # Precious Metals
         {
             "id": f"{demo_prefix}precious1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Gold Bars",
             "type": "precious_metals",
@@ -2514,6 +2874,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}precious2",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Silver Coins Collection",
             "type": "precious_metals",
@@ -2536,6 +2897,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         # Liabilities
         {
             "id": f"{demo_prefix}loan1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Home Mortgage",
             "type": "loan",
@@ -2558,6 +2920,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}credit1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Chase Sapphire Credit Card",
             "type": "credit_card",
@@ -2575,6 +2938,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}loan2",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Car Loan - Tesla Model Y",
             "type": "loan",
@@ -2597,6 +2961,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}loan3",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Personal Loan",
             "type": "loan",
@@ -2619,6 +2984,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}loan4",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Student Loan",
             "type": "loan",
@@ -2641,6 +3007,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}loan5",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Business Loan",
             "type": "loan",
@@ -2663,6 +3030,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}credit2",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Amex Platinum Card",
             "type": "credit_card",
@@ -2680,6 +3048,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}loan6",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Home Equity Line of Credit",
             "type": "loan",
@@ -2703,6 +3072,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         # New Asset Types - Multi-country
         {
             "id": f"{demo_prefix}vehicle1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Tesla Model Y - 2023",
             "type": "vehicle",
@@ -2722,6 +3092,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}art1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Contemporary Art Collection",
             "type": "art",
@@ -2739,6 +3110,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}nft1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Bored Ape NFT #4521",
             "type": "nft",
@@ -2760,6 +3132,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         # Singapore Assets
         {
             "id": f"{demo_prefix}sg_bank1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "DBS Singapore Savings Account",
             "type": "bank",
@@ -2777,6 +3150,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}sg_property1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Condo Unit - Marina Bay",
             "type": "property",
@@ -2802,6 +3176,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         # India Assets
         {
             "id": f"{demo_prefix}india_fd1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "ICICI Bank Fixed Deposit",
             "type": "investment",
@@ -2820,6 +3195,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}india_gold1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Gold Jewelry Collection",
             "type": "precious_metals",
@@ -2842,6 +3218,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         # Australia Assets
         {
             "id": f"{demo_prefix}au_stock1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Commonwealth Bank Shares",
             "type": "stock",
@@ -2862,6 +3239,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}au_property1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Investment Apartment - Sydney",
             "type": "property",
@@ -2888,6 +3266,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         # Mutual Funds
         {
             "id": f"{demo_prefix}mf1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Vanguard S&P 500 Index Fund",
             "type": "mutual_fund",
@@ -2905,6 +3284,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}india_mf1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "SBI Bluechip Fund",
             "type": "mutual_fund",
@@ -2928,6 +3308,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
     demo_portfolio_id = f"{demo_prefix}portfolio1"
     demo_portfolio = {
         "id": demo_portfolio_id,
+        "is_demo": True,
         "user_id": user_id,
         "name": "Binance Trading Account",
         "provider_name": "binance",
@@ -2974,6 +3355,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
     demo_documents = [
         {
             "id": f"{demo_prefix}doc1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Life Insurance Policy Document",
             "category": "insurance",
@@ -2987,6 +3369,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}doc2",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Home Deed - Austin Property",
             "category": "property",
@@ -3000,6 +3383,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}doc3",
+            "is_demo": True,
             "user_id": user_id,
             "name": "401k Statement Q4 2024",
             "category": "investment",
@@ -3013,6 +3397,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}doc4",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Bank Statement - November 2024",
             "category": "bank",
@@ -3026,6 +3411,7 @@ async def seed_demo_data(user_id: str, force: bool = False):
         },
         {
             "id": f"{demo_prefix}doc5",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Car Title - Tesla Model Y",
             "category": "vehicle",
@@ -3122,6 +3508,7 @@ DEMO NOTE: This is sample demo content. Please consult with a legal professional
     demo_messages = [
         {
             "id": f"{demo_prefix}msg1",
+            "is_demo": True,
             "user_id": user_id,
             "recipient_email": "jane.demo@example.com",
             "recipient_name": "Jane Doe",
@@ -3144,6 +3531,7 @@ All my love,
         },
         {
             "id": f"{demo_prefix}msg2",
+            "is_demo": True,
             "user_id": user_id,
             "recipient_email": "john.jr.demo@example.com",
             "recipient_name": "John Doe Jr.",
@@ -3170,6 +3558,7 @@ Dad""",
         },
         {
             "id": f"{demo_prefix}msg3",
+            "is_demo": True,
             "user_id": user_id,
             "recipient_email": "sarah.demo@example.com",
             "recipient_name": "Sarah Doe",
@@ -3201,6 +3590,7 @@ Dad""",
     demo_nominees = [
         {
             "id": f"{demo_prefix}nominee1",
+            "is_demo": True,
             "user_id": user_id,
             "name": "Jane Doe (Spouse)",
             "email": "jane.demo@example.com",
@@ -3209,12 +3599,13 @@ Dad""",
             "priority": 1,
             "access_granted": True,  # Already has access in demo
             "access_type": "immediate",
-            "access_token": f"nom_demo_{user_id}_jane",
+            **token_fields(f"nom_demo_{user_id}_jane"),
             "access_token_created_at": datetime.now(timezone.utc).isoformat(),
             "created_at": datetime.now(timezone.utc).isoformat()
         },
         {
             "id": f"{demo_prefix}nominee2",
+            "is_demo": True,
             "user_id": user_id,
             "name": "John Doe Jr. (Son)",
             "email": "john.jr.demo@example.com",
@@ -3242,6 +3633,7 @@ Dad""",
     existing_dms = await db.dead_man_switches.find_one({"user_id": user_id})
     if not existing_dms:
         await db.dead_man_switches.insert_one(demo_dms)
+        await db.dead_man_switches.update_one({"user_id": user_id}, reschedule_update(datetime.now(timezone.utc)))
     
     # Demo AI Insight - Create a comprehensive insight snapshot
     demo_insight = {
@@ -3535,6 +3927,8 @@ Dad""",
     # Insert demo income and expenses
     await db.monthly_incomes.insert_many(demo_incomes_current)
     await db.monthly_expenses.insert_many(demo_expenses_current)
+    
+    await invalidate_dashboard_summary(user_id)
 
 
 # Subscription Routes
@@ -3544,9 +3938,10 @@ async def get_subscription(user: User = Depends(require_auth)):
     features = SUBSCRIPTION_FEATURES.get(plan, SUBSCRIPTION_FEATURES["Free"])
     
     # Get current usage
-    asset_count = await db.assets.count_documents({"user_id": user.id})
-    document_count = await db.documents.count_documents({"user_id": user.id})
-    storage_bytes = await get_user_storage_usage(user.id)
+    usage = await usage_counters.get(user.id)
+    asset_count = usage["asset_count"]
+    document_count = usage["document_count"]
+    storage_bytes = usage["storage_bytes"]
     storage_mb = storage_bytes / (1024 * 1024)
     
     # Get subscription details from Stripe if applicable
@@ -3685,6 +4080,7 @@ async def verify_and_update_subscription(user: User = Depends(require_auth)):
                     "stripe_subscription_id": subscription['id']
                 }}
             )
+            session_cache.invalidate_user(user.id)
             
             logger.info(f"Updated subscription for {user.email}: {plan}")
             return {"plan": plan, "updated": True}
@@ -3694,6 +4090,7 @@ async def verify_and_update_subscription(user: User = Depends(require_auth)):
                 {"id": user.id},
                 {"$set": {"subscription_plan": "Free"}}
             )
+            session_cache.invalidate_user(user.id)
             return {"plan": "Free", "updated": True}
             
     except stripe.error.StripeError as e:
@@ -3767,6 +4164,7 @@ async def create_checkout_session(data: dict, user: User = Depends(require_auth)
                 {"id": user.id},
                 {"$set": {"stripe_customer_id": stripe_customer_id}}
             )
+            session_cache.invalidate_user(user.id)
         
         # Create checkout session
         # Get frontend URL - use FRONTEND_URL env var or derive from request
@@ -3831,12 +4229,16 @@ async def stripe_webhook(request: Request):
                 "stripe_subscription_id": session.get('subscription')
             }}
         )
+        session_cache.invalidate_user(user_id)
     elif event['type'] == 'customer.subscription.deleted':
         subscription = event['data']['object']
-        await db.users.update_one(
+        updated_user = await db.users.find_one_and_update(
             {"stripe_subscription_id": subscription['id']},
-            {"$set": {"subscription_plan": "Free", "stripe_subscription_id": None}}
+            {"$set": {"subscription_plan": "Free", "stripe_subscription_id": None}},
+            projection={"_id": 0, "id": 1}
         )
+        if updated_user:
+            session_cache.invalidate_user(updated_user["id"])
     
     return {"status": "success"}
 
@@ -3852,6 +4254,7 @@ async def cancel_subscription(user: User = Depends(require_auth)):
                 {"id": user.id},
                 {"$set": {"subscription_plan": "Free"}, "$unset": {"stripe_customer_id": "", "stripe_subscription_id": ""}}
             )
+            session_cache.invalidate_user(user.id)
             return {"success": True, "message": "Already on Free plan"}
         
         # Cancel subscription in Stripe
@@ -3864,12 +4267,14 @@ async def cancel_subscription(user: User = Depends(require_auth)):
                 {"id": user.id},
                 {"$set": {"subscription_plan": "Free"}, "$unset": {"stripe_customer_id": "", "stripe_subscription_id": ""}}
             )
+            session_cache.invalidate_user(user.id)
             return {"success": True, "message": "Subscription reset to Free plan"}
         
         await db.users.update_one(
             {"id": user.id},
             {"$set": {"subscription_status": "canceling"}}
         )
+        session_cache.invalidate_user(user.id)
         
         return {"success": True, "message": "Subscription will be canceled at period end"}
     except stripe.error.StripeError as e:
@@ -3890,6 +4295,7 @@ async def reactivate_subscription(user: User = Depends(require_auth)):
             {"id": user.id},
             {"$set": {"subscription_status": "active"}}
         )
+        session_cache.invalidate_user(user.id)
         
         return {"success": True, "message": "Subscription reactivated"}
     except stripe.error.StripeError as e:
@@ -3900,19 +4306,9 @@ async def reactivate_subscription(user: User = Depends(require_auth)):
 @api_router.get("/scheduled-messages", response_model=List[ScheduledMessage])
 async def get_scheduled_messages(user: User = Depends(require_auth)):
     # Filter based on demo mode
-    demo_prefix = f"demo_{user.id}_"
-    if user.demo_mode:
-        # Show only demo messages
-        messages = await db.scheduled_messages.find({
-            "user_id": user.id,
-            "id": {"$regex": f"^{demo_prefix}"}
-        }, {"_id": 0}).to_list(1000)
-    else:
-        # Show only live messages (exclude demo)
-        messages = await db.scheduled_messages.find({
-            "user_id": user.id,
-            "id": {"$not": {"$regex": f"^{demo_prefix}"}}
-        }, {"_id": 0}).to_list(1000)
+    messages = await db.scheduled_messages.find(
+        demo_scope(user.id, user.demo_mode), {"_id": 0}
+    ).to_list(1000)
     
     for msg in messages:
         if isinstance(msg.get('created_at'), str):
@@ -3966,30 +4362,22 @@ async def generate_insights(user: User = Depends(require_auth)):
         
         from emergentintegrations.llm.chat import LlmChat, UserMessage
         
-        # Fetch user's assets and portfolios - FILTER BY DEMO MODE
-        demo_prefix = f"demo_{user.id}_"
-        if user.demo_mode:
-            # Use only demo assets and portfolios
-            assets = await db.assets.find({
-                "user_id": user.id,
-                "id": {"$regex": f"^{demo_prefix}"}
-            }).to_list(1000)
-            portfolios = await db.portfolio_assets.find({
-                "user_id": user.id,
-                "id": {"$regex": f"^{demo_prefix}"}
-            }).to_list(1000)
-        else:
-            # Use only live assets and portfolios (exclude demo)
-            assets = await db.assets.find({
-                "user_id": user.id,
-                "id": {"$not": {"$regex": f"^{demo_prefix}"}}
-            }).to_list(1000)
-            portfolios = await db.portfolio_assets.find({
-                "user_id": user.id,
-                "id": {"$not": {"$regex": f"^{demo_prefix}"}}
-            }).to_list(1000)
+        # Fetch user's asset totals and portfolios - FILTER BY DEMO MODE
+        scope = demo_scope(user.id, user.demo_mode)
         
-        if not assets and not portfolios:
+        # Get user's preferred currency
+        target_currency = user.selected_currency or "USD"
+        
+        # Totals are summed in MongoDB; portfolios are still loaded for their holdings
+        asset_rows, portfolio_rows = await aggregate_holding_totals(scope, scope, target_currency)
+        portfolios = await db.portfolio_assets.find(
+            scope,
+            {"_id": 0, "name": 1, "holdings": 1}
+        ).to_list(None)
+        assets_count = sum(row["count"] for row in asset_rows)
+        portfolios_count = len(portfolios)
+        
+        if not assets_count and not portfolios_count:
             basic_insight = AIInsight(
                 user_id=user.id,
                 portfolio_summary="No assets found in your portfolio yet.",
@@ -4014,48 +4402,24 @@ async def generate_insights(user: User = Depends(require_auth)):
         
         # Calculate portfolio summary with proper currency conversion
         asset_types = {}
-        liability_types = {'loan', 'credit_card'}
         total_assets_value = 0
         total_liabilities_value = 0
         holdings_details = []  # Track individual holdings from portfolios
         
-        # Get user's preferred currency
-        target_currency = user.selected_currency or "USD"
-        
-        # Process individual assets
-        for asset in assets:
-            asset_type = asset['type']
-            asset_types[asset_type] = asset_types.get(asset_type, 0) + 1
-            
-            # Calculate value in original currency
-            value_in_original_currency = calculate_asset_current_value(asset)
-            original_currency = asset.get("purchase_currency", "USD")
-            
-            # Convert to target currency
-            value_in_target_currency = convert_currency(
-                value_in_original_currency,
-                original_currency,
-                target_currency
-            )
-            
-            if asset_type in liability_types:
-                total_liabilities_value += value_in_target_currency
+        # Process individual assets, one row per (type, currency)
+        for row in asset_rows:
+            asset_types[row["type"]] = asset_types.get(row["type"], 0) + row["count"]
+            if row["is_liability"]:
+                total_liabilities_value += row["converted_total"]
             else:
-                total_assets_value += value_in_target_currency
+                total_assets_value += row["converted_total"]
+        
+        for row in portfolio_rows:
+            total_assets_value += row["converted_total"]
         
-        # Process portfolio assets and their holdings
+        # Process portfolio holdings
         for portfolio in portfolios:
             asset_types['portfolio'] = asset_types.get('portfolio', 0) + 1
-            portfolio_currency = portfolio.get("purchase_currency", "USD")
-            portfolio_value = portfolio.get("total_value", 0.0)
-            
-            # Convert portfolio value to target currency
-            portfolio_value_converted = convert_currency(
-                portfolio_value,
-                portfolio_currency,
-                target_currency
-            )
-            total_assets_value += portfolio_value_converted
             
             # Track holdings for detailed analysis
             if portfolio.get('holdings'):
@@ -4092,8 +4456,8 @@ Portfolio Overview:
 - Net Worth: {target_currency} {net_worth:,.2f}
 - Currency: {target_currency}
 - Asset Distribution: {asset_distribution_str}
-- Total number of individual assets: {len(assets)}
-- Total number of portfolios: {len(portfolios)}
+- Total number of individual assets: {assets_count}
+- Total number of portfolios: {portfolios_count}
 - Total holdings across portfolios: {len(holdings_details)}{holdings_summary}
 
 Please provide a comprehensive analysis in the following structure:
@@ -4147,7 +4511,7 @@ Format your response clearly with these section headers."""
             # Use fallback template when AI fails
             lines = []
             # Pre-populate sections with template-based insights
-            sections["summary"] = f"Portfolio analysis shows net worth of ${net_worth:,.2f} across {len(assets) + len(portfolios)} holdings."
+            sections["summary"] = f"Portfolio analysis shows net worth of ${net_worth:,.2f} across {assets_count + portfolios_count} holdings."
             sections["distribution"] = f"Your portfolio includes {len(asset_types)} different asset types with the following distribution: {asset_distribution_str}."
             sections["recommendations"] = [
                 "Consider diversifying across multiple asset classes to reduce risk",
@@ -4212,7 +4576,7 @@ Format your response clearly with these section headers."""
         # Create insight object
         insight = AIInsight(
             user_id=user.id,
-            portfolio_summary=sections["summary"].strip() or f"Portfolio net worth: ${net_worth:,.2f} across {len(assets)} holdings with diverse asset types.",
+            portfolio_summary=sections["summary"].strip() or f"Portfolio net worth: ${net_worth:,.2f} across {assets_count} holdings with diverse asset types.",
             asset_distribution_analysis=sections["distribution"].strip() or f"Your portfolio includes {len(asset_types)} different asset types: {asset_distribution_str}.",
             allocation_recommendations=sections["recommendations"][:5] or [
                 "Consider diversifying across multiple asset classes",
@@ -5434,7 +5798,7 @@ Return response in JSON format matching this structure:
             logger.warning("EMERGENT_LLM_KEY not configured, using fallback recommendations")
             raise Exception("AI key not configured")
         
-        response = requests.post(
+        response = await http_client.post(
             "https://api.openai.com/v1/chat/completions",
             headers={
                 "Authorization": f"Bearer {llm_key}",
@@ -5662,17 +6026,9 @@ async def get_currency_rate(from_currency: str, to_currency: str):
     if from_currency == to_currency:
         return {"rate": 1.0}
     
-    try:
-        response = requests.get(
-            f"https://api.exchangerate-api.com/v4/latest/{from_currency.upper()}",
-            timeout=5
-        )
-        if response.status_code == 200:
-            data = response.json()
-            rate = data["rates"].get(to_currency.upper(), 1.0)
-            return {"rate": rate}
-    except:
-        pass
+    rates = await fx_rate_cache.get_rates(from_currency)
+    if rates is not None:
+        return {"rate": rates.get(to_currency.upper(), 1.0)}
     
     return {"rate": 1.0}
 
@@ -5726,17 +6082,10 @@ async def delete_exchange_connection(conn_id: str, user: User = Depends(require_
 @api_router.get("/portfolio-assets")
 async def get_portfolio_assets(user: User = Depends(require_auth)):
     """Get all portfolio assets for the user"""
-    demo_prefix = f"demo_{user.id}_"
-    if user.demo_mode:
-        portfolios = await db.portfolio_assets.find({
-            "user_id": user.id,
-            "id": {"$regex": f"^{demo_prefix}"}
-        }, {"_id": 0}).to_list(1000)
-    else:
-        portfolios = await db.portfolio_assets.find({
-            "user_id": user.id,
-            "id": {"$not": {"$regex": f"^{demo_prefix}"}}
-        }, {"_id": 0}).to_list(1000)
+    # Filter based on demo mode
+    portfolios = await db.portfolio_assets.find(
+        demo_scope(user.id, user.demo_mode), {"_id": 0}
+    ).to_list(1000)
     return portfolios
 
 @api_router.post("/portfolio-assets")
@@ -5750,6 +6099,7 @@ async def create_portfolio_asset(portfolio_data: PortfolioAssetCreate, user: Use
         portfolio_dict['last_synced'] = portfolio_dict['last_synced'].isoformat()
     
     await db.portfolio_assets.insert_one(portfolio_dict)
+    await invalidate_dashboard_summary(user.id)
     return {"success": True, "id": portfolio.id}
 
 @api_router.get("/portfolio-assets/{portfolio_id}")
@@ -5829,6 +6179,7 @@ async def delete_portfolio_asset(portfolio_id: str, user: User = Depends(require
     result = await db.portfolio_assets.delete_one({"id": portfolio_id, "user_id": user.id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Portfolio not found")
+    await invalidate_dashboard_summary(user.id)
     return {"success": True}
 
 async def recalculate_portfolio_value(portfolio_id: str, user_id: str):
@@ -5850,6 +6201,7 @@ async def recalculate_portfolio_value(portfolio_id: str, user_id: str):
         {"id": portfolio_id, "user_id": user_id},
         {"$set": {"total_value": total_value}}
     )
+    await invalidate_dashboard_summary(user_id)
 
 # Helper function to log audit events
 async def log_audit(user: User, action: str, resource_type: str, resource_id: str = None, 
@@ -5876,8 +6228,8 @@ async def log_audit(user: User, action: str, resource_type: str, resource_id: st
             is_admin_action=(user.role == "admin")
         )
         
+        # timestamp stays a BSON date for the retention TTL index
         log_dict = audit_log.model_dump()
-        log_dict['timestamp'] = log_dict['timestamp'].isoformat()
         
         await db.audit_logs.insert_one(log_dict)
     except Exception as e:
@@ -5885,72 +6237,64 @@ async def log_audit(user: User, action: str, resource_type: str, resource_id: st
         logger.error(f"Failed to log audit event: {str(e)}")
 
 # Helper function to create snapshot for a specific date
-async def create_snapshot_for_date(user_id: str, snapshot_date: str, currency: str = "USD"):
+async def create_snapshot_for_date(user_id: str, snapshot_date: str, currency: str = "USD",
+                                   fx_history: Optional[FXRateHistory] = None):
     """
     Helper function to create a net worth snapshot for a specific date.
     IMPORTANT: Only includes assets AND portfolios created ON or BEFORE the snapshot date for accurate historical tracking.
+    Values are converted at the exchange rates of the snapshot date (see get_historical_fx_matrix);
+    pass a preloaded `fx_history` to avoid any per-date rate lookups.
     """
-    # Get all assets for this user
-    all_assets = await db.assets.find({"user_id": user_id}).to_list(1000)
-    
-    # Filter assets: only include those purchased on or before the snapshot date
-    assets = []
-    for asset in all_assets:
-        purchase_date = asset.get("purchase_date")
-        if purchase_date:
-            # Only include if purchase_date <= snapshot_date
-            if purchase_date <= snapshot_date:
-                assets.append(asset)
-        else:
-            # Include assets without purchase date (assume they existed)
-            assets.append(asset)
-    
-    # Get all portfolios for this user
-    all_portfolios = await db.portfolio_assets.find({"user_id": user_id}).to_list(1000)
-    
-    # Filter portfolios: only include those created on or before snapshot date
-    portfolios = []
-    for portfolio in all_portfolios:
-        created_at = portfolio.get("created_at")
-        if created_at:
-            # Parse created_at and compare
-            if isinstance(created_at, str):
-                created_date = created_at.split('T')[0]  # Get date part
-            else:
-                created_date = created_at.date().isoformat()
-            
-            if created_date <= snapshot_date:
-                portfolios.append(portfolio)
-        else:
-            # Include portfolios without created_at (assume they existed)
-            portfolios.append(portfolio)
+    # Only include assets purchased on or before the snapshot date
+    # (assets without purchase date are assumed to have existed)
+    asset_match = {
+        "user_id": user_id,
+        "$or": [
+            {"purchase_date": {"$lte": snapshot_date}},
+            {"purchase_date": {"$in": [None, ""]}}
+        ]
+    }
     
-    # Define liability types
-    liability_types = {'loan', 'credit_card'}
+    # Only include portfolios created on or before the snapshot date; created_at may be
+    # an ISO string or a BSON date, so compare on its date part
+    created_date = {"$cond": [
+        {"$eq": [{"$type": "$created_at"}, "date"]},
+        {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+        {"$arrayElemAt": [{"$split": [{"$toString": "$created_at"}, "T"]}, 0]}
+    ]}
+    portfolio_match = {
+        "user_id": user_id,
+        "$or": [
+            {"created_at": {"$in": [None, ""]}},
+            {"$expr": {"$lte": [created_date, snapshot_date]}}
+        ]
+    }
+    
+    # Totals are summed in MongoDB and converted at the snapshot date's rates in one batch
+    fx_matrix = await get_historical_fx_matrix(snapshot_date, fx_history)
+    asset_rows, portfolio_rows = await aggregate_holding_totals(asset_match, portfolio_match, currency, fx_matrix)
+    snapshot = await store_snapshot_from_rows(user_id, snapshot_date, currency, asset_rows, portfolio_rows)
+    
+    # Net worth growth on the dashboard compares against the latest snapshot
+    await invalidate_dashboard_summary(user_id)
     
+    return snapshot
+
+async def store_snapshot_from_rows(user_id: str, snapshot_date: str, currency: str,
+                                   asset_rows: List[Dict[str, Any]], portfolio_rows: List[Dict[str, Any]]):
+    """Build the snapshot from converted totals rows and upsert it for its date."""
     total_assets_value = 0.0
     total_liabilities_value = 0.0
     asset_breakdown = {}
     liability_breakdown = {}
     
-    # Process individual assets
-    for asset in assets:
-        asset_type = asset["type"]
-        is_liability = asset_type in liability_types
-        
-        # Calculate value in original currency
-        value_in_original_currency = calculate_asset_current_value(asset)
-        original_currency = asset.get("purchase_currency", "USD")
-        
-        # Convert to target currency
-        value_in_target_currency = convert_currency(
-            value_in_original_currency, 
-            original_currency, 
-            currency
-        )
+    # Process individual assets, one row per (type, currency)
+    for row in asset_rows:
+        asset_type = row["type"]
+        value_in_target_currency = row["converted_total"]
         
         # Separate assets and liabilities
-        if is_liability:
+        if row["is_liability"]:
             total_liabilities_value += value_in_target_currency
             liability_breakdown[asset_type] = liability_breakdown.get(asset_type, 0) + value_in_target_currency
         else:
@@ -5958,20 +6302,10 @@ async def create_snapshot_for_date(user_id: str, snapshot_date: str, currency: s
             asset_breakdown[asset_type] = asset_breakdown.get(asset_type, 0) + value_in_target_currency
     
     # Process portfolios
-    for portfolio in portfolios:
+    for row in portfolio_rows:
         portfolio_type = "portfolio"
-        portfolio_currency = portfolio.get("purchase_currency", "USD")
-        portfolio_value_original = portfolio.get("total_value", 0.0)
-        
-        # Convert portfolio value to target currency
-        portfolio_value_converted = convert_currency(
-            portfolio_value_original,
-            portfolio_currency,
-            currency
-        )
-        
-        total_assets_value += portfolio_value_converted
-        asset_breakdown[portfolio_type] = asset_breakdown.get(portfolio_type, 0) + portfolio_value_converted
+        total_assets_value += row["converted_total"]
+        asset_breakdown[portfolio_type] = asset_breakdown.get(portfolio_type, 0) + row["converted_total"]
     
     net_worth = total_assets_value - total_liabilities_value
     
@@ -6026,6 +6360,7 @@ async def create_networth_snapshot(snapshot_data: NetWorthSnapshotCreate, user:
             {"$set": snap_dict},
             upsert=True
         )
+        await invalidate_dashboard_summary(user.id)
         
         return {"success": True, "snapshot": snapshot}
     except Exception as e:
@@ -6043,17 +6378,17 @@ async def get_networth_history(user: User = Depends(require_auth), target_curren
     # Convert to target currency if needed
     for snapshot in snapshots:
         if snapshot.get("currency") != target_currency:
-            snapshot["net_worth"] = convert_currency(
+            snapshot["net_worth"] = await convert_currency(
                 snapshot["net_worth"],
                 snapshot["currency"],
                 target_currency
             )
-            snapshot["total_assets"] = convert_currency(
+            snapshot["total_assets"] = await convert_currency(
                 snapshot["total_assets"],
                 snapshot["currency"],
                 target_currency
             )
-            snapshot["total_liabilities"] = convert_currency(
+            snapshot["total_liabilities"] = await convert_currency(
                 snapshot["total_liabilities"],
                 snapshot["currency"],
                 target_currency
@@ -6081,8 +6416,8 @@ async def get_networth_trends(user: User = Depends(require_auth), target_currenc
     latest = snapshots[-1]
     earliest = snapshots[0]
     
-    latest_nw = convert_currency(latest["net_worth"], latest["currency"], target_currency)
-    earliest_nw = convert_currency(earliest["net_worth"], earliest["currency"], target_currency)
+    latest_nw = await convert_currency(latest["net_worth"], latest["currency"], target_currency)
+    earliest_nw = await convert_currency(earliest["net_worth"], earliest["currency"], target_currency)
     
     yoy_change = latest_nw - earliest_nw
     yoy_percent = ((yoy_change / earliest_nw) * 100) if earliest_nw != 0 else 0
@@ -6101,7 +6436,13 @@ async def get_networth_trends(user: User = Depends(require_auth), target_currenc
 async def backfill_snapshots_from_assets(user: User = Depends(require_auth), currency: str = "USD"):
     """Backfill net worth snapshots from all assets with purchase dates."""
     try:
-        assets = await db.assets.find({"user_id": user.id}).to_list(1000)
+        assets, portfolios = await asyncio.gather(
+            db.assets.find({"user_id": user.id}, {"_id": 0}).to_list(None),
+            db.portfolio_assets.find(
+                {"user_id": user.id},
+                {"_id": 0, "total_value": 1, "purchase_currency": 1, "created_at": 1}
+            ).to_list(None)
+        )
         
         # Get unique purchase dates
         purchase_dates = set()
@@ -6116,15 +6457,31 @@ async def backfill_snapshots_from_assets(user: User = Depends(require_auth), cur
                 "snapshots_created": 0
             }
         
+        # Fill the local rate history for the whole span with one bulk fetch,
+        # then serve every date from memory
+        sorted_dates = sorted(purchase_dates)
+        await fx_history_store.ensure_range(sorted_dates[0], sorted_dates[-1])
+        fx_history = await fx_history_store.load(sorted_dates[0], sorted_dates[-1])
+        
+        # Value every asset and portfolio once; each date only masks what was held then
+        asset_valuation = AssetValuation.from_assets(assets)
+        portfolio_valuation = AssetValuation.from_portfolios(portfolios)
+        
         # Create snapshots for each unique purchase date
         snapshots_created = 0
-        for date in sorted(purchase_dates):
+        for date in sorted_dates:
             try:
-                await create_snapshot_for_date(user.id, date, currency)
+                asset_rows = asset_valuation.grouped_totals(asset_valuation.held_on(date))
+                portfolio_rows = portfolio_valuation.grouped_totals(portfolio_valuation.held_on(date))
+                fx_matrix = await get_historical_fx_matrix(date, fx_history)
+                await convert_total_rows(asset_rows + portfolio_rows, currency, fx_matrix)
+                await store_snapshot_from_rows(user.id, date, currency, asset_rows, portfolio_rows)
                 snapshots_created += 1
             except Exception as e:
                 logger.error(f"Failed to create snapshot for date {date}: {str(e)}")
         
+        await invalidate_dashboard_summary(user.id)
+        
         return {
             "success": True,
             "message": f"Backfilled {snapshots_created} snapshots from asset purchase dates",
@@ -6173,10 +6530,8 @@ def check_subscription_limit(user: User, feature: str) -> bool:
     return features.get(feature, False)
 
 async def get_user_storage_usage(user_id: str) -> int:
-    """Calculate total storage used by user in bytes."""
-    documents = await db.documents.find({"user_id": user_id}).to_list(1000)
-    total_bytes = sum(doc.get("file_size", 0) for doc in documents)
-    return total_bytes
+    """Total bytes of live documents stored by the user."""
+    return (await usage_counters.get(user_id))["storage_bytes"]
 
 # Admin Routes
 @api_router.get("/admin/stats")
@@ -6301,6 +6656,7 @@ async def update_user_role(user_id: str, role_data: dict, admin: User = Depends(
         {"id": user_id},
         {"$set": {"role": new_role}}
     )
+    session_cache.invalidate_user(user_id)
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
@@ -6366,6 +6722,58 @@ async def get_dms_reminders_status(admin: User = Depends(require_admin)):
         logger.error(f"Failed to get DMS reminders: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch DMS reminders")
 
+@api_router.get("/admin/jobs/fx-cache")
+async def get_fx_cache_stats(admin: User = Depends(require_admin)):
+    """Get exchange rate cache hit/miss counters and network time saved."""
+    return fx_rate_cache.stats()
+
+@api_router.get("/admin/jobs/price-cache")
+async def get_price_cache_stats(admin: User = Depends(require_admin)):
+    """Get crypto quote cache hit/miss counters and upstream call count."""
+    return crypto_price_service.stats()
+
+@api_router.get("/admin/jobs/session-cache")
+async def get_session_cache_stats(admin: User = Depends(require_admin)):
+    """Get session cache hit/miss counters."""
+    return session_cache.stats()
+
+@api_router.get("/admin/jobs/nominee-view-cache")
+async def get_nominee_view_cache_stats(admin: User = Depends(require_admin)):
+    """Get nominee dashboard cache hit/miss and invalidation counters."""
+    return nominee_view_cache.stats()
+
+@api_router.get("/admin/jobs/nominee-tokens")
+async def get_nominee_token_stats(admin: User = Depends(require_admin)):
+    """Get nominee token lookups and invalid tokens rejected without a query."""
+    return invalid_token_cache.stats()
+
+@api_router.get("/admin/jobs/activity-buffer")
+async def get_activity_buffer_stats(admin: User = Depends(require_admin)):
+    """Get pending and flushed last_activity counters."""
+    return activity_buffer.stats()
+
+@api_router.get("/admin/jobs/indexes")
+async def get_index_report(admin: User = Depends(require_admin)):
+    """Get declared indexes that are missing and existing indexes that are unused."""
+    try:
+        return await index_report(db)
+    except Exception as e:
+        logger.error(f"Failed to build index report: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to build index report")
+
+@api_router.post("/admin/jobs/migrate-document-blobs")
+async def migrate_document_blobs(background_tasks: BackgroundTasks, admin: User = Depends(require_admin)):
+    """Move legacy inline file_data payloads into the blob store in the background."""
+    pending = await db.documents.count_documents({"file_data": {"$type": "string"}})
+    if pending:
+        background_tasks.add_task(migrate_document_blobs_job)
+    return {"pending_documents": pending, "started": pending > 0}
+
+async def migrate_document_blobs_job():
+    await migrate_inline_documents(db.documents, blob_store)
+    # Migrated images get previews like new uploads do
+    await queue_missing_thumbnails(db.documents)
+
 @api_router.delete("/admin/users/{user_id}")
 async def delete_user(user_id: str, admin: User = Depends(require_admin)):
     """Delete a user and all their data."""
@@ -6377,8 +6785,13 @@ async def delete_user(user_id: str, admin: User = Depends(require_admin)):
         # Delete user's assets
         await db.assets.delete_many({"user_id": user_id})
         
-        # Delete user's documents
+        # Delete user's documents and any blobs only they referenced
+        blob_keys = []
+        async for doc in db.documents.find({"user_id": user_id}, {"_id": 0, "blob_ref.key": 1, "thumbnail_ref.key": 1}):
+            blob_keys += [doc[field]["key"] for field in ("blob_ref", "thumbnail_ref") if doc.get(field)]
         await db.documents.delete_many({"user_id": user_id})
+        await release_blobs(blob_keys)
+        await usage_counters.delete_user(user_id)
         
         # Delete user's DMS
         await db.dead_man_switches.delete_many({"user_id": user_id})
@@ -6397,6 +6810,10 @@ async def delete_user(user_id: str, admin: User = Depends(require_admin)):
         
         # Delete user's sessions
         await db.user_sessions.delete_many({"user_id": user_id})
+        session_cache.invalidate_user(user_id)
+        
+        # Delete user's materialized dashboard summaries
+        await db.dashboard_summaries.delete_many({"user_id": user_id})
         
         # Finally delete the user
         result = await db.users.delete_one({"id": user_id})
@@ -7167,8 +7584,175 @@ async def startup_scheduler():
     logger.info("Starting background job scheduler...")
     start_scheduler()
     
+    await fx_history_store.ensure_indexes()
+    await ensure_indexes(db)
+    activity_buffer.start(db.users)
+    activity_buffer.on_flush(reschedule_dms_after_activity)
+    
     # Seed universal test account for demo mode
     await seed_universal_test_account()
+    
+    # Runs after seeding so the test account's records are tagged too
+    await run_migration("is_demo_flag", migrate_demo_flags)
+    await run_migration("ttl_bson_dates", migrate_ttl_dates)
+    await run_migration("blob_catalog", migrate_blob_catalog)
+    await run_migration("thumbnail_queue", migrate_thumbnail_queue)
+    await run_migration("nominee_token_hashes", migrate_nominee_token_hashes)
+    await run_migration("dms_schedule", migrate_dms_schedule)
+
+# A running migration renews its lease every third of this; a marker whose lease
+# has lapsed belongs to a worker that died mid-run and is taken over
+MIGRATION_LEASE_SECONDS = int(os.environ.get('MIGRATION_LEASE_SECONDS', '120'))
+MIGRATION_POLL_SECONDS = 2
+
+def _lease_expiry() -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=MIGRATION_LEASE_SECONDS)).isoformat()
+
+async def run_migration(marker: str, migration: Callable[[], Awaitable[Any]]):
+    """
+    Run a one-off migration once across all workers. The db.migrations marker is
+    claimed atomically, under a lease, before the migration starts. Workers that
+    lose the race wait until it is completed (or failed) before carrying on with
+    startup, so none serves requests against unmigrated data. A failed run, or
+    one whose worker died, is retried by the next worker to start.
+    """
+    claim_id = str(uuid.uuid4())
+    claim = {"status": "running", "claim_id": claim_id,
+             "started_at": datetime.now(timezone.utc).isoformat(), "lease_expires_at": _lease_expiry()}
+    waited = False
+    while True:
+        try:
+            await db.migrations.insert_one({"_id": marker, **claim})
+            break
+        except DuplicateKeyError:
+            pass
+        
+        retryable = [
+            {"status": "running", "lease_expires_at": {"$lt": datetime.now(timezone.utc).isoformat()}},
+            # Claimed before leases existed; nothing can still be renewing it
+            {"status": "running", "lease_expires_at": {"$exists": False}},
+        ]
+        if not waited:
+            retryable.append({"status": "failed"})
+        if await db.migrations.find_one_and_update({"_id": marker, "$or": retryable}, {"$set": claim}):
+            logger.warning(f"Migration {marker}: taking over an abandoned or failed run")
+            break
+        
+        existing = await db.migrations.find_one({"_id": marker})
+        if existing is None:
+            continue
+        # Markers from before leases existed have no status and are complete
+        if existing.get("status", "completed") == "completed":
+            return
+        if existing["status"] == "failed":
+            logger.error(f"Migration {marker} failed in another worker; continuing startup without it")
+            return
+        if not waited:
+            logger.info(f"Migration {marker} is running in another worker; waiting for it to finish")
+        waited = True
+        await asyncio.sleep(MIGRATION_POLL_SECONDS)
+    
+    async def renew_lease():
+        while True:
+            await asyncio.sleep(MIGRATION_LEASE_SECONDS / 3)
+            await db.migrations.update_one(
+                {"_id": marker, "claim_id": claim_id, "status": "running"},
+                {"$set": {"lease_expires_at": _lease_expiry()}}
+            )
+    
+    heartbeat = asyncio.create_task(renew_lease())
+    try:
+        await migration()
+    except Exception:
+        await db.migrations.update_one({"_id": marker, "claim_id": claim_id}, {"$set": {"status": "failed"}})
+        raise
+    finally:
+        heartbeat.cancel()
+    await db.migrations.update_one(
+        {"_id": marker, "claim_id": claim_id},
+        {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc).isoformat()}}
+    )
+
+# Collections whose records carry the is_demo flag (see demo_scope)
+DEMO_FLAG_COLLECTIONS = ("assets", "portfolio_assets", "documents", "nominees", "scheduled_messages")
+
+async def migrate_demo_flags():
+    """
+    One-off migration: set is_demo on records created before the flag existed,
+    based on the demo_<user_id>_ id prefix that seed_demo_data uses.
+    """
+    for collection_name in DEMO_FLAG_COLLECTIONS:
+        collection = db[collection_name]
+        demo = await collection.update_many(
+            {"is_demo": {"$exists": False}, "id": {"$regex": "^demo_"}},
+            {"$set": {"is_demo": True}}
+        )
+        live = await collection.update_many(
+            {"is_demo": {"$exists": False}},
+            {"$set": {"is_demo": False}}
+        )
+        logger.info(f"is_demo migration: {collection_name} tagged {demo.modified_count} demo, {live.modified_count} live")
+
+async def migrate_ttl_dates():
+    """
+    One-off migration: convert ISO-string session expiries and audit timestamps
+    to BSON dates so the TTL indexes (see db_indexes) can expire them.
+    """
+    for collection, field in ((db.user_sessions, "expires_at"), (db.audit_logs, "timestamp")):
+        operations = []
+        converted = 0
+        async for doc in collection.find({field: {"$type": "string"}}, {"_id": 1, field: 1}):
+            try:
+                value = datetime.fromisoformat(doc[field])
+            except ValueError:
+                # Unparsable values age out from now rather than never
+                value = datetime.now(timezone.utc)
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {field: value}}))
+            if len(operations) >= 1000:
+                converted += (await collection.bulk_write(operations, ordered=False)).modified_count
+                operations = []
+        if operations:
+            converted += (await collection.bulk_write(operations, ordered=False)).modified_count
+        logger.info(f"TTL date migration: converted {converted} {collection.name}.{field} values")
+
+async def migrate_blob_catalog():
+    """
+    One-off migration: register blobs stored before the reference-counted
+    catalog existed, with one reference per document pointing at them.
+    """
+    await blob_store.rebuild_catalog(db.documents)
+
+async def migrate_thumbnail_queue():
+    """One-off migration: queue thumbnails for image documents uploaded before previews existed."""
+    queued = await queue_missing_thumbnails(db.documents)
+    logger.info(f"Thumbnail migration: queued {queued} documents")
+
+async def migrate_nominee_token_hashes():
+    """
+    One-off migration: replace raw nominee access tokens with their keyed hash
+    and encrypted copy, so tokens are looked up via access_token_hash.
+    """
+    operations = [
+        UpdateOne(
+            {"_id": nominee["_id"]},
+            {"$set": token_fields(nominee["access_token"]), "$unset": {"access_token": ""}}
+        )
+        async for nominee in db.nominees.find({"access_token": {"$type": "string"}}, {"_id": 1, "access_token": 1})
+    ]
+    if operations:
+        await db.nominees.bulk_write(operations, ordered=False)
+    # Clear leftover null tokens too, so the field is gone everywhere
+    await db.nominees.update_many({"access_token": {"$exists": True}}, {"$unset": {"access_token": ""}})
+    logger.info(f"Nominee token migration: hashed {len(operations)} tokens")
+
+async def reschedule_dms_after_activity(flushed: Dict[str, str]):
+    """Activity buffer listener: push back the DMS dates of users who were just active."""
+    await reschedule_after_activity(db.dead_man_switches, flushed)
+
+async def migrate_dms_schedule():
+    """One-off migration: compute remind_at / trigger_at for existing switches with a $merge."""
+    await db.dead_man_switches.aggregate(backfill_pipeline()).to_list(None)
+    logger.info("DMS schedule migration: remind_at / trigger_at backfilled")
 
 async def seed_universal_test_account():
     """Create universal test account that all demo users can access"""
@@ -7275,4 +7859,6 @@ async def shutdown_db_client():
     """Shutdown database client and scheduler"""
     logger.info("Shutting down...")
     stop_scheduler()
+    await activity_buffer.stop()
+    await http_client.aclose()
     client.close()
@@ -0,0 +1,79 @@
+"""
+Session cache for AssetVault
+Handles:
+- Mapping session tokens to validated User models without touching MongoDB
+- Bounded TTL + LRU eviction so memory stays flat however many sessions exist
+- Invalidation per token (logout) and per user (role, plan, preference changes)
+"""
+
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Bounds how long another worker process can serve a stale user after a change
+SESSION_CACHE_TTL_SECONDS = int(os.environ.get('SESSION_CACHE_TTL_SECONDS', '60'))
+SESSION_CACHE_MAX_ENTRIES = int(os.environ.get('SESSION_CACHE_MAX_ENTRIES', '10000'))
+
+
+class SessionCache:
+    """
+    Entries are (user, session expiry) keyed by session token. A user can hold
+    several sessions; invalidate_user scans for all of them, which is cheap at
+    this cache size and keeps no extra bookkeeping that could outlive evictions.
+    """
+
+    def __init__(self, ttl: int = SESSION_CACHE_TTL_SECONDS, maxsize: int = SESSION_CACHE_MAX_ENTRIES):
+        self._sessions = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_token: str) -> Optional[Any]:
+        """Cached User for a token, or None on a miss or once the session has expired."""
+        entry = self._sessions.get(session_token)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        user, expires_at = entry
+        if expires_at < datetime.now(timezone.utc):
+            self.invalidate_token(session_token)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return user
+
+    def put(self, session_token: str, user: Any, expires_at: datetime):
+        self._sessions[session_token] = (user, expires_at)
+
+    def invalidate_token(self, session_token: str):
+        self._sessions.pop(session_token, None)
+
+    def invalidate_user(self, user_id: str):
+        """Drop every cached session of a user after their document changes."""
+        stale = [token for token, (user, _) in self._sessions.items() if user.id == user_id]
+        for session_token in stale:
+            self._sessions.pop(session_token, None)
+
+    def clear(self):
+        self._sessions.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "cached_sessions": len(self._sessions),
+            "max_sessions": self._sessions.maxsize,
+            "ttl_seconds": self._sessions.ttl,
+        }
+
+
+# Shared by every request handled in this process
+session_cache = SessionCache()
@@ -0,0 +1,178 @@
+"""
+Document thumbnails for AssetVault
+Handles:
+- Downscaled JPEG previews of image documents (first frame of multi-page TIFF/GIF)
+- A background pass that renders pending thumbnails out of band from uploads
+- Storing each thumbnail as a small blob referenced from the document's `thumbnail_ref`
+"""
+
+import asyncio
+import io
+import logging
+import os
+import uuid
+from typing import Any, Dict, Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+from pymongo import UpdateOne
+
+from blob_store import BlobStore, BlobNotFoundError
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_MAX_DIMENSION = int(os.environ.get('THUMBNAIL_MAX_DIMENSION', '320'))
+THUMBNAIL_JPEG_QUALITY = int(os.environ.get('THUMBNAIL_JPEG_QUALITY', '80'))
+THUMBNAIL_BATCH_SIZE = int(os.environ.get('THUMBNAIL_BATCH_SIZE', '20'))
+THUMBNAIL_INTERVAL_SECONDS = int(os.environ.get('THUMBNAIL_INTERVAL_SECONDS', '30'))
+
+# Larger sources are skipped rather than decoded in the worker's memory
+THUMBNAIL_MAX_SOURCE_BYTES = int(os.environ.get('THUMBNAIL_MAX_SOURCE_BYTES', str(25 * 1024 * 1024)))
+
+THUMBNAIL_CONTENT_TYPE = "image/jpeg"
+
+# Types Pillow can decode. PDFs would need a page renderer we do not ship.
+THUMBNAIL_SOURCE_TYPES = (
+    "image/jpeg", "image/jpg", "image/png", "image/gif", "image/webp", "image/bmp", "image/tiff",
+)
+
+# thumbnail_status values
+THUMBNAIL_PENDING = "pending"
+THUMBNAIL_READY = "ready"
+THUMBNAIL_FAILED = "failed"
+THUMBNAIL_SKIPPED = "skipped"
+
+
+def wants_thumbnail(file_type: Optional[str]) -> bool:
+    return bool(file_type) and file_type.lower() in THUMBNAIL_SOURCE_TYPES
+
+
+def render_thumbnail(data: bytes, max_dimension: int = THUMBNAIL_MAX_DIMENSION) -> bytes:
+    """
+    Decode an image and return a JPEG no larger than max_dimension on either side.
+    CPU-bound; call through asyncio.to_thread.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        # draft() lets the JPEG decoder downscale while decoding, which is much cheaper
+        image.draft("RGB", (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension))
+
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        image.save(output, "JPEG", quality=THUMBNAIL_JPEG_QUALITY, optimize=True)
+        return output.getvalue()
+
+
+async def _thumbnail_for(document: Dict[str, Any], store: BlobStore) -> Dict[str, Any]:
+    """$set for one pending document: a stored thumbnail, or why there is none."""
+    blob_ref = document.get("blob_ref")
+    if not blob_ref or blob_ref.get("size", 0) > THUMBNAIL_MAX_SOURCE_BYTES:
+        return {"thumbnail_status": THUMBNAIL_SKIPPED}
+
+    try:
+        source = await store.read(blob_ref["key"])
+        thumbnail = await asyncio.to_thread(render_thumbnail, source)
+    except (BlobNotFoundError, UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as e:
+        logger.warning(f"Thumbnail for document {document.get('id')} failed: {str(e)}")
+        return {"thumbnail_status": THUMBNAIL_FAILED}
+    except Exception as e:
+        # Malformed files can make Pillow raise almost anything (EOFError, SyntaxError,
+        # KeyError from bad EXIF...); mark the document failed so it leaves the queue
+        logger.exception(f"Thumbnail for document {document.get('id')} failed unexpectedly: {str(e)}")
+        return {"thumbnail_status": THUMBNAIL_FAILED}
+
+    thumbnail_ref = await store.put(thumbnail, THUMBNAIL_CONTENT_TYPE)
+    return {"thumbnail_status": THUMBNAIL_READY, "thumbnail_ref": thumbnail_ref}
+
+
+async def _release_thumbnails(store: BlobStore, updates):
+    for update in updates:
+        if "thumbnail_ref" in update:
+            await store.release(update["thumbnail_ref"]["key"])
+
+
+async def _release_unwritten(documents, store: BlobStore, pass_id: str, updates):
+    """Release the thumbnails of every update in `updates` that did not land in this pass."""
+    written = {
+        row["_id"] async for row in documents.find(
+            {"_id": {"$in": [document["_id"] for document, _ in updates]}, "thumbnail_pass": pass_id},
+            {"_id": 1}
+        )
+    }
+    await _release_thumbnails(store, [update for document, update in updates if document["_id"] not in written])
+
+
+async def _clear_pass(documents, pass_id: str, updates):
+    """Drop the pass id once it has been used; it is bookkeeping, not document data."""
+    await documents.update_many(
+        {"_id": {"$in": [document["_id"] for document, _ in updates]}, "thumbnail_pass": pass_id},
+        {"$unset": {"thumbnail_pass": ""}}
+    )
+
+
+async def generate_pending_thumbnails(documents, store: BlobStore,
+                                      batch_size: int = THUMBNAIL_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Render thumbnails for up to `batch_size` pending documents and record the
+    results with one bulk_write. Only claims documents still pending when written,
+    so a document deleted or re-processed meanwhile is left alone.
+    """
+    pending = await documents.find(
+        {"thumbnail_status": THUMBNAIL_PENDING},
+        {"_id": 1, "id": 1, "blob_ref": 1}
+    ).limit(batch_size).to_list(batch_size)
+    if not pending:
+        return {"processed": 0, "ready": 0}
+
+    # Recorded with each result, so we can tell exactly which writes landed
+    pass_id = str(uuid.uuid4())
+    updates = []
+    try:
+        for document in pending:
+            updates.append((document, await _thumbnail_for(document, store)))
+    except BaseException:
+        # Nothing was recorded, so the next pass re-renders these; drop the blobs put so far
+        await _release_thumbnails(store, [update for _, update in updates])
+        raise
+
+    try:
+        result = await documents.bulk_write([
+            UpdateOne({"_id": document["_id"], "thumbnail_status": THUMBNAIL_PENDING},
+                      {"$set": {**update, "thumbnail_pass": pass_id}})
+            for document, update in updates
+        ], ordered=False)
+        complete = result.matched_count == len(updates)
+    except BaseException:
+        await _release_unwritten(documents, store, pass_id, updates)
+        await _clear_pass(documents, pass_id, updates)
+        raise
+
+    # A document deleted or no longer pending (e.g. claimed by another worker)
+    # was not updated, so nothing references the thumbnail we stored for it
+    if not complete:
+        await _release_unwritten(documents, store, pass_id, updates)
+    await _clear_pass(documents, pass_id, updates)
+
+    ready = sum(update["thumbnail_status"] == THUMBNAIL_READY for _, update in updates)
+    logger.info(f"Thumbnails: {len(pending)} processed, {ready} ready")
+    return {"processed": len(pending), "ready": ready}
+
+
+async def queue_missing_thumbnails(documents) -> int:
+    """Mark stored image documents that were never assessed as pending. Returns how many."""
+    result = await documents.update_many(
+        {
+            "thumbnail_status": {"$exists": False},
+            "blob_ref.key": {"$type": "string"},
+            "file_type": {"$in": list(THUMBNAIL_SOURCE_TYPES)}
+        },
+        {"$set": {"thumbnail_status": THUMBNAIL_PENDING}}
+    )
+    return result.modified_count
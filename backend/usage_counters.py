@@ -0,0 +1,125 @@
+"""
+Per-user usage counters for AssetVault
+Handles:
+- One `user_usage` document per user with live asset, document and storage byte counts
+- Atomic $inc adjustments on create/delete so plan limit checks are a single lookup
+- Recomputing counters from the source collections (lazily for new users, in bulk for drift)
+"""
+
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Demo data is seeded by the app and never counts toward plan limits
+LIVE_FILTER = {"is_demo": {"$ne": True}}
+
+USAGE_FIELDS = ("asset_count", "document_count", "storage_bytes")
+
+USAGE_RECONCILE_BATCH_SIZE = int(os.environ.get('USAGE_RECONCILE_BATCH_SIZE', '500'))
+
+
+class UsageCounters:
+    """
+    Counters are adjusted in the same request that writes the asset or
+    document, so they can only drift if a request dies between the two writes
+    or data is changed outside the API; reconcile_all repairs that.
+    """
+
+    def __init__(self, db):
+        self.usage = db.user_usage
+        self.users = db.users
+        self.assets = db.assets
+        self.documents = db.documents
+
+    async def get(self, user_id: str) -> Dict[str, int]:
+        """Current counters for a user, computed from source the first time."""
+        usage = await self.usage.find_one({"user_id": user_id}, {"_id": 0, **{field: 1 for field in USAGE_FIELDS}})
+        if usage is None:
+            return await self.reconcile_user(user_id)
+        return {field: usage.get(field, 0) for field in USAGE_FIELDS}
+
+    async def adjust(self, user_id: str, assets: int = 0, documents: int = 0, storage_bytes: int = 0):
+        """
+        Apply deltas after a create or delete. Users without a counter document
+        yet are recomputed instead, which already includes the change just made.
+        """
+        result = await self.usage.update_one(
+            {"user_id": user_id},
+            {"$inc": {"asset_count": assets, "document_count": documents, "storage_bytes": storage_bytes}}
+        )
+        if result.matched_count == 0:
+            await self.reconcile_user(user_id)
+
+    async def _count(self, user_ids: List[str]) -> Dict[str, Dict[str, int]]:
+        """Counters recomputed from the assets and documents collections."""
+        totals = {user_id: dict.fromkeys(USAGE_FIELDS, 0) for user_id in user_ids}
+        asset_rows = self.assets.aggregate([
+            {"$match": {"user_id": {"$in": user_ids}, **LIVE_FILTER}},
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}}
+        ])
+        async for row in asset_rows:
+            totals[row["_id"]]["asset_count"] = row["count"]
+
+        document_rows = self.documents.aggregate([
+            {"$match": {"user_id": {"$in": user_ids}, **LIVE_FILTER}},
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}, "bytes": {"$sum": {"$ifNull": ["$file_size", 0]}}}}
+        ])
+        async for row in document_rows:
+            totals[row["_id"]]["document_count"] = row["count"]
+            totals[row["_id"]]["storage_bytes"] = row["bytes"]
+        return totals
+
+    def _set_operation(self, user_id: str, counters: Dict[str, int]) -> UpdateOne:
+        return UpdateOne(
+            {"user_id": user_id},
+            {"$set": {**counters, "reconciled_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+
+    async def reconcile_user(self, user_id: str) -> Dict[str, int]:
+        counters = (await self._count([user_id]))[user_id]
+        await self.usage.bulk_write([self._set_operation(user_id, counters)])
+        return counters
+
+    async def _reconcile_batch(self, user_ids: List[str]) -> int:
+        totals = await self._count(user_ids)
+        stored = {
+            row["user_id"]: row
+            async for row in self.usage.find({"user_id": {"$in": user_ids}}, {"_id": 0})
+        }
+        operations = [
+            self._set_operation(user_id, counters)
+            for user_id, counters in totals.items()
+            if any(stored.get(user_id, {}).get(field) != counters[field] for field in USAGE_FIELDS)
+        ]
+        if operations:
+            await self.usage.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    async def reconcile_all(self, batch_size: int = USAGE_RECONCILE_BATCH_SIZE) -> Dict[str, int]:
+        """
+        Recompute every user's counters in batches: one aggregation per source
+        collection and one bulk_write of the corrections per batch.
+        """
+        checked = corrected = 0
+        batch = []
+        async for user in self.users.find({}, {"_id": 0, "id": 1}):
+            batch.append(user["id"])
+            if len(batch) >= batch_size:
+                corrected += await self._reconcile_batch(batch)
+                checked += len(batch)
+                batch = []
+        if batch:
+            corrected += await self._reconcile_batch(batch)
+            checked += len(batch)
+
+        logger.info(f"Usage reconciliation: {checked} users checked, {corrected} corrected")
+        return {"checked": checked, "corrected": corrected}
+
+    async def delete_user(self, user_id: str):
+        await self.usage.delete_one({"user_id": user_id})
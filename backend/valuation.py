@@ -0,0 +1,162 @@
+"""
+Columnar asset valuation for AssetVault
+Handles:
+- Turning a batch of asset/portfolio documents into NumPy columns
+- The asset valuation priority rules, applied with vectorized masks or as an aggregation $switch
+- Per-asset values and per-(type, currency) rows
+- Date masks so one valuation can serve many historical snapshots
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LIABILITY_TYPES = ('loan', 'credit_card')
+
+# Current value of an asset in its own currency: the first rule whose fields
+# are all non-zero decides the value (the product of those fields).
+# Current values are preferred over purchase values.
+VALUATION_RULES = (
+    # Priority 1: Explicit current values
+    ("current_total_value",),
+    ("current_price",),
+    # Priority 2: Calculated current values
+    ("quantity", "current_unit_price"),
+    ("area", "current_price_per_area"),
+    ("weight", "current_unit_price"),
+    # Priority 3: Purchase values
+    ("total_value",),
+    ("quantity", "unit_price"),
+    ("area", "price_per_area"),
+    ("weight", "unit_price"),
+    # Priority 4: Loans/debts
+    ("outstanding_balance",),
+    ("principal_amount",),
+)
+
+VALUATION_FIELDS = tuple(sorted({field for rule in VALUATION_RULES for field in rule}))
+
+# VALUATION_RULES as an aggregation expression, for totals computed in MongoDB
+ASSET_CURRENT_VALUE_EXPR = {"$switch": {
+    "branches": [
+        {
+            "case": {"$and": [f"${field}" for field in rule]},
+            "then": {"$multiply": [{"$toDouble": f"${field}"} for field in rule]}
+        }
+        for rule in VALUATION_RULES
+    ],
+    "default": 0.0
+}}
+
+
+def _to_float(value: Any) -> float:
+    """Numeric value of a document field; missing or unparsable values count as 0."""
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _date_part(value: Any) -> str:
+    """YYYY-MM-DD part of an ISO string or datetime, or "" when unset."""
+    if not value:
+        return ""
+    if isinstance(value, str):
+        return value.split('T')[0]
+    return value.date().isoformat()
+
+
+def value_columns(columns: Dict[str, np.ndarray], size: int) -> np.ndarray:
+    """Apply VALUATION_RULES to numeric columns, returning one value per row."""
+    values = np.zeros(size, dtype=np.float64)
+    assigned = np.zeros(size, dtype=bool)
+    for rule in VALUATION_RULES:
+        rule_columns = [columns[field] for field in rule]
+        applies = ~assigned & np.logical_and.reduce([column != 0 for column in rule_columns])
+        if applies.any():
+            values[applies] = np.prod(rule_columns, axis=0)[applies]
+            assigned |= applies
+    return values
+
+
+class AssetValuation:
+    """
+    Values, types, currencies and as-of dates for a batch of holdings, stored column-wise.
+    Build with from_assets / from_portfolios; every aggregate accepts an optional
+    boolean mask so subsets (e.g. "held on date X") need no re-valuation.
+    """
+
+    def __init__(self, values: np.ndarray, types: Sequence[str], currencies: Sequence[str],
+                 dates: Sequence[str]):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.types = np.asarray(types, dtype=str)
+        self.currencies = np.char.upper(np.asarray(currencies, dtype=str))
+        self.dates = np.asarray(dates, dtype=str)
+        self.is_liability = np.isin(self.types, LIABILITY_TYPES)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @classmethod
+    def from_assets(cls, assets: List[Dict[str, Any]]) -> "AssetValuation":
+        """Value asset documents; the as-of date is purchase_date."""
+        size = len(assets)
+        columns = {
+            field: np.fromiter((_to_float(asset.get(field)) for asset in assets), dtype=np.float64, count=size)
+            for field in VALUATION_FIELDS
+        }
+        return cls(
+            value_columns(columns, size),
+            [asset.get("type", "other") for asset in assets],
+            [asset.get("purchase_currency") or "USD" for asset in assets],
+            [_date_part(asset.get("purchase_date")) for asset in assets],
+        )
+
+    @classmethod
+    def from_portfolios(cls, portfolios: List[Dict[str, Any]]) -> "AssetValuation":
+        """Value portfolio documents by total_value; the as-of date is created_at."""
+        size = len(portfolios)
+        return cls(
+            np.fromiter((_to_float(p.get("total_value")) for p in portfolios), dtype=np.float64, count=size),
+            ["portfolio"] * size,
+            [p.get("purchase_currency") or "USD" for p in portfolios],
+            [_date_part(p.get("created_at")) for p in portfolios],
+        )
+
+    def held_on(self, day: str) -> np.ndarray:
+        """Mask of holdings acquired on or before `day` (undated ones are assumed held)."""
+        if not len(self):
+            return np.zeros(0, dtype=bool)
+        return (self.dates == "") | (self.dates <= day)
+
+    def grouped_totals(self, mask: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        One row per (type, currency) with count and original_total, in the same
+        shape the totals aggregation pipelines return.
+        """
+        if not len(self):
+            return []
+        selected = np.ones(len(self), dtype=bool) if mask is None else mask
+        if not selected.any():
+            return []
+
+        keys = np.char.add(np.char.add(self.types[selected], "\0"), self.currencies[selected])
+        groups, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        totals = np.bincount(inverse, weights=self.values[selected], minlength=len(groups))
+        counts = np.bincount(inverse, minlength=len(groups))
+
+        types = self.types[selected][first]
+        currencies = self.currencies[selected][first]
+        liabilities = self.is_liability[selected][first]
+        return [{
+            "type": str(types[i]),
+            "currency": str(currencies[i]),
+            "is_liability": bool(liabilities[i]),
+            "count": int(counts[i]),
+            "original_total": float(totals[i])
+        } for i in range(len(groups))]
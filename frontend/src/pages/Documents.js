@@ -13,6 +13,32 @@ import { FileText, Upload, Trash2, Download, Shield, Grid, List, Search, X, Link
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Loaded through axios (not <img src>) so the Bearer token fallback is sent with the request
+function DocumentThumbnail({ docId }) {
+  const [src, setSrc] = useState(null);
+
+  useEffect(() => {
+    let objectUrl = null;
+    let cancelled = false;
+    axios.get(`${API}/documents/${docId}/thumbnail`, { withCredentials: true, responseType: 'blob' })
+      .then((response) => {
+        if (cancelled) return;
+        objectUrl = window.URL.createObjectURL(response.data);
+        setSrc(objectUrl);
+      })
+      .catch((error) => console.error('Failed to load thumbnail:', error));
+    return () => {
+      cancelled = true;
+      if (objectUrl) window.URL.revokeObjectURL(objectUrl);
+    };
+  }, [docId]);
+
+  if (!src) {
+    return <FileText className="w-8 h-8 flex-shrink-0" style={{color: '#ec4899'}} />;
+  }
+  return <img src={src} alt="" className="w-12 h-12 rounded object-cover flex-shrink-0" />;
+}
+
 export default function Documents() {
   const { theme } = useTheme();
   const [documents, setDocuments] = useState([]);
@@ -120,16 +146,20 @@ export default function Documents() {
 
   const handleDownload = async (docId, fileName) => {
     try {
-      const response = await axios.get(`${API}/documents/${docId}`, { withCredentials: true });
-      const blob = await fetch(`data:${response.data.file_type};base64,${response.data.file_data}`).then(r => r.blob());
-      const url = window.URL.createObjectURL(blob);
+      // Through axios so the Bearer token fallback applies when cross-domain cookies are blocked;
+      // the download route sends raw bytes, so there is no base64 payload to decode
+      const response = await axios.get(`${API}/documents/${docId}/download`, {
+        withCredentials: true,
+        responseType: 'blob'
+      });
+      const url = window.URL.createObjectURL(response.data);
       const a = document.createElement('a');
       a.href = url;
       a.download = fileName;
       document.body.appendChild(a);
       a.click();
-      window.URL.revokeObjectURL(url);
       document.body.removeChild(a);
+      window.URL.revokeObjectURL(url);
     } catch (error) {
       console.error('Failed to download document:', error);
       toast.error('Failed to download document');
@@ -549,7 +579,11 @@ export default function Documents() {
                   <CardHeader>
                     <div className="flex items-start justify-between">
                       <div className="flex items-center gap-3 flex-1 min-w-0">
-                        <FileText className="w-8 h-8 flex-shrink-0" style={{color: '#ec4899'}} />
+                        {doc.thumbnail_ref ? (
+                          <DocumentThumbnail docId={doc.id} />
+                        ) : (
+                          <FileText className="w-8 h-8 flex-shrink-0" style={{color: '#ec4899'}} />
+                        )}
                         <div className="min-w-0 flex-1">
                           <CardTitle style={{color: theme.text, fontSize: '1rem'}} className="truncate">{doc.name}</CardTitle>
                           <p className="text-xs mt-1" style={{color: theme.textTertiary}}>{formatFileSize(doc.file_size)}</p>
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+MongoDB Index Benchmark
+Seeds a scratch database with synthetic data, times the query behind each hot
+route without indexes, builds the indexes declared in backend/db_indexes.py,
+and times the same queries again.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python index_benchmark.py --docs 1000000
+
+The scratch database (default: assetvault_index_benchmark) is dropped first.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from db_indexes import INDEXES  # noqa: E402
+
+INSERT_BATCH_SIZE = 10000
+
+
+class IndexBenchmark:
+    def __init__(self, mongo_url, db_name, docs, users, repeats):
+        self.client = MongoClient(mongo_url)
+        self.db_name = db_name
+        self.db = self.client[db_name]
+        self.docs = docs
+        self.user_ids = [str(uuid.uuid4()) for _ in range(users)]
+        self.repeats = repeats
+        self.sample = {}
+
+    def insert_in_batches(self, collection, make_doc):
+        batch = []
+        for i in range(self.docs):
+            batch.append(make_doc(i))
+            if len(batch) >= INSERT_BATCH_SIZE:
+                collection.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            collection.insert_many(batch, ordered=False)
+
+    def seed(self):
+        """Insert `docs` documents into every benchmarked collection."""
+        print(f"🌱 Seeding {self.docs:,} documents per collection for {len(self.user_ids):,} users...")
+        self.client.drop_database(self.db_name)
+        now = datetime.now(timezone.utc)
+        months = [f"2025-{m:02d}" for m in range(1, 13)]
+
+        self.sample["session_token"] = f"session_{self.docs // 2}"
+        self.sample["access_token_hash"] = f"nominee_token_hash_{self.docs // 2}"
+        self.sample["user_id"] = self.user_ids[0]
+
+        self.insert_in_batches(self.db.users, lambda i: {
+            "id": self.user_ids[i] if i < len(self.user_ids) else str(uuid.uuid4()),
+            "email": f"user{i}@example.com",
+            "created_at": (now - timedelta(minutes=i)).isoformat(),
+        })
+        self.insert_in_batches(self.db.user_sessions, lambda i: {
+            "session_token": f"session_{i}",
+            "user_id": random.choice(self.user_ids),
+        })
+        self.insert_in_batches(self.db.assets, lambda i: {
+            "id": str(uuid.uuid4()),
+            "user_id": random.choice(self.user_ids),
+            "is_demo": i % 5 == 0,
+            "type": random.choice(["bank", "crypto", "stock", "property"]),
+            "symbol": random.choice(["BTC", "ETH", "AAPL", None]),
+            "total_value": random.uniform(100, 100000),
+        })
+        self.sample["asset_id"] = self.db.assets.find_one({"user_id": self.sample["user_id"]})["id"]
+        self.insert_in_batches(self.db.monthly_incomes, lambda i: {
+            "id": str(uuid.uuid4()),
+            "user_id": random.choice(self.user_ids),
+            "month": random.choice(months),
+            "demo_mode": i % 5 == 0,
+            "amount_before_tax": random.uniform(1000, 10000),
+        })
+        self.insert_in_batches(self.db.networth_snapshots, lambda i: {
+            "user_id": random.choice(self.user_ids),
+            "snapshot_date": (now - timedelta(days=i % 3650)).date().isoformat(),
+            "net_worth": random.uniform(-1000, 1000000),
+        })
+        self.insert_in_batches(self.db.audit_logs, lambda i: {
+            "user_id": random.choice(self.user_ids),
+            "action": "viewed_dashboard",
+            "timestamp": now - timedelta(minutes=i),
+        })
+        self.insert_in_batches(self.db.nominees, lambda i: {
+            "id": str(uuid.uuid4()),
+            "user_id": random.choice(self.user_ids),
+            "access_token_hash": f"nominee_token_hash_{i}" if i % 2 == 0 else None,
+            "priority": i % 3 + 1,
+        })
+        self.insert_in_batches(self.db.scheduled_messages, lambda i: {
+            "id": str(uuid.uuid4()),
+            "user_id": random.choice(self.user_ids),
+            "status": "scheduled" if i % 100 == 0 else "sent",
+            "send_date": (now + timedelta(days=(i % 730) - 365)).date().isoformat(),
+        })
+
+    def route_queries(self):
+        """(route, callable) pairs running the query each route issues."""
+        user_id = self.sample["user_id"]
+        today = datetime.now(timezone.utc).date().isoformat()
+        cutoff = datetime.now(timezone.utc) - timedelta(days=30)
+        return [
+            ("GET /api/auth/me (session lookup)",
+             lambda: self.db.user_sessions.find_one({"session_token": self.sample["session_token"]})),
+            ("GET /api/auth/me (user lookup)",
+             lambda: self.db.users.find_one({"id": user_id})),
+            ("GET /api/assets",
+             lambda: list(self.db.assets.find({"user_id": user_id, "is_demo": False}))),
+            ("PUT /api/assets/{id}",
+             lambda: self.db.assets.find_one({"id": self.sample["asset_id"], "user_id": user_id})),
+            ("GET /api/income",
+             lambda: list(self.db.monthly_incomes.find({"user_id": user_id, "month": "2025-06", "demo_mode": False}))),
+            ("GET /api/networth/history",
+             lambda: list(self.db.networth_snapshots.find({"user_id": user_id}).sort("snapshot_date", 1))),
+            ("GET /api/audit/logs",
+             lambda: list(self.db.audit_logs.find(
+                 {"user_id": user_id, "timestamp": {"$gte": cutoff}}).sort("timestamp", -1).limit(1000))),
+            ("GET /api/nominee/dashboard (token lookup)",
+             lambda: self.db.nominees.find_one({"access_token_hash": self.sample["access_token_hash"]})),
+            ("scheduler: check_scheduled_messages",
+             lambda: list(self.db.scheduled_messages.find(
+                 {"status": "scheduled", "send_date": {"$lte": today}}).limit(100))),
+        ]
+
+    def time_queries(self):
+        results = {}
+        for route, query in self.route_queries():
+            samples = []
+            for _ in range(self.repeats):
+                started = time.perf_counter()
+                query()
+                samples.append((time.perf_counter() - started) * 1000)
+            results[route] = statistics.median(samples)
+        return results
+
+    def build_indexes(self):
+        print("🔧 Building declared indexes...")
+        started = time.perf_counter()
+        for collection_name, models in INDEXES.items():
+            self.db[collection_name].create_indexes(models)
+        print(f"   Built in {time.perf_counter() - started:.1f}s")
+
+    def run(self):
+        self.seed()
+        print("⏱  Timing queries without indexes...")
+        before = self.time_queries()
+        self.build_indexes()
+        print("⏱  Timing queries with indexes...")
+        after = self.time_queries()
+
+        print(f"\n{'Route':<45} {'Before (ms)':>12} {'After (ms)':>12} {'Speedup':>9}")
+        print("-" * 81)
+        for route in before:
+            speedup = before[route] / after[route] if after[route] > 0 else float("inf")
+            print(f"{route:<45} {before[route]:>12.2f} {after[route]:>12.2f} {speedup:>8.0f}x")
+
+        self.client.drop_database(self.db_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark route queries before/after index bootstrap")
+    parser.add_argument("--docs", type=int, default=1_000_000, help="documents per collection")
+    parser.add_argument("--users", type=int, default=10_000, help="distinct users to spread documents over")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per query (median is reported)")
+    parser.add_argument("--db", default="assetvault_index_benchmark", help="scratch database name")
+    args = parser.parse_args()
+
+    mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+    IndexBenchmark(mongo_url, args.db, args.docs, args.users, args.repeats).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Nominee Access Benchmark
+Seeds a scratch database with one nominee who holds grants on many accounts,
+then compares the old per-owner lookup loop behind GET /api/nominees/my-accesses
+with the single aggregation in backend/nominee_access.py. Counts the commands
+each approach sends to MongoDB and times them.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 ENVIRONMENT=development python nominee_access_benchmark.py --grants 100
+
+The scratch database (default: assetvault_nominee_benchmark) is dropped first.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+
+from pymongo import MongoClient, monitoring
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from nominee_access import my_accesses_pipeline, MY_ACCESSES_LIMIT  # noqa: E402
+
+NOMINEE_EMAIL = "nominee@example.com"
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """Counts commands sent to the server, by command name."""
+
+    def __init__(self):
+        self.commands = Counter()
+
+    def started(self, event):
+        self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        self.commands.clear()
+
+    @property
+    def total(self):
+        return sum(self.commands.values())
+
+
+class NomineeAccessBenchmark:
+    def __init__(self, mongo_url, db_name, grants, repeats):
+        self.counter = RoundTripCounter()
+        self.client = MongoClient(mongo_url, event_listeners=[self.counter])
+        self.db_name = db_name
+        self.db = self.client[db_name]
+        self.grants = grants
+        self.repeats = repeats
+
+    def seed(self):
+        """One owner per grant; a third of the grants are temporary and half of those expired."""
+        print(f"🌱 Seeding {self.grants} nominee grants for {NOMINEE_EMAIL}...")
+        self.client.drop_database(self.db_name)
+        now = datetime.now(timezone.utc)
+        owners, nominees = [], []
+        for i in range(self.grants):
+            owner_id = str(uuid.uuid4())
+            owners.append({"id": owner_id, "name": f"Owner {i}", "email": f"owner{i}@example.com"})
+
+            nominee = {
+                "id": str(uuid.uuid4()),
+                "user_id": owner_id,
+                "email": NOMINEE_EMAIL,
+                "name": "Nominee",
+                "relationship": "sibling",
+                "access_granted": True,
+                "access_token": f"nom_{uuid.uuid4().hex}",
+                "access_token_created_at": now.isoformat(),
+                "access_type": "after_dms",
+            }
+            if i % 3 == 0:
+                nominee["access_type"] = "temporary"
+                offset = timedelta(days=-1) if i % 2 == 0 else timedelta(days=7)
+                nominee["access_expires_at"] = (now + offset).isoformat()
+            nominees.append(nominee)
+
+        self.db.users.insert_many(owners)
+        self.db.nominees.insert_many(nominees)
+        self.db.users.create_index("id", unique=True)
+        self.db.nominees.create_index([("email", 1), ("access_granted", 1)])
+
+    def per_owner_loop(self):
+        """What the endpoint did before: fetch grants, then one users lookup per grant."""
+        accounts = []
+        records = list(self.db.nominees.find({"email": NOMINEE_EMAIL, "access_granted": True}).limit(MY_ACCESSES_LIMIT))
+        for record in records:
+            owner = self.db.users.find_one({"id": record["user_id"]})
+            if not owner:
+                continue
+            if record.get("access_type") == "temporary" and record.get("access_expires_at"):
+                if datetime.now(timezone.utc) > datetime.fromisoformat(record["access_expires_at"]):
+                    continue
+            accounts.append({"account_id": owner["id"], "access_token": record.get("access_token")})
+        return accounts
+
+    def aggregation(self):
+        pipeline = my_accesses_pipeline(NOMINEE_EMAIL, datetime.now(timezone.utc))
+        return list(self.db.nominees.aggregate(pipeline))
+
+    def measure(self, approach):
+        self.counter.reset()
+        accounts = approach()
+        round_trips = self.counter.total
+        samples = []
+        for _ in range(self.repeats):
+            started = time.perf_counter()
+            approach()
+            samples.append((time.perf_counter() - started) * 1000)
+        return len(accounts), round_trips, statistics.median(samples)
+
+    def run(self):
+        self.seed()
+        results = {
+            "per-owner find_one loop": self.measure(self.per_owner_loop),
+            "$lookup aggregation": self.measure(self.aggregation),
+        }
+
+        print(f"\n{'Approach':<28} {'Accounts':>9} {'Round trips':>12} {'Median (ms)':>12}")
+        print("-" * 64)
+        for approach, (accounts, round_trips, median_ms) in results.items():
+            print(f"{approach:<28} {accounts:>9} {round_trips:>12} {median_ms:>12.2f}")
+
+        loop_accounts, aggregation_accounts = (result[0] for result in results.values())
+        if loop_accounts != aggregation_accounts:
+            print(f"\n❌ Result mismatch: {loop_accounts} vs {aggregation_accounts} accounts")
+        else:
+            print("\n✅ Both approaches return the same accounts")
+
+        self.client.drop_database(self.db_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark round trips for GET /api/nominees/my-accesses")
+    parser.add_argument("--grants", type=int, default=100, help="nominee grants held by the benchmark user")
+    parser.add_argument("--repeats", type=int, default=20, help="timed runs per approach (median is reported)")
+    parser.add_argument("--db", default="assetvault_nominee_benchmark", help="scratch database name")
+    args = parser.parse_args()
+
+    mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+    NomineeAccessBenchmark(mongo_url, args.db, args.grants, args.repeats).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Shared fixtures for the backend unit tests.
+The backend modules are imported straight from backend/, the way server.py imports them.
+"""
+
+import copy
+import os
+import sys
+from types import SimpleNamespace
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+# nominee_access refuses to import without a key outside development
+os.environ.setdefault("NOMINEE_TOKEN_SECRET", "unit-test-secret")
+
+
+def _matches(document, query):
+    for field, condition in query.items():
+        value = document.get(field)
+        if isinstance(condition, dict) and any(op.startswith("$") for op in condition):
+            for op, operand in condition.items():
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$lte" and (value is None or value > operand):
+                    return False
+                if op == "$gte" and (value is None or value < operand):
+                    return False
+                if op == "$exists" and (field in document) != operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(document, projection):
+    if document is None or not projection:
+        return copy.deepcopy(document)
+    return {key: copy.deepcopy(value) for key, value in document.items() if key in projection or key == "_id"}
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return self.documents[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeCollection:
+    """
+    Just enough of a motor collection for unit tests: finds, single-document
+    writes and UpdateOne bulk writes with equality, $ne, $lte, $gte, $exists
+    and $in filters, and the $set / $unset / $inc update operators.
+    """
+
+    def __init__(self, name="fake"):
+        self.name = name
+        self.docs = {}
+        self.queries = 0
+
+    def _find(self, query):
+        return next((doc for doc in self.docs.values() if _matches(doc, query)), None)
+
+    @staticmethod
+    def _apply(document, update):
+        for field, value in update.get("$set", {}).items():
+            document[field] = value
+        for field in update.get("$unset", {}):
+            document.pop(field, None)
+        for field, value in update.get("$inc", {}).items():
+            document[field] = document.get(field, 0) + value
+
+    def find(self, query, projection=None):
+        return FakeCursor([_project(doc, projection) for doc in self.docs.values() if _matches(doc, query)])
+
+    async def bulk_write(self, operations, ordered=True):
+        matched = 0
+        for operation in operations:
+            # pymongo's UpdateOne keeps its filter and update privately
+            document = self._find(operation._filter)
+            if document is not None:
+                self._apply(document, operation._doc)
+                matched += 1
+        return SimpleNamespace(matched_count=matched, modified_count=matched)
+
+    async def find_one(self, query, projection=None):
+        self.queries += 1
+        return _project(self._find(query), projection)
+
+    async def insert_one(self, document):
+        if document["_id"] in self.docs:
+            raise DuplicateKeyError(f"duplicate _id {document['_id']}")
+        self.docs[document["_id"]] = copy.deepcopy(document)
+
+    async def update_one(self, query, update):
+        document = self._find(query)
+        if document is not None:
+            self._apply(document, update)
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=ReturnDocument.BEFORE):
+        document = self._find(query)
+        if document is None:
+            return None
+        before = _project(document, projection)
+        self._apply(document, update)
+        return _project(document, projection) if return_document == ReturnDocument.AFTER else before
+
+    async def update_many(self, query, update):
+        for document in self.docs.values():
+            if _matches(document, query):
+                self._apply(document, update)
+
+    async def delete_one(self, query):
+        document = self._find(query)
+        if document is not None:
+            del self.docs[document["_id"]]
@@ -0,0 +1,135 @@
+"""Reference counting and delete/put interleaving in backend/blob_store.py"""
+
+import asyncio
+import itertools
+
+from blob_store import BlobStore, iter_bytes
+from tests.conftest import FakeCollection
+
+
+class MemoryBlobStore(BlobStore):
+    """Stores objects in a dict keyed by id with a name, like GridFS files."""
+    backend = "memory"
+
+    def __init__(self):
+        super().__init__(FakeCollection("blobs"))
+        self.objects = {}
+        self._ids = itertools.count()
+        self.before_delete = None
+
+    async def _write_temp(self, chunks):
+        object_id = next(self._ids)
+        self.objects[object_id] = {"name": None, "data": b"".join([chunk async for chunk in chunks])}
+        return object_id
+
+    async def _commit(self, object_id, key):
+        self.objects[object_id]["name"] = key
+
+    async def _discard(self, object_id):
+        del self.objects[object_id]
+
+    async def _open_physical(self, key, start, end, chunk_size):
+        for stored in self.objects.values():
+            if stored["name"] == key:
+                yield stored["data"][start:end]
+                return
+
+    async def _physical_handles(self, key):
+        return [object_id for object_id, stored in self.objects.items() if stored["name"] == key]
+
+    async def _delete_physical(self, object_id):
+        if self.before_delete:
+            hook, self.before_delete = self.before_delete, None
+            await hook()
+        self.objects.pop(object_id, None)
+
+
+def stored_names(store):
+    return [stored["name"] for stored in store.objects.values()]
+
+
+def test_identical_content_is_stored_once_and_deleted_with_its_last_reference():
+    async def scenario():
+        store = MemoryBlobStore()
+        first = await store.put(b"same bytes", "application/octet-stream")
+        second = await store.put(b"same bytes", "application/octet-stream")
+
+        assert first == second
+        assert stored_names(store) == [first["key"]]
+        assert store.catalog.docs[first["key"]]["refcount"] == 2
+
+        assert await store.release(first["key"]) is False
+        assert await store.read(first["key"]) == b"same bytes"
+
+        assert await store.release(first["key"]) is True
+        assert store.objects == {}
+        assert store.catalog.docs == {}
+
+    asyncio.run(scenario())
+
+
+def test_release_of_unknown_key_is_a_no_op():
+    async def scenario():
+        store = MemoryBlobStore()
+        assert await store.release("0" * 64) is False
+
+    asyncio.run(scenario())
+
+
+def test_put_during_delete_waits_and_keeps_its_copy():
+    async def scenario():
+        store = MemoryBlobStore()
+        reference = await store.put(b"contested", "text/plain")
+        key = reference["key"]
+        uploads = []
+
+        async def upload_same_content():
+            # The entry is marked deleting, so this put must not take a reference on it
+            assert store.catalog.docs[key]["deleting"] is True
+            uploads.append(asyncio.create_task(store.put(b"contested", "text/plain")))
+            await asyncio.sleep(0.01)
+            assert not uploads[0].done()
+
+        store.before_delete = upload_same_content
+        assert await store.release(key) is True
+        assert await uploads[0] == reference
+
+        entry = store.catalog.docs[key]
+        assert entry["refcount"] == 1
+        assert "deleting" not in entry and "pending" not in entry
+        assert stored_names(store) == [key]
+        assert await store.read(key) == b"contested"
+
+    asyncio.run(scenario())
+
+
+def test_reference_taken_before_the_delete_is_claimed_keeps_the_blob():
+    async def scenario():
+        store = MemoryBlobStore()
+        reference = await store.put(b"kept", "text/plain")
+        await store.catalog.update_one({"_id": reference["key"]}, {"$inc": {"refcount": -1}})
+        # Another put revives the entry before the releaser claims it
+        await store.put(b"kept", "text/plain")
+
+        assert await store.release(reference["key"], count=0) is False
+        assert stored_names(store) == [reference["key"]]
+
+    asyncio.run(scenario())
+
+
+def test_compressed_blobs_round_trip_and_serve_ranges():
+    async def scenario():
+        store = MemoryBlobStore()
+        data = b"line of very compressible text\n" * 5000
+        reference = await store.put_stream(iter_bytes(data, 4096), "text/plain")
+
+        entry = store.catalog.docs[reference["key"]]
+        assert entry["encoding"] == "zlib"
+        assert entry["stored_size"] < entry["size"] == len(data)
+        assert await store.read(reference["key"]) == data
+
+        chunks = [chunk async for chunk in store.open_range(reference["key"], 1000, 90000, chunk_size=8192)]
+        assert b"".join(chunks) == data[1000:90000]
+        assert max(len(chunk) for chunk in chunks) <= 8192
+
+    asyncio.run(scenario())
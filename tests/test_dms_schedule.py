@@ -0,0 +1,97 @@
+"""Precomputed dead man's switch dates in backend/dms_schedule.py"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from dms_schedule import DMS_REMINDER_LEAD_DAYS, due_filter, reschedule_after_activity, reschedule_update
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def evaluate(expression, document):
+    """Evaluator for the aggregation operators the schedule pipelines use."""
+    if isinstance(expression, str) and expression.startswith("$"):
+        return document.get(expression[1:])
+    if not isinstance(expression, dict):
+        return expression
+    (operator, argument), = expression.items()
+    values = [evaluate(item, document) for item in argument]
+    if operator == "$ifNull":
+        return next((value for value in values if value is not None), None)
+    if operator == "$max":
+        return max(value for value in values if value is not None)
+    if operator == "$eq":
+        return values[0] == values[1]
+    if operator == "$cond":
+        return values[1] if values[0] else values[2]
+    if operator == "$subtract":
+        return values[0] - values[1]
+    if operator == "$multiply":
+        return values[0] * values[1]
+    if operator == "$add":
+        date = next(value for value in values if isinstance(value, datetime))
+        return date + timedelta(milliseconds=sum(value for value in values if not isinstance(value, datetime)))
+    raise AssertionError(f"unexpected operator {operator}")
+
+
+def apply_pipeline(document, pipeline):
+    document = dict(document)
+    for stage in pipeline:
+        (name, fields), = stage.items()
+        assert name == "$set"
+        document.update({field: evaluate(expression, document) for field, expression in fields.items()})
+    return document
+
+
+def test_dates_follow_the_inactivity_window():
+    switch = apply_pipeline({"inactivity_days": 90, "reminders_sent": 0}, reschedule_update(NOW))
+
+    assert switch["last_activity_at"] == NOW
+    assert switch["trigger_at"] == NOW + timedelta(days=90)
+    assert switch["remind_at"] == NOW + timedelta(days=90 - DMS_REMINDER_LEAD_DAYS)
+
+
+def test_no_reminder_is_scheduled_once_one_was_sent():
+    switch = apply_pipeline({"inactivity_days": 30, "reminders_sent": 1}, reschedule_update(NOW))
+    assert switch["remind_at"] is None
+    assert switch["trigger_at"] == NOW + timedelta(days=30)
+
+
+def test_the_anchor_never_moves_backwards():
+    switch = apply_pipeline({"inactivity_days": 30}, reschedule_update(NOW))
+    late_writer = apply_pipeline(switch, reschedule_update(NOW - timedelta(days=3)))
+
+    assert late_writer["last_activity_at"] == NOW
+    assert late_writer["trigger_at"] == switch["trigger_at"]
+
+
+def test_due_filter_matches_either_date():
+    assert due_filter(NOW) == {
+        "is_active": True,
+        "$or": [{"remind_at": {"$lte": NOW}}, {"trigger_at": {"$lte": NOW}}]
+    }
+
+
+def test_flushed_activity_becomes_one_bulk_write():
+    class Switches:
+        def __init__(self):
+            self.operations = []
+
+        async def bulk_write(self, operations, ordered=True):
+            self.operations += operations
+
+            class Result:
+                modified_count = len(operations)
+            return Result()
+
+    async def scenario():
+        switches = Switches()
+        flushed = {"user-1": NOW.isoformat(), "user-2": (NOW - timedelta(hours=1)).isoformat()}
+
+        assert await reschedule_after_activity(switches, flushed) == 2
+        assert [operation._filter for operation in switches.operations] == [
+            {"user_id": "user-1", "is_active": True}, {"user_id": "user-2", "is_active": True}
+        ]
+        assert await reschedule_after_activity(switches, {}) == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,71 @@
+"""Cross-rate conversion in backend/fx_rates.py"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from fx_rates import FXMatrix, FXRateCache
+
+USD_RATES = {"EUR": 0.9, "INR": 83.0, "GBP": 0.8, "XXX": 0}
+
+
+def test_cross_rates_are_derived_from_one_base_table():
+    matrix = FXMatrix("usd", USD_RATES)
+
+    assert matrix.currencies == ["EUR", "GBP", "INR", "USD"]
+    assert matrix.rate("USD", "INR") == pytest.approx(83.0)
+    assert matrix.rate("eur", "gbp") == pytest.approx(0.8 / 0.9)
+    assert matrix.rate("EUR", "XXX") is None
+
+    cross = matrix.cross_rates()
+    assert np.diag(cross) == pytest.approx(np.ones(4))
+    assert cross[matrix.index["INR"], matrix.index["EUR"]] == pytest.approx(0.9 / 83.0)
+
+
+def test_convert_column_with_unknown_currencies_left_unchanged():
+    matrix = FXMatrix("USD", USD_RATES)
+
+    converted = matrix.convert([100, 90, 8300, 5], ["usd", "EUR", "INR", "ABC"], "USD")
+    assert converted.tolist() == pytest.approx([100.0, 100.0, 100.0, 5.0])
+
+    assert matrix.convert([1, 2], ["USD", "EUR"], "ABC").tolist() == [1.0, 2.0]
+    assert matrix.convert([], [], "USD").size == 0
+
+
+class CountingFXRateCache(FXRateCache):
+    def __init__(self, tables):
+        super().__init__(ttl=60, maxsize=4)
+        self.tables = tables
+        self.fetched = []
+
+    async def _fetch_table(self, base):
+        self.fetched.append(base)
+        await asyncio.sleep(0.01)
+        return self.tables.get(base)
+
+
+def test_concurrent_misses_share_a_fetch_and_release_the_lock():
+    async def scenario():
+        cache = CountingFXRateCache({"USD": USD_RATES})
+        tables = await asyncio.gather(*(cache.get_rates("usd") for _ in range(5)))
+
+        assert all(table is USD_RATES for table in tables)
+        assert cache.fetched == ["USD"]
+        assert cache.stats()["fetching_bases"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_failed_and_malformed_bases_are_not_refetched():
+    async def scenario():
+        cache = CountingFXRateCache({})
+        assert await cache.get_rates("ZZZ") is None
+        assert await cache.get_rates("zzz") is None
+        assert await cache.get_rates("not-a-currency") is None
+
+        assert cache.fetched == ["ZZZ"]
+        assert cache.stats()["rejected_without_fetch"] == 2
+        assert cache.stats()["fetching_bases"] == 0
+
+    asyncio.run(scenario())
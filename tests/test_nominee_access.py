@@ -0,0 +1,59 @@
+"""Nominee token hashing, sealing and the invalid-token cache in backend/nominee_access.py"""
+
+import asyncio
+import os
+import subprocess
+import sys
+
+from nominee_access import (
+    InvalidTokenCache, hash_access_token, seal_access_token, token_fields, unseal_access_token
+)
+from tests.conftest import BACKEND_DIR, FakeCollection
+
+
+def test_tokens_are_stored_as_hash_and_sealed_copy():
+    fields = token_fields("nom_secret_token")
+    assert fields["access_token_hash"] == hash_access_token("nom_secret_token")
+    assert "nom_secret_token" not in fields.values()
+    assert unseal_access_token(fields["access_token_sealed"]) == "nom_secret_token"
+
+    assert token_fields(None) == {"access_token_hash": None, "access_token_sealed": None}
+    assert unseal_access_token(None) is None
+    assert unseal_access_token(seal_access_token("x")[:-4] + "AAAA") is None
+
+
+def test_invalid_tokens_are_rejected_without_a_query():
+    async def scenario():
+        nominees = FakeCollection("nominees")
+        await nominees.insert_one({"_id": 1, "id": "nominee-1", **token_fields("nom_valid")})
+        cache = InvalidTokenCache(ttl=60, maxsize=10)
+
+        assert await cache.find_nominee(nominees, "nom_guess") is None
+        assert await cache.find_nominee(nominees, "nom_guess") is None
+        assert nominees.queries == 1
+
+        # Valid tokens are always read, so revocation applies immediately
+        assert (await cache.find_nominee(nominees, "nom_valid"))["id"] == "nominee-1"
+        await nominees.update_one({"_id": 1}, {"$set": token_fields(None)})
+        assert await cache.find_nominee(nominees, "nom_valid") is None
+        assert nominees.queries == 3
+        assert cache.stats()["rejected_without_query"] == 1
+
+    asyncio.run(scenario())
+
+
+def _import_without_secret(environment):
+    env = {key: value for key, value in os.environ.items() if key not in ("NOMINEE_TOKEN_SECRET", "ENVIRONMENT")}
+    if environment:
+        env["ENVIRONMENT"] = environment
+    return subprocess.run([sys.executable, "-c", "import nominee_access"], cwd=BACKEND_DIR, env=env,
+                          capture_output=True, text=True)
+
+
+def test_a_missing_secret_refuses_to_start_outside_development():
+    result = _import_without_secret("production")
+    assert result.returncode != 0
+    assert "NOMINEE_TOKEN_SECRET must be set" in result.stderr
+
+    assert _import_without_secret(None).returncode != 0
+    assert _import_without_secret("development").returncode == 0
@@ -0,0 +1,28 @@
+"""Invalidation of cached nominee views in backend/nominee_view_cache.py"""
+
+from nominee_view_cache import NomineeViewCache
+
+
+def test_views_are_cached_until_the_owner_changes():
+    cache = NomineeViewCache(ttl=60, maxsize=10)
+    entry = cache.put("owner-1", {"assets": [1]}, cache.generation("owner-1"))
+
+    assert cache.get("owner-1") == entry
+    cache.invalidate_owner("owner-1")
+    assert cache.get("owner-1") is None
+
+
+def test_a_view_built_across_an_invalidation_is_served_but_not_cached():
+    cache = NomineeViewCache(ttl=60, maxsize=10)
+
+    generation = cache.generation("owner-1")
+    # The owner edits an asset while the view is being built
+    cache.invalidate_owner("owner-1")
+    entry = cache.put("owner-1", {"assets": ["stale"]}, generation)
+
+    assert entry["payload"] == {"assets": ["stale"]}
+    assert cache.get("owner-1") is None
+    assert cache.stats()["stale_builds_not_cached"] == 1
+
+    fresh = cache.put("owner-1", {"assets": ["fresh"]}, cache.generation("owner-1"))
+    assert cache.get("owner-1") == fresh
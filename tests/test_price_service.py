@@ -0,0 +1,110 @@
+"""Batching, caching and single-flight fetches in backend/price_service.py"""
+
+import asyncio
+import threading
+
+import pytest
+
+from price_service import CryptoPriceService, PriceProvider, StaticPriceProvider
+
+
+class FakeCoinGecko:
+    """Records get_price calls; optionally blocks until released so calls can overlap."""
+
+    def __init__(self, prices, block=False):
+        self.prices = prices
+        self.calls = []
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+
+    def get_price(self, ids, vs_currencies):
+        self.calls.append(list(ids))
+        if not self.release.wait(timeout=5):
+            raise TimeoutError("test never released the fake CoinGecko call")
+        return {coin_id: {vs_currencies: self.prices[coin_id]} for coin_id in ids if coin_id in self.prices}
+
+
+def test_symbols_are_batched_and_cached():
+    async def scenario():
+        client = FakeCoinGecko({"bitcoin": 95000.0, "ethereum": 3500.0, "solana": 150.0})
+        service = CryptoPriceService(client=client, batch_size=2)
+
+        prices = await service.get_prices(["BTC", "ETH", "SOL", "btc", "unknown-coin"])
+        assert prices == {"BTC": 95000.0, "ETH": 3500.0, "SOL": 150.0, "btc": 95000.0, "unknown-coin": None}
+        assert sorted(len(batch) for batch in client.calls) == [2, 2]
+
+        assert await service.get_price("ETH") == 3500.0
+        assert service.upstream_calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_requests_share_one_upstream_call():
+    async def scenario():
+        client = FakeCoinGecko({"bitcoin": 95000.0}, block=True)
+        service = CryptoPriceService(client=client)
+
+        requests = [asyncio.create_task(service.get_price("BTC")) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        client.release.set()
+
+        assert await asyncio.gather(*requests) == [95000.0] * 5
+        assert client.calls == [["bitcoin"]]
+        assert service.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_upstream_failure_reaches_every_waiter():
+    class FailingCoinGecko(FakeCoinGecko):
+        def get_price(self, ids, vs_currencies):
+            super().get_price(ids, vs_currencies)
+            raise ConnectionError("rate limited")
+
+    async def scenario():
+        client = FailingCoinGecko({}, block=True)
+        service = CryptoPriceService(client=client)
+
+        requests = [asyncio.create_task(service.get_price("BTC")) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        client.release.set()
+
+        results = await asyncio.gather(*requests, return_exceptions=True)
+        assert all(isinstance(result, ConnectionError) for result in results)
+        assert len(client.calls) == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_fetch_does_not_strand_waiters():
+    async def scenario():
+        client = FakeCoinGecko({"bitcoin": 95000.0}, block=True)
+        service = CryptoPriceService(client=client)
+
+        fetcher = asyncio.create_task(service.get_price("BTC"))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.create_task(service.get_price("BTC"))
+        await asyncio.sleep(0.05)
+
+        fetcher.cancel()
+        with pytest.raises(RuntimeError, match="interrupted"):
+            await asyncio.wait_for(waiter, timeout=1)
+        assert service.stats()["in_flight"] == 0
+
+        client.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await fetcher
+
+    asyncio.run(scenario())
+
+
+def test_price_provider_requires_fetch_prices():
+    class Incomplete(PriceProvider):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+    provider = StaticPriceProvider({"usd": {"btc": 95000.0}})
+    assert asyncio.run(provider.fetch_prices(["BTC", "AAPL"], "USD")) == {"BTC": 95000.0, "AAPL": None}
@@ -0,0 +1,103 @@
+"""Thumbnail rendering and the pending-thumbnail pass in backend/thumbnails.py"""
+
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+import thumbnails
+from thumbnails import (
+    THUMBNAIL_FAILED, THUMBNAIL_PENDING, THUMBNAIL_READY, generate_pending_thumbnails, render_thumbnail
+)
+from tests.conftest import FakeCollection
+from tests.test_blob_store import MemoryBlobStore
+
+
+def image_bytes(size=(1200, 800), mode="RGBA", fmt="PNG"):
+    output = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128) if mode == "RGBA" else 0).save(output, fmt)
+    return output.getvalue()
+
+
+def test_render_thumbnail_downscales_to_an_rgb_jpeg():
+    thumbnail = Image.open(io.BytesIO(render_thumbnail(image_bytes(), max_dimension=320)))
+    assert thumbnail.format == "JPEG"
+    assert thumbnail.mode == "RGB"
+    assert thumbnail.size == (320, 213)
+
+
+async def pending_documents(store, sources):
+    documents = FakeCollection("documents")
+    for i, data in enumerate(sources):
+        blob_ref = await store.put(data, "image/png")
+        await documents.insert_one({"_id": i, "id": f"doc-{i}", "blob_ref": blob_ref, "thumbnail_status": THUMBNAIL_PENDING})
+    return documents
+
+
+def test_one_undecodable_document_does_not_stall_the_batch(monkeypatch):
+    real_render = thumbnails.render_thumbnail
+
+    def render(data, *args, **kwargs):
+        if data == b"exif-bomb":
+            raise KeyError("malformed EXIF tag")
+        return real_render(data, *args, **kwargs)
+
+    monkeypatch.setattr(thumbnails, "render_thumbnail", render)
+
+    async def scenario():
+        store = MemoryBlobStore()
+        documents = await pending_documents(store, [image_bytes(), b"exif-bomb", b"not an image"])
+
+        assert await generate_pending_thumbnails(documents, store) == {"processed": 3, "ready": 1}
+        statuses = [documents.docs[i]["thumbnail_status"] for i in range(3)]
+        assert statuses == [THUMBNAIL_READY, THUMBNAIL_FAILED, THUMBNAIL_FAILED]
+        assert not any("thumbnail_pass" in document for document in documents.docs.values())
+
+        thumbnail_key = documents.docs[0]["thumbnail_ref"]["key"]
+        assert store.catalog.docs[thumbnail_key]["refcount"] == 1
+        assert await generate_pending_thumbnails(documents, store) == {"processed": 0, "ready": 0}
+
+    asyncio.run(scenario())
+
+
+def test_thumbnail_for_a_document_claimed_elsewhere_is_released(monkeypatch):
+    async def scenario():
+        store = MemoryBlobStore()
+        source = image_bytes()
+        documents = await pending_documents(store, [source, source])
+        real_render = thumbnails.render_thumbnail
+
+        def render(data, *args, **kwargs):
+            # Another worker finishes document 1 while we are rendering
+            documents.docs[1]["thumbnail_status"] = THUMBNAIL_FAILED
+            return real_render(data, *args, **kwargs)
+
+        monkeypatch.setattr(thumbnails, "render_thumbnail", render)
+        await generate_pending_thumbnails(documents, store)
+
+        thumbnail_key = documents.docs[0]["thumbnail_ref"]["key"]
+        assert "thumbnail_ref" not in documents.docs[1]
+        # Both renders produced the same bytes; only the written one keeps a reference
+        assert store.catalog.docs[thumbnail_key]["refcount"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_thumbnails_are_released_when_the_write_fails():
+    async def scenario():
+        store = MemoryBlobStore()
+        documents = await pending_documents(store, [image_bytes()])
+        source_keys = set(store.catalog.docs)
+
+        async def failing_bulk_write(operations, ordered=True):
+            raise ConnectionError("primary stepped down")
+
+        documents.bulk_write = failing_bulk_write
+        with pytest.raises(ConnectionError):
+            await generate_pending_thumbnails(documents, store)
+
+        assert set(store.catalog.docs) == source_keys
+        assert documents.docs[0]["thumbnail_status"] == THUMBNAIL_PENDING
+
+    asyncio.run(scenario())